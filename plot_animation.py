@@ -0,0 +1,253 @@
+import copy, os, queue, shutil, subprocess, tempfile, threading
+from collections import deque
+import numpy as np
+
+from plot_export import export_raster
+from plot_profiler import profiler
+from plot_scheduler import BATCH
+
+def view_keyframe(view):
+    """ Return the (origin, width, height) keyframe of a view """
+
+    return (tuple(float(x) for x in view.origin), float(view.width),
+            float(view.height))
+
+def interpolate_views(view, keyframes, n_frames):
+    """ Interpolate the views of an animation along a keyframe path
+
+    Origins are interpolated linearly between consecutive keyframes, and
+    widths and heights geometrically, so zooms proceed at a constant rate.
+    Frames are spread evenly over the path, with the first and last frames
+    on the first and last keyframes.
+
+    Parameters
+    ----------
+    view : PlotView instance
+        Settings of every frame other than origin, width and height
+    keyframes : sequence of (3-tuple of float, float, float)
+        Origin, width and height of each keyframe
+    n_frames : int
+        Number of frames
+
+    Yields
+    ------
+    view : PlotView instance
+        Shallow copy of view with the origin, width and height of the frame
+    """
+
+    if not keyframes:
+        raise ValueError('At least one keyframe is required')
+
+    origins = np.array([key[0] for key in keyframes], dtype=float)
+    sizes = np.log(np.array([key[1:] for key in keyframes], dtype=float))
+    last = len(keyframes) - 1
+
+    for i in range(n_frames):
+        t = i * last / (n_frames - 1) if n_frames > 1 else 0.
+        segment = min(int(t), max(last - 1, 0))
+        f = t - segment
+        stop = min(segment + 1, last)
+
+        frame = copy.copy(view)
+        frame.origin = ((1 - f) * origins[segment] + f * origins[stop]).tolist()
+        frame.width, frame.height = \
+            np.exp((1 - f) * sizes[segment] + f * sizes[stop]).tolist()
+        yield frame
+
+class ImageSequenceWriter():
+    """ Write animation frames as numbered image files
+
+    Parameters
+    ----------
+    pattern : str
+        Path of the frames with a format field for the frame number, e.g.
+        'frames/frame_{:05d}.png'; the extension selects PNG, PPM or TIFF
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, index, image):
+        v_res, h_res = image.shape[:2]
+        export_raster(self.pattern.format(index), [(0, image)], h_res, v_res)
+
+    def close(self):
+        pass
+
+class EncoderWriter():
+    """ Pipe animation frames to a local ffmpeg encoder
+
+    Raw RGB frames are written to the encoder's standard input, so no
+    frame is kept once it has been written. The encoder's messages go to
+    a temporary file, which can't fill up and stall it like a pipe, and
+    are reported if it fails.
+
+    Parameters
+    ----------
+    filename : str
+        Output video file; the container is chosen by ffmpeg from the
+        extension
+    h_res, v_res : int
+        Frame resolution
+    fps : float
+        Frame rate
+    encoder : str
+        Name or path of the ffmpeg executable
+    """
+
+    def __init__(self, filename, h_res, v_res, fps=24, encoder='ffmpeg'):
+        executable = shutil.which(encoder)
+        if executable is None:
+            raise FileNotFoundError(f'Video encoder {encoder} not found')
+
+        # yuv420p output needs even dimensions
+        command = [executable, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                   '-s', f'{h_res}x{v_res}', '-r', f'{fps:g}', '-i', '-',
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                   '-pix_fmt', 'yuv420p', filename]
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stderr=self.log)
+
+    def write(self, index, image):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(image).tobytes())
+        except BrokenPipeError:
+            # the encoder exited; close reports why
+            self.close()
+            raise
+
+    def close(self):
+        if self.log.closed:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        status = self.process.wait()
+        self.log.seek(0)
+        errors = self.log.read()
+        self.log.close()
+        if status != 0:
+            raise RuntimeError('Video encoder failed: ' +
+                               errors.decode(errors='replace').strip())
+
+def trace_ahead(model, views):
+    """ Yield frame views with the future id map of each, traced by the
+    worker pool of the model up to one frame per worker ahead
+
+    Frames with the trace settings of the previous frame or of the current
+    plot, and all frames of a model without a worker pool, have None in
+    place of a future. Frames left when the generator is closed are
+    cancelled.
+    """
+
+    workers = model.workers
+    pending = deque()
+    lastKey = None
+    try:
+        for view in views:
+            key = view.getTraceKey()
+            future = None
+            if workers is not None and key not in (lastKey, model.traceKey):
+                future = workers.submit('idMap', key, BATCH)
+            lastKey = key
+            pending.append((view, future))
+            if workers is None or len(pending) > workers.n_workers:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        for view, future in pending:
+            if future is not None:
+                future.cancel()
+
+def render_animation(model, views, writer, queueSize=4, progress=None):
+    """ Render the frames of an animation and stream them to a writer
+
+    openmc.capi holds a single session per process, so frames are traced
+    one after another, unless the model has a worker pool tracing frames
+    ahead in parallel (see trace_ahead), while a writer thread encodes and
+    writes finished frames. The queue between them is bounded, so at most queueSize frames
+    are held in memory. Frames with the trace settings of the previous
+    frame repeat its image, and frames with the trace settings of the
+    current plot reuse its id map.
+
+    Parameters
+    ----------
+    model : PlotModel instance
+        Model providing the tracing and coloring of frames
+    views : iterable of PlotView instances
+        Frame views, e.g. from interpolate_views
+    writer : ImageSequenceWriter or EncoderWriter instance
+        Destination of the frames; closed when rendering ends
+    queueSize : int
+        Maximum number of rendered frames waiting to be written
+    progress : callable, optional
+        Called with the number of rendered frames after each frame;
+        rendering stops early if it returns False
+
+    Returns
+    -------
+    n_frames : int
+        Number of frames written
+    """
+
+    frames = queue.Queue(maxsize=queueSize)
+    errors = []
+
+    def write():
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            if not errors:
+                try:
+                    with profiler.timer('write frame'):
+                        writer.write(*item)
+                except Exception as e:
+                    errors.append(e)
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+
+    n_frames = 0
+    lastKey = lastImage = None
+    traced = trace_ahead(model, views)
+    try:
+        for index, (view, future) in enumerate(traced):
+            key = view.getTraceKey()
+            if key == lastKey:
+                image = lastImage
+            else:
+                idBuffer = None
+                if key == model.traceKey:
+                    idBuffer = model.idBuffer
+                elif future is not None:
+                    idBuffer = future.result()
+                image, idBuffer = model.renderView(view, idBuffer,
+                                                   priority=BATCH)
+                lastKey, lastImage = key, image
+
+            # blocks while the writer is queueSize frames behind
+            frames.put((index, image))
+            n_frames += 1
+            if errors or (progress is not None and
+                          progress(n_frames) is False):
+                break
+    finally:
+        traced.close()
+        frames.put(None)
+        thread.join()
+        try:
+            writer.close()
+        except Exception as e:
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+    return n_frames
@@ -0,0 +1,409 @@
+""" Scripting interface to the plot model
+
+PlotController drives a PlotModel without the GUI, from scripts or from
+the console dock of the application:
+
+    from plot_api import open_model
+
+    plot = open_model('path/to/model')
+    plot.setView(basis='xz', width=50., height=50., colorby='cell')
+    with plot.batch():
+        plot.mask('Cell', range(1, 5001))
+        plot.setColor('Material', 3, 'red')
+    plot.exportImage('slice.png', 2000, 2000)
+    print(plot.query((0., 0., 0.)))
+"""
+
+import contextlib, copy, os
+import numpy as np
+
+from plotmodel import (_NOT_FOUND_, BASES, COLOR_DOMAINS, DOMAIN_ATTRIBUTES,
+    DOMAIN_KINDS, PROPERTIES, PlotModel)
+from plot_export import export_raster, export_vector
+from plot_profiler import profiler
+
+_UNCHANGED = object()
+
+def open_model(directory='.', server=None):
+    """ Load the model in a directory and return a controller for it
+
+    The working directory is changed to the model directory, as the model
+    .xml files are read from the working directory.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with the model .xml files
+    server : str, optional
+        Address of a plot_server.RenderServer of the same model, which
+        traces the views instead of an openmc.capi session in this process
+
+    Returns
+    -------
+    controller : PlotController instance
+
+    Raises
+    ------
+    RuntimeError
+        If the server can't be reached or serves another model
+    """
+
+    os.chdir(directory)
+    if server is not None:
+        from plot_server import RenderClient
+        return PlotController(connect_model(RenderClient(server)))
+
+    import openmc.capi
+    openmc.capi.init(['-c'])
+    return PlotController(PlotModel())
+
+def connect_model(client):
+    """ Return a PlotModel of the working directory traced by a render
+    server
+
+    Parameters
+    ----------
+    client : plot_server.RenderClient instance
+        Client of a server of the model
+
+    Raises
+    ------
+    RuntimeError
+        If the server serves another model
+    """
+
+    model = PlotModel(tracer=client)
+    if model.fingerprint != client.fingerprint:
+        raise RuntimeError(f'{client.url} serves a different model than '
+                           f'{os.getcwd()}')
+    return model
+
+class PlotController():
+    """ GUI-independent operations on a PlotModel
+
+    Every change is made to the active view and rendered at once, unless
+    it is made inside a batch, in which case all changes of the batch are
+    rendered together when it ends.
+
+    Parameters
+    ----------
+    model : PlotModel instance
+        Model to drive
+
+    Attributes
+    ----------
+    listeners : list of callable
+        Called without arguments after every render and every rolled back
+        batch, e.g. to refresh the GUI
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.listeners = []
+        self._depth = 0
+        self._dirty = False
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Group changes into one transaction with a single render
+
+        Batches may be nested; the outermost batch renders. If the batch
+        raises, the active view is replaced by a copy of its state before
+        the batch and nothing is rendered.
+        """
+
+        if self._depth == 0:
+            saved = copy.deepcopy(self.model.activeView)
+            dirty = self._dirty
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self.model.activeView = saved
+                self._dirty = dirty
+                self._notify()
+            raise
+        self._depth -= 1
+        if self._depth == 0 and self._dirty:
+            self.render()
+
+    def _changed(self):
+        self._dirty = True
+        if self._depth == 0:
+            self.render()
+
+    def _notify(self):
+        for listener in self.listeners:
+            listener()
+
+    def render(self):
+        """ Render the active view, keeping the current one for undo
+
+        Returns
+        -------
+        image : NumPy uint8 array (v_res, h_res, 3)
+            RGB data of the plot
+        """
+
+        with profiler.timer('script render'):
+            self.model.storeCurrent()
+            self.model.subsequentViews = []
+            self.model.generatePlot()
+        self._dirty = False
+        self._notify()
+        return self.model.image
+
+    def undo(self):
+        self.model.undo()
+        self._notify()
+
+    def redo(self):
+        self.model.redo()
+        self._notify()
+
+    # View settings
+
+    def getView(self, *names):
+        """ Return settings of the active view
+
+        Parameters
+        ----------
+        names : str
+            PlotView attribute names
+
+        Returns
+        -------
+        value or tuple
+            The value of a single setting, or a tuple of the values of
+            several
+        """
+
+        av = self.model.activeView
+        values = tuple(getattr(av, name) for name in names)
+        return values[0] if len(values) == 1 else values
+
+    def setView(self, **settings):
+        """ Change settings of the active view
+
+        Any PlotView setting may be given, e.g. origin, width, height,
+        basis, h_res, v_res, level, colorby, masking, highlighting,
+        outlines or plotBackground. When the aspect ratio is locked and
+        v_res is not given, it follows the width and height.
+
+        Raises
+        ------
+        AttributeError
+            If a setting doesn't exist
+        ValueError
+            If a basis or color mode is invalid
+        """
+
+        av = self.model.activeView
+        for name in settings:
+            if name in DOMAIN_ATTRIBUTES or not hasattr(av, name):
+                raise AttributeError(f'Unknown view setting {name}')
+        if settings.get('basis', BASES[0]) not in BASES:
+            raise ValueError(f"Basis must be one of {', '.join(BASES)}")
+        if settings.get('colorby', 'cell') not in COLOR_DOMAINS:
+            raise ValueError('Color mode must be one of '
+                             f"{', '.join(COLOR_DOMAINS)}")
+
+        for name, value in settings.items():
+            if name == 'origin':
+                value = [float(x) for x in value]
+            setattr(av, name, value)
+
+        if av.aspectLock and 'v_res' not in settings and \
+                ('width' in settings or 'height' in settings):
+            av.v_res = int(av.h_res * av.height / max(av.width, .001))
+
+        self._changed()
+
+    # Domain appearance
+
+    def getDomains(self, kind):
+        """ Return the DomainView instances of a domain kind by id
+
+        Parameters
+        ----------
+        kind : {'Cell', 'Material', 'Universe'}
+        """
+
+        if kind not in DOMAIN_KINDS:
+            raise ValueError(f"Domain kind must be one of "
+                             f"{', '.join(DOMAIN_KINDS)}")
+        return getattr(self.model.activeView, DOMAIN_KINDS[kind])
+
+    def setDomains(self, kind, ids=None, color=_UNCHANGED, masked=None,
+                   highlighted=None):
+        """ Change the appearance of domains
+
+        Parameters
+        ----------
+        kind : {'Cell', 'Material', 'Universe'}
+            Domain kind
+        ids : int, str or iterable, optional
+            Domain ids; all domains of the kind if not given
+        color : 3-tuple of int, str or None, optional
+            RGB color or SVG color name; None clears the color
+        masked, highlighted : bool, optional
+            Mask and highlight states
+
+        Returns
+        -------
+        n : int
+            Number of domains changed
+
+        Raises
+        ------
+        KeyError
+            If a domain doesn't exist; no domain is changed
+        """
+
+        domains = self.getDomains(kind)
+        if ids is None:
+            selected = list(domains.values())
+        else:
+            if isinstance(ids, (int, str, np.integer)):
+                ids = [ids]
+            keys = [str(id) for id in ids]
+            missing = [key for key in keys if key not in domains]
+            if missing:
+                raise KeyError(f"No {kind.lower()} with id "
+                               f"{', '.join(missing[:10])}")
+            selected = [domains[key] for key in keys]
+
+        for domain in selected:
+            if color is not _UNCHANGED:
+                domain.color = tuple(color) if isinstance(color, (list,
+                    tuple, np.ndarray)) else color
+            if masked is not None:
+                domain.masked = bool(masked)
+            if highlighted is not None:
+                domain.highlighted = bool(highlighted)
+
+        self._changed()
+        return len(selected)
+
+    def mask(self, kind, ids=None, state=True):
+        """ Mask (or unmask) domains, and enable masking """
+
+        with self.batch():
+            if state:
+                self.setView(masking=True)
+            return self.setDomains(kind, ids, masked=state)
+
+    def highlight(self, kind, ids=None, state=True):
+        """ Highlight (or unhighlight) domains, and enable highlighting """
+
+        with self.batch():
+            if state:
+                self.setView(highlighting=True)
+            return self.setDomains(kind, ids, highlighted=state)
+
+    def setColor(self, kind, ids, color):
+        """ Set the color of domains """
+
+        return self.setDomains(kind, ids, color=color)
+
+    # Queries
+
+    def queryPixel(self, col, row):
+        """ Return the domains and properties of a pixel of the current plot
+
+        Returns
+        -------
+        info : dict
+            Cell, instance (if traced), material and universe ids, and
+            temperature and density, of the pixel; ids are None in void
+
+        Raises
+        ------
+        IndexError
+            If the pixel is outside the image
+        """
+
+        model = self.model
+        cv = model.currentView
+        if not (0 <= col < cv.h_res and 0 <= row < cv.v_res):
+            raise IndexError(f'Pixel ({col}, {row}) is outside the '
+                             f'{cv.h_res} x {cv.v_res} image')
+
+        cells, instances, materials = model.getIdChannels()
+        cell = int(cells[row, col])
+        material = int(materials[row, col])
+        info = {'cell': None if cell == _NOT_FOUND_ else cell,
+                'material': None if material == _NOT_FOUND_ else material,
+                'universe': model.cellUniverses.get(cell)}
+        if instances is not None:
+            info['instance'] = int(instances[row, col])
+
+        props = model.getProperties()
+        for name, channel in PROPERTIES.items():
+            info[name] = float(props[row, col, channel])
+        return info
+
+    def query(self, point):
+        """ Return the domains and properties at a model point
+
+        The point is projected onto the plane of the current plot.
+
+        Parameters
+        ----------
+        point : 3-tuple of float
+            Model coordinates
+
+        Returns
+        -------
+        info : dict
+            As returned by queryPixel
+        """
+
+        col, row = self.model.mapping.worldToPixel(np.asarray(point,
+                                                              dtype=float))
+        return self.queryPixel(int(np.floor(col)), int(np.floor(row)))
+
+    # Export
+
+    def exportImage(self, filename, h_res=None, v_res=None, scaleBar=False):
+        """ Write the current plot to a PNG, PPM or TIFF file
+
+        Parameters
+        ----------
+        filename : str
+            Output file; the extension selects the format
+        h_res, v_res : int, optional
+            Resolution of the image; defaults to the plot resolution, and
+            v_res to the plot aspect ratio
+        scaleBar : bool
+            Whether a scale bar is drawn
+        """
+
+        model = self.model
+        cv = model.currentView
+        h_res = h_res or cv.h_res
+        v_res = v_res or max(int(round(h_res * cv.v_res / cv.h_res)), 1)
+
+        if (h_res, v_res) == (cv.h_res, cv.v_res):
+            bands = [(0, model.image)]
+        else:
+            bands = model.renderBands(h_res, v_res)
+
+        with profiler.timer('image export'):
+            export_raster(filename, bands, h_res, v_res, cv.width / h_res,
+                          scaleBar)
+
+    def exportVector(self, filename):
+        """ Write the current plot to an SVG or PDF file
+
+        Returns
+        -------
+        n_regions : int
+            Number of regions written
+        """
+
+        with profiler.timer('vector export'):
+            regions, colors, labels = self.model.getRegions()
+            return export_vector(filename, regions, colors, labels)
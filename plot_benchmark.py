@@ -0,0 +1,337 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Benchmarks for the OpenMC Plot Explorer render and display pipeline
+
+Synthetic lattice geometries are written to a temporary directory and a
+deterministic stand-in for openmc.capi.plot is installed in place of the
+real OpenMC build, so the benchmarks run anywhere numpy, matplotlib and
+PySide2 are available.
+
+Usage:
+
+    python plot_benchmark.py --output results.json
+    python plot_benchmark.py --baseline benchmark_baseline.json
+    python plot_benchmark.py --save-baseline benchmark_baseline.json
+"""
+
+import argparse, copy, json, os, platform, sys, tempfile, time, types
+from collections import OrderedDict
+import numpy as np
+
+_NOT_FOUND_ = -2
+
+DEFAULT_CELLS = (1000, 10000, 100000)
+DEFAULT_RESOLUTIONS = (200, 600, 1200)
+
+
+class SyntheticGeometry():
+    """ Square lattice of cells used in place of an openmc.Geometry
+
+    Parameters
+    ----------
+    n_cells : int
+        Approximate number of cells; rounded to the nearest square lattice
+    n_materials : int
+        Number of materials, assigned to cells round-robin
+    pitch : float
+        Lattice pitch in model units
+    """
+
+    def __init__(self, n_cells, n_materials=100, pitch=1.0):
+        self.nx = max(int(round(np.sqrt(n_cells))), 1)
+        self.n_cells = self.nx * self.nx
+        self.n_materials = min(n_materials, self.n_cells)
+        self.pitch = pitch
+
+    @property
+    def bounding_box(self):
+        half = self.nx * self.pitch / 2.
+        return (np.array([-half, -half, -half]),
+                np.array([half, half, half]))
+
+    def get_all_cells(self):
+        return OrderedDict((i, types.SimpleNamespace(id=i))
+                           for i in range(1, self.n_cells + 1))
+
+    def get_all_materials(self):
+        return OrderedDict((i, types.SimpleNamespace(id=i))
+                           for i in range(1, self.n_materials + 1))
+
+    def get_all_universes(self):
+        return OrderedDict([(0, types.SimpleNamespace(
+            id=0, cells=self.get_all_cells()))])
+
+    def write_xml(self, directory):
+        """ Write geometry.xml and materials.xml for the lattice """
+
+        with open(os.path.join(directory, 'geometry.xml'), 'w') as file:
+            file.write('<?xml version="1.0"?>\n<geometry>\n')
+            for i in range(1, self.n_cells + 1):
+                mat = (i - 1) % self.n_materials + 1
+                file.write(f'  <cell id="{i}" material="{mat}" '
+                           f'name="cell {i}" universe="0" />\n')
+            file.write('</geometry>\n')
+
+        with open(os.path.join(directory, 'materials.xml'), 'w') as file:
+            file.write('<?xml version="1.0"?>\n<materials>\n')
+            for i in range(1, self.n_materials + 1):
+                file.write(f'  <material id="{i}" name="material {i}" />\n')
+            file.write('</materials>\n')
+
+    def _pixel_cells(self, view):
+        # pixel centers in the plane of the view, image row 0 at the top
+        xb = 0 if view.basis[0] == 'x' else 1
+        yb = 1 if view.basis[1] == 'y' else 2
+        xs = view.origin[xb] - view.width / 2. + \
+            (np.arange(view.h_res) + 0.5) * view.width / view.h_res
+        ys = view.origin[yb] + view.height / 2. - \
+            (np.arange(view.v_res) + 0.5) * view.height / view.v_res
+        ix = np.floor(xs / self.pitch + self.nx / 2.).astype(np.int64)
+        iy = np.floor(ys / self.pitch + self.nx / 2.).astype(np.int64)
+        inside = (iy[:, None] >= 0) & (iy[:, None] < self.nx) & \
+            (ix[None, :] >= 0) & (ix[None, :] < self.nx)
+        cells = iy[:, None] * self.nx + ix[None, :] + 1
+        return np.where(inside, cells, _NOT_FOUND_)
+
+    def id_map(self, view):
+        """ Deterministic stand-in for openmc.capi.plot.id_map """
+
+        cells = self._pixel_cells(view)
+        mats = np.where(cells == _NOT_FOUND_, _NOT_FOUND_,
+                        (cells - 1) % self.n_materials + 1)
+        return np.stack((cells, mats), axis=-1).astype(np.int32)
+
+    def property_map(self, view):
+        """ Deterministic stand-in for openmc.capi.plot.property_map """
+
+        cells = self._pixel_cells(view)
+        temps = np.where(cells == _NOT_FOUND_, -1., 293.6 + cells % 50)
+        dens = np.where(cells == _NOT_FOUND_, -1.,
+                        1. + ((cells - 1) % self.n_materials) / 10.)
+        return np.stack((temps, dens), axis=-1)
+
+
+_geometry = None
+
+def install_openmc_stand_in():
+    """ Register stand-in openmc modules backed by the active geometry """
+
+    openmc = types.ModuleType('openmc')
+    capi = types.ModuleType('openmc.capi')
+    plot = types.ModuleType('openmc.capi.plot')
+    plots = types.ModuleType('openmc.plots')
+
+    class _PlotBase():
+        pass
+
+    class Geometry():
+        @staticmethod
+        def from_xml(path):
+            return _geometry
+
+    plot._PlotBase = _PlotBase
+    plot.id_map = lambda view: _geometry.id_map(view)
+    plot.property_map = lambda view: _geometry.property_map(view)
+    capi.plot = plot
+    capi.init = lambda *args, **kwargs: None
+    capi.finalize = lambda: None
+    plots._SVG_COLORS = {}
+    openmc.Geometry = Geometry
+    openmc.capi = capi
+    openmc.plots = plots
+
+    sys.modules.update({'openmc': openmc, 'openmc.capi': capi,
+                        'openmc.capi.plot': plot, 'openmc.plots': plots})
+
+
+def timeit(func, repeat, setup=None):
+    """ Time func, returning summary statistics in seconds """
+
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': float(np.median(times)),
+            'repeat': repeat}
+
+
+def run_benchmarks(cells=DEFAULT_CELLS, resolutions=DEFAULT_RESOLUTIONS,
+                   repeat=5):
+    """ Run all benchmarks and return results keyed by benchmark name """
+
+    global _geometry
+
+    install_openmc_stand_in()
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PySide2.QtWidgets import QApplication, QWidget
+    import plotmodel
+    from plotmodel import PlotModel, DomainTableModel
+    from plotgui import PlotImage
+    from plot_codec import encode_array
+
+    # held for the whole run, as widgets need a live application
+    app = QApplication.instance() or QApplication([])
+
+    results = OrderedDict()
+    start_dir = os.getcwd()
+
+    for n_cells in cells:
+        _geometry = SyntheticGeometry(n_cells)
+        tag = f"cells={_geometry.n_cells}"
+
+        with tempfile.TemporaryDirectory() as directory:
+            _geometry.write_xml(directory)
+            os.chdir(directory)
+            try:
+                results[f"PlotModel.__init__[{tag}]"] = \
+                    timeit(PlotModel, max(1, repeat // 2))
+                model = PlotModel()
+
+                for res in resolutions:
+                    def setup():
+                        model.activeView.h_res = res
+                        model.activeView.v_res = res
+                        model.traceKey = None
+                    results[f"makePlot[{tag},res={res}]"] = \
+                        timeit(model.makePlot, repeat, setup)
+                    results[f"recolor[{tag},res={res}]"] = \
+                        timeit(lambda: model.colorize(model.currentView),
+                               repeat)
+
+                    # run-length codec throughput on the traced id map
+                    ids = model.idBuffer
+                    encoded = encode_array(ids)
+                    for name, func in (('encode', lambda: encode_array(ids)),
+                                       ('decode', encoded.decode)):
+                        result = timeit(func, repeat)
+                        result['ratio'] = encoded.ratio
+                        result['MB/s'] = ids.nbytes / result['median'] / 1e6
+                        results[f"codec {name}[{tag},res={res}]"] = result
+
+                results[f"deepcopy(PlotView)[{tag}]"] = \
+                    timeit(lambda: copy.deepcopy(model.currentView), repeat)
+
+                def undo_redo():
+                    for _ in range(5):
+                        model.undo()
+                    for _ in range(5):
+                        model.redo()
+                def fill_history():
+                    model.previousViews = [copy.deepcopy(model.currentView)
+                                           for _ in range(5)]
+                    model.subsequentViews = []
+                results[f"undo/redo x5[{tag}]"] = \
+                    timeit(undo_redo, repeat, fill_history)
+
+                def reset_table():
+                    table = DomainTableModel(model.activeView.cells)
+                    table.beginResetModel()
+                    table.endResetModel()
+                results[f"DomainTableModel reset[{tag}]"] = \
+                    timeit(reset_table, repeat)
+
+                parent = QWidget()
+                main = types.SimpleNamespace()
+                plotIm = PlotImage(model, parent, main)
+                for res in resolutions:
+                    model.activeView.h_res = res
+                    model.activeView.v_res = res
+                    model.makePlot()
+                    results[f"PlotImage.setPixmap[{tag},res={res}]"] = \
+                        timeit(lambda: plotIm.setPixmap(800, 800), repeat)
+                # deliver the events queued by the widget before it goes
+                app.processEvents()
+
+                session = os.path.join(directory, 'plot_settings.pkl')
+                results[f"session save[{tag}]"] = timeit(lambda:
+                    plotmodel.dump_fingerprinted(session, model.fingerprint,
+                                                 model), repeat)
+                results[f"session load[{tag}]"] = timeit(lambda:
+                    plotmodel.load_fingerprinted(session, model.fingerprint),
+                    repeat)
+            finally:
+                os.chdir(start_dir)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Compare median timings against a baseline
+
+    Returns
+    -------
+    comparison : dict
+        Ratio of current to baseline median for every shared benchmark
+    regressions : list of str
+        Benchmarks slower than the baseline by more than threshold
+    """
+
+    comparison = OrderedDict()
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median'] / max(baseline[name]['median'], 1e-12)
+        comparison[name] = ratio
+        if ratio > 1. + threshold:
+            regressions.append(name)
+    return comparison, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cells', type=int, nargs='+', default=DEFAULT_CELLS,
+                        help='lattice sizes to benchmark (number of cells)')
+    parser.add_argument('--resolutions', type=int, nargs='+',
+                        default=DEFAULT_RESOLUTIONS,
+                        help='square plot resolutions in pixels')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='JSON file to write results to')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--save-baseline', metavar='FILE',
+                        help='also write results as a new baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.cells, args.resolutions, args.repeat)
+
+    report = {'meta': {'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'platform': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': results}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        comparison, regressions = compare(results, baseline, args.threshold)
+        report['comparison'] = {'baseline': args.baseline,
+                                'ratios': comparison,
+                                'regressions': regressions}
+        status = 1 if regressions else 0
+
+    for name, result in results.items():
+        line = f"{name:<55} {result['median'] * 1e3:10.2f} ms"
+        if 'ratio' in result:
+            line += f"  ratio {result['ratio']:.1f}, {result['MB/s']:.0f} MB/s"
+        if args.baseline and name in report['comparison']['ratios']:
+            line += f"  x{report['comparison']['ratios'][name]:.2f}"
+        print(line)
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,353 @@
+""" Compact storage format for id and property maps
+
+Plot buffers are mostly long runs of identical pixels, so every image row
+is run-length encoded over whole pixels (all channels at once), the run
+values are delta encoded along the runs, and run lengths and zigzagged
+deltas are written as LEB128 varints, optionally followed by zlib or lz4.
+Rows are grouped into blocks that are encoded independently, so any range
+of rows can be decoded without the rest of the image. Encoding and
+decoding are vectorized over the whole buffer.
+
+Layout:
+
+    b'PXRL', header length (uint32), JSON header, blocks
+
+The header holds the dtype, shape, rows per block, compression, byte size
+of every block and any metadata of the caller. Each block is the varint
+stream of its runs per row, run lengths and value deltas.
+"""
+
+import json, struct, zlib
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+_MAGIC = b'PXRL'
+_VERSION = 1
+COMPRESSIONS = (None, 'zlib', 'lz4')
+
+def varint_encode(values):
+    """ Encode unsigned integers as LEB128 varints
+
+    Parameters
+    ----------
+    values : NumPy uint64 array (n,)
+
+    Returns
+    -------
+    data : NumPy uint8 array
+        Varint bytes
+    sizes : NumPy int64 array (n,)
+        Number of bytes of every value
+    """
+
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        sizes += rest != 0
+        rest >>= np.uint64(7)
+
+    if (sizes == 1).all():
+        return values.astype(np.uint8), sizes
+
+    ends = np.cumsum(sizes)
+    owner = np.repeat(np.arange(len(values)), sizes)
+    group = np.arange(ends[-1]) - np.repeat(ends - sizes, sizes)
+    data = ((values[owner] >> (7 * group).astype(np.uint64)) &
+            np.uint64(0x7f)).astype(np.uint8)
+    data[group < sizes[owner] - 1] |= 0x80
+    return data, sizes
+
+def varint_decode(data):
+    """ Decode LEB128 varints
+
+    Parameters
+    ----------
+    data : bytes or NumPy uint8 array
+
+    Returns
+    -------
+    values : NumPy uint64 array
+
+    Raises
+    ------
+    ValueError
+        If the data ends inside a value
+    """
+
+    data = np.frombuffer(data, dtype=np.uint8)
+    last = data < 0x80
+    if len(data) and not last[-1]:
+        raise ValueError('Truncated varint data')
+    if last.all():
+        return data.astype(np.uint64)
+
+    ends = np.flatnonzero(last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7f).astype(np.uint64) << (7 * group).astype(np.uint64)
+    # the groups of a value have disjoint bits, so adding them is an or
+    return np.add.reduceat(parts, starts)
+
+def zigzag(values):
+    """ Map signed integers to unsigned ones, small magnitudes first """
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+def unzigzag(values):
+    """ Invert zigzag """
+    values = np.asarray(values, dtype=np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64) ^
+            -(values & np.uint64(1)).view(np.int64))
+
+def _to_int64(array):
+    if array.dtype.kind == 'f':
+        return array.view(f'i{array.dtype.itemsize}').astype(np.int64)
+    if array.dtype.kind not in 'iub':
+        raise TypeError(f'Arrays of {array.dtype} can not be encoded')
+    return array.astype(np.int64)
+
+def _from_int64(values, dtype):
+    if dtype.kind == 'f':
+        return values.astype(f'i{dtype.itemsize}').view(dtype)
+    return values.astype(dtype)
+
+def _compress(data, compression):
+    if compression == 'zlib':
+        return zlib.compress(data, 1)
+    elif compression == 'lz4':
+        return lz4.frame.compress(data)
+    return data
+
+def _decompress(data, compression):
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    elif compression == 'lz4':
+        if lz4 is None:
+            raise ImportError('lz4 is required to decode this data')
+        return lz4.frame.decompress(data)
+    return data
+
+def encode_array(array, compression='zlib', blockRows=64, meta=None):
+    """ Run-length encode an image-shaped buffer
+
+    Parameters
+    ----------
+    array : NumPy array (v_res, h_res) or (v_res, h_res, n_channels)
+        Integer, boolean or floating point buffer, such as an id map,
+        property map or RGB image
+    compression : {'zlib', 'lz4', None}
+        Compression applied to every block after run-length encoding
+    blockRows : int
+        Number of rows per independently decodable block
+    meta : dict, optional
+        JSON serializable data stored in the header
+
+    Returns
+    -------
+    encoded : EncodedArray instance
+    """
+
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'Unknown compression {compression}')
+    if compression == 'lz4' and lz4 is None:
+        raise ImportError('lz4 is required for lz4 compression')
+    if array.ndim not in (2, 3):
+        raise ValueError('Only 2D and 3D buffers can be encoded')
+    if array.size == 0:
+        raise ValueError('Empty buffers can not be encoded')
+
+    array = np.ascontiguousarray(array)
+    v_res, h_res = array.shape[:2]
+    pixels = _to_int64(array.reshape(v_res, h_res, -1))
+    n_channels = pixels.shape[2]
+
+    # runs of whole pixels, broken at every row start
+    starts = np.ones((v_res, h_res), dtype=bool)
+    starts[:, 1:] = (pixels[:, 1:] != pixels[:, :-1]).any(axis=2)
+    rowRuns = starts.sum(axis=1)
+    first = np.flatnonzero(starts)
+    lengths = np.diff(np.append(first, v_res * h_res))
+    values = pixels.reshape(-1, n_channels)[first]
+
+    # deltas along the runs, from zero at the first run of every block
+    blockStarts = np.arange(0, v_res, blockRows)
+    runBounds = np.concatenate(([0], np.cumsum(rowRuns)))[
+        np.append(blockStarts, v_res)]
+    deltas = values.copy()
+    deltas[1:] -= values[:-1]
+    deltas[runBounds[:-1]] = values[runBounds[:-1]]
+
+    streams = [varint_encode(rowRuns), varint_encode(lengths),
+               varint_encode(zigzag(deltas).ravel())]
+    # byte offsets of the block boundaries in each stream
+    bounds = [np.append(blockStarts, v_res), runBounds,
+              runBounds * n_channels]
+    offsets = [np.concatenate(([0], np.cumsum(sizes)))[bound]
+               for (data, sizes), bound in zip(streams, bounds)]
+
+    blocks = []
+    for b in range(len(blockStarts)):
+        block = b''.join(data[offset[b]:offset[b + 1]].tobytes()
+                         for (data, sizes), offset in zip(streams, offsets))
+        blocks.append(_compress(block, compression))
+
+    return EncodedArray(array.shape, array.dtype, blockRows, compression,
+                        blocks, meta)
+
+class EncodedArray():
+    """ Run-length encoded image-shaped buffer, as from encode_array
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the buffer
+    dtype : NumPy dtype
+        Type of the buffer
+    blockRows : int
+        Number of rows per block
+    compression : {'zlib', 'lz4', None}
+        Compression of the blocks
+    blocks : list of bytes
+        Encoded blocks
+    meta : dict, optional
+        Data of the caller stored with the buffer
+
+    Attributes
+    ----------
+    nbytes : int
+        Size of the encoded blocks
+    """
+
+    def __init__(self, shape, dtype, blockRows, compression, blocks,
+                 meta=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.blockRows = blockRows
+        self.compression = compression
+        self.blocks = blocks
+        self.meta = meta or {}
+
+    @property
+    def nbytes(self):
+        return sum(len(block) for block in self.blocks)
+
+    @property
+    def ratio(self):
+        """ Size of the decoded buffer over the encoded size """
+        raw = int(np.prod(self.shape)) * self.dtype.itemsize
+        return raw / max(self.nbytes, 1)
+
+    def tobytes(self):
+        header = json.dumps({'version': _VERSION, 'dtype': self.dtype.str,
+                             'shape': self.shape,
+                             'blockRows': self.blockRows,
+                             'compression': self.compression,
+                             'sizes': [len(block) for block in self.blocks],
+                             'meta': self.meta}).encode()
+        return b''.join([_MAGIC, struct.pack('<I', len(header)), header] +
+                        self.blocks)
+
+    @classmethod
+    def frombytes(cls, data):
+        """ Read an EncodedArray written by tobytes
+
+        Raises
+        ------
+        ValueError
+            If the data is not an encoded array
+        """
+
+        data = memoryview(data)
+        if bytes(data[:4]) != _MAGIC:
+            raise ValueError('Not run-length encoded plot data')
+        length, = struct.unpack('<I', data[4:8])
+        header = json.loads(bytes(data[8:8 + length]))
+        if header['version'] > _VERSION:
+            raise ValueError('Encoded with a newer version of the format')
+
+        blocks = []
+        position = 8 + length
+        for size in header['sizes']:
+            blocks.append(bytes(data[position:position + size]))
+            position += size
+        if position != len(data):
+            raise ValueError('Truncated run-length encoded data')
+        return cls(header['shape'], header['dtype'], header['blockRows'],
+                   header['compression'], blocks, header['meta'])
+
+    def decode(self):
+        """ Return the decoded buffer """
+        return self.rows(0, self.shape[0])
+
+    def rows(self, start, stop):
+        """ Decode only the rows start to stop of the buffer, reading only
+        the blocks holding them """
+
+        v_res, h_res = self.shape[:2]
+        start, stop, _ = slice(start, stop).indices(v_res)
+        stop = max(stop, start)
+        if start == stop:
+            return np.empty((0,) + self.shape[1:], self.dtype)
+        first = start // self.blockRows
+        last = max(-(-stop // self.blockRows), first)
+        n_channels = int(np.prod(self.shape[2:], dtype=np.int64))
+
+        data = b''.join(_decompress(block, self.compression)
+                        for block in self.blocks[first:last])
+        ints = varint_decode(data)
+
+        # split the varint streams of every block
+        lengths, deltas, blockRuns = [], [], []
+        position = 0
+        for b in range(first, last):
+            n_rows = min((b + 1) * self.blockRows, v_res) - b * self.blockRows
+            n_runs = int(ints[position:position + n_rows].sum())
+            position += n_rows
+            lengths.append(ints[position:position + n_runs])
+            position += n_runs
+            deltas.append(ints[position:position + n_runs * n_channels])
+            position += n_runs * n_channels
+            blockRuns.append(n_runs)
+        if position != len(ints):
+            raise ValueError('Corrupt run-length encoded data')
+
+        lengths = np.concatenate(lengths or [np.empty(0, np.uint64)])
+        deltas = unzigzag(np.concatenate(deltas or
+                                         [np.empty(0, np.uint64)]))
+        deltas = deltas.reshape(-1, n_channels)
+
+        # cumulative sums restarting at every block
+        values = np.cumsum(deltas, axis=0)
+        ends = np.cumsum(blockRuns, dtype=np.int64)
+        base = np.zeros((len(blockRuns), n_channels), dtype=np.int64)
+        base[1:] = values[ends[:-1] - 1]
+        values -= np.repeat(base, blockRuns, axis=0)
+
+        pixels = np.repeat(_from_int64(values, self.dtype),
+                           lengths.astype(np.int64), axis=0)
+        pixels = pixels.reshape((-1,) + self.shape[1:])
+        offset = first * self.blockRows
+        return pixels[start - offset:stop - offset]
+
+def save_array(filename, array, compression='zlib', meta=None):
+    """ Write a buffer to a run-length encoded file """
+
+    with open(filename, 'wb') as file:
+        file.write(encode_array(array, compression, meta=meta).tobytes())
+
+def load_array(filename):
+    """ Read a file written by save_array
+
+    Returns
+    -------
+    encoded : EncodedArray instance
+        Encoded buffer, decoded with its decode or rows methods
+    """
+
+    with open(filename, 'rb') as file:
+        return EncodedArray.frombytes(file.read())
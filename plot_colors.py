@@ -1,11 +1,161 @@
-
+import functools
 import numpy as np
 
-# for consistent, but random, colors
-np.random.seed(10)
+def hash_ids(ids, seed=0):
+    """ Hash integer ids with the splitmix64 finalizer
+
+    Parameters
+    ----------
+    ids : array_like of int
+        Ids to hash; 64-bit keys such as packed (cell, instance) pairs are
+        hashed in full
+    seed : int
+        Seed selecting an alternative hash
+
+    Returns
+    -------
+    hashes : NumPy uint64 array
+    """
+
+    x = np.asarray(ids, dtype=np.int64).view(np.uint64)
+    x = x + np.uint64((0x9e3779b97f4a7c15 * (seed + 1)) & 0xffffffffffffffff)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+def hash_rgb(ids, seed=0):
+    """ Map integer ids to pseudo-random RGB colors
+
+    The color of a domain depends only on its id and the seed, not on the
+    order in which domains are created or drawn, and all colors are
+    generated at once.
+
+    Parameters
+    ----------
+    ids : array_like of int
+        Domain ids
+    seed : int
+        Seed selecting an alternative color scheme
 
-def random_rgb():
-    return tuple(np.random.choice(range(256), size=3))
+    Returns
+    -------
+    rgb : NumPy uint8 array (..., 3)
+    """
+
+    x = hash_ids(ids, seed)
+    shifts = np.array([0, 8, 16], dtype=np.uint64)
+    return ((x[..., None] >> shifts) & np.uint64(0xff)).astype(np.uint8)
+
+def hash_color(id, seed=0):
+    """ Return the hash_rgb color of a single id as a tuple of int """
+
+    return tuple(hash_rgb([id], seed)[0].tolist())
 
 def rgb_normalize(rgb):
     return tuple([c/255. for c in rgb])
+
+def rgb_to_lab(rgb):
+    """ Convert sRGB colors to CIELAB (D65)
+
+    Parameters
+    ----------
+    rgb : array_like of int (..., 3)
+        Colors with components from 0 to 255
+
+    Returns
+    -------
+    lab : NumPy float array (..., 3)
+    """
+
+    c = np.asarray(rgb, dtype=float) / 255.
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([[0.4124, 0.2126, 0.0193],
+                        [0.3576, 0.7152, 0.1192],
+                        [0.1805, 0.0722, 0.9505]])
+    xyz /= np.array([0.95047, 1., 1.08883])
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz),
+                 (24389 / 27 * xyz + 16) / 116)
+    return np.stack((116 * f[..., 1] - 16,
+                     500 * (f[..., 0] - f[..., 1]),
+                     200 * (f[..., 1] - f[..., 2])), axis=-1)
+
+@functools.lru_cache(maxsize=None)
+def distinct_colors(n, lightness=(35., 90.)):
+    """ Return n colors spread as far apart as possible in CIELAB
+
+    Colors are picked from a grid of sRGB colors by farthest point
+    sampling, so every prefix of the result is itself well spread.
+
+    Parameters
+    ----------
+    n : int
+        Number of colors
+    lightness : 2-tuple of float
+        Range of CIELAB lightness of the colors, which keeps them apart
+        from dark backgrounds and masks
+
+    Returns
+    -------
+    rgb : NumPy uint8 array (n, 3)
+    """
+
+    levels = np.linspace(0, 255, 16)
+    grid = np.stack(np.meshgrid(levels, levels, levels,
+                                indexing='ij'), axis=-1).reshape(-1, 3)
+    lab = rgb_to_lab(grid)
+    keep = (lab[:, 0] >= lightness[0]) & (lab[:, 0] <= lightness[1])
+    grid, lab = grid[keep], lab[keep]
+
+    # start from the most saturated color
+    picked = [int(np.argmax(np.hypot(lab[:, 1], lab[:, 2])))]
+    distance = np.linalg.norm(lab - lab[picked[0]], axis=1)
+    for _ in range(n - 1):
+        picked.append(int(np.argmax(distance)))
+        distance = np.minimum(distance,
+                              np.linalg.norm(lab - lab[picked[-1]], axis=1))
+    return np.round(grid[picked]).astype(np.uint8)
+
+@functools.lru_cache(maxsize=None)
+def colormap_lut(name, n=256):
+    """ Return an (n, 3) uint8 lookup table sampled from a matplotlib colormap """
+
+    try:
+        from matplotlib import colormaps
+        cmap = colormaps[name]
+    except ImportError:
+        from matplotlib.cm import get_cmap
+        cmap = get_cmap(name)
+    rgba = cmap(np.linspace(0., 1., n))
+    return np.round(rgba[:, :3] * 255).astype(np.uint8)
+
+def apply_lut(values, lut, vmin, vmax, log=False):
+    """ Map an array of values to RGB through a lookup table
+
+    Parameters
+    ----------
+    values : NumPy float array
+        Values to colormap
+    lut : NumPy uint8 array (n, 3)
+        Lookup table from colormap_lut
+    vmin, vmax : float
+        Values mapped to the first and last entries of the table; values
+        outside the limits are clipped
+    log : bool
+        Whether to scale values logarithmically between the limits
+
+    Returns
+    -------
+    rgb : NumPy uint8 array (..., 3)
+    """
+
+    values = np.asarray(values, dtype=float)
+    if log:
+        tiny = np.finfo(float).tiny
+        values = np.log10(np.maximum(values, tiny))
+        vmin, vmax = np.log10(max(vmin, tiny)), np.log10(max(vmax, tiny))
+
+    scale = (len(lut) - 1) / (vmax - vmin) if vmax > vmin else 0.
+    index = (values - vmin) * scale
+    np.clip(index, 0, len(lut) - 1, out=index)
+    index[~np.isfinite(index)] = 0
+    return lut[index.astype(np.intp)]
@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Compare plot slices of two OpenMC models pixel by pixel
+
+Each model is traced by its own worker process with its own openmc.capi
+session, and the cell or material ids of every pixel are compared.
+
+Usage:
+
+    python plot_compare.py old_model new_model --origin 0 0 0 --width 100
+    python plot_compare.py old_model new_model --kind material --image d.png
+    python plot_compare.py old_model new_model --save reference.pxrl
+    python plot_compare.py reference.pxrl newer_model
+
+The exit status is 1 if any pixel differs, so comparisons can gate
+geometry revisions in scripts. Id maps saved with --save, in the format
+of plot_codec, can be given in place of a model directory with the same
+view settings, so a reference is only traced once.
+"""
+
+import argparse, json, os, sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from plot_codec import load_array, save_array
+from plot_export import export_raster
+from plot_memory import array_bytes
+from plot_workers import RenderWorker
+
+# id buffer channel of each comparable domain kind
+KIND_CHANNELS = {'Cell': 0, 'Material': -1}
+
+_NOT_FOUND_ = -2
+
+def diff_ids(before, after):
+    """ Return a mask of the pixels whose ids differ between two id maps
+
+    Parameters
+    ----------
+    before, after : NumPy int arrays (v_res, h_res)
+        Domain ids of the same view of two models
+
+    Returns
+    -------
+    changed : NumPy bool array (v_res, h_res)
+    """
+
+    if before.shape != after.shape:
+        raise ValueError(f'Id maps of shape {before.shape} and '
+                         f'{after.shape} can not be compared')
+    return before != after
+
+def domain_changes(before, after, changed):
+    """ Count changed pixels per domain
+
+    Parameters
+    ----------
+    before, after : NumPy int arrays (v_res, h_res)
+        Domain ids of the same view of two models
+    changed : NumPy bool array (v_res, h_res)
+        Pixels that differ, as returned by diff_ids
+
+    Returns
+    -------
+    changes : list of (int, int, int, list of (int, int))
+        Domain id in the first model, its number of pixels, the number of
+        them that changed, and the ids they changed to with pixel counts,
+        most changed domains first
+    """
+
+    ids, totals = np.unique(before, return_counts=True)
+    totals = dict(zip(ids.tolist(), totals.tolist()))
+
+    # pack (old, new) id pairs so one sort counts every transition
+    pairs = (before[changed].astype(np.int64) << 32) | \
+        (after[changed].astype(np.int64) & 0xffffffff)
+    keys, counts = np.unique(pairs, return_counts=True)
+    old = (keys >> 32).tolist()
+    new = (keys & 0xffffffff).astype(np.uint32).view(np.int32).tolist()
+
+    transitions = {}
+    for o, n, count in zip(old, new, counts.tolist()):
+        transitions.setdefault(o, []).append((n, count))
+
+    changes = []
+    for id, targets in transitions.items():
+        targets.sort(key=lambda target: -target[1])
+        changes.append((id, totals[id], sum(c for _, c in targets), targets))
+    changes.sort(key=lambda change: -change[2])
+    return changes
+
+def highlight_changes(image, changed, color=(255, 0, 255), fade=0.65):
+    """ Draw changed pixels over a faded copy of an image
+
+    Parameters
+    ----------
+    image : NumPy uint8 array (v_res, h_res, 3)
+        RGB image of the plot
+    changed : NumPy bool array (v_res, h_res)
+        Pixels to highlight
+    color : 3-tuple of int
+        RGB color of changed pixels
+    fade : float
+        Fraction by which unchanged pixels are faded to gray
+
+    Returns
+    -------
+    image : NumPy uint8 array (v_res, h_res, 3)
+    """
+
+    highlighted = np.round(image * (1. - fade) + 128. * fade).astype(np.uint8)
+    highlighted[changed] = color
+    return highlighted
+
+class ModelComparison():
+    """ Comparison of the current plot against another model
+
+    The other model is traced in a RenderWorker, once per change of the
+    trace settings of the current plot.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with the .xml files of the other model
+
+    Attributes
+    ----------
+    kind : {'Cell', 'Material'}
+        Domain kind of the last comparison
+    color : 3-tuple of int
+        RGB color of changed pixels
+    changed : NumPy bool array (v_res, h_res)
+        Pixels whose ids differ in the last comparison
+    changes : list
+        Changed pixels by domain of the last comparison, as returned by
+        domain_changes
+    """
+
+    def __init__(self, directory):
+        self.worker = RenderWorker(directory)
+        self.directory = self.worker.directory
+        self.kind = 'Cell'
+        self.color = (255, 0, 255)
+        self.changed = None
+        self.changes = []
+        self._traceKey = None
+        self._other = None
+        self._compareKey = None
+
+    def compare(self, traceKey, idBuffer, kind):
+        """ Compare an id buffer of the current model with the other model
+
+        Parameters
+        ----------
+        traceKey : tuple
+            Trace settings of idBuffer, from PlotView.getTraceKey
+        idBuffer : NumPy int array (v_res, h_res, n_channels)
+            Id map of the current model
+        kind : {'Cell', 'Material'}
+            Domain kind to compare
+
+        Returns
+        -------
+        changed : NumPy bool array (v_res, h_res)
+        """
+
+        if traceKey != self._traceKey:
+            self._other = self.worker.idMap(traceKey)
+            self._traceKey = traceKey
+            self._compareKey = None
+
+        if (traceKey, kind) != self._compareKey:
+            channel = KIND_CHANNELS[kind]
+            before = idBuffer[:, :, channel]
+            after = self._other[:, :, channel]
+            self.changed = diff_ids(before, after)
+            self.changes = domain_changes(before, after, self.changed)
+            self.kind = kind
+            self._compareKey = (traceKey, kind)
+        return self.changed
+
+    def highlight(self, image):
+        return highlight_changes(image, self.changed, self.color)
+
+    @property
+    def nbytes(self):
+        """ Size of the id map of the other model and the changed mask """
+        return array_bytes(self._other, self.changed)
+
+    def close(self):
+        self.worker.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before', help='directory of the first model, or '
+                        'an id map saved with --save')
+    parser.add_argument('after', help='directory of the second model, or '
+                        'an id map saved with --save')
+    parser.add_argument('--origin', type=float, nargs=3, default=(0., 0., 0.))
+    parser.add_argument('--width', type=float, default=100.)
+    parser.add_argument('--height', type=float,
+                        help='defaults to the width')
+    parser.add_argument('--basis', choices=('xy', 'xz', 'yz'), default='xy')
+    parser.add_argument('--resolution', type=int, nargs=2, default=(1000, 1000),
+                        metavar=('H_RES', 'V_RES'))
+    parser.add_argument('--level', type=int, default=-1,
+                        help='universe level; -1 traces the deepest level')
+    parser.add_argument('--kind', choices=('cell', 'material'),
+                        default='cell')
+    parser.add_argument('--image', help='PNG/PPM/TIFF file to write the '
+                        'changed pixels to')
+    parser.add_argument('--top', type=int, default=20,
+                        help='number of domains listed')
+    parser.add_argument('--save', metavar='FILE', help='file to write the '
+                        'id map of the second model to')
+    args = parser.parse_args(argv)
+
+    height = args.height if args.height is not None else args.width
+    key = (tuple(args.origin), args.width, height, args.basis,
+           args.resolution[0], args.resolution[1], args.level)
+    channel = KIND_CHANNELS[args.kind.capitalize()]
+
+    def trace(source):
+        if os.path.isfile(source):
+            encoded = load_array(source)
+            if encoded.meta.get('key') != json.loads(json.dumps(key)):
+                raise SystemExit(f'{source} was traced with other view '
+                                 'settings')
+            return encoded.decode()
+        worker = RenderWorker(source)
+        try:
+            return worker.idMap(key)
+        finally:
+            worker.close()
+
+    # both models are initialized and traced concurrently
+    with ThreadPoolExecutor(2) as pool:
+        before, after = pool.map(trace, (args.before, args.after))
+    if args.save:
+        save_array(args.save, after, meta={'key': key})
+    before = before[:, :, channel]
+    after = after[:, :, channel]
+
+    changed = diff_ids(before, after)
+    changes = domain_changes(before, after, changed)
+
+    n_changed = int(changed.sum())
+    print(f'{n_changed} of {changed.size} pixels changed '
+          f'({100. * n_changed / changed.size:.3f} %)')
+    for id, total, count, targets in changes[:args.top]:
+        name = 'void' if id == _NOT_FOUND_ else f'{args.kind} {id}'
+        became = ', '.join(f'{n} ({c})' for n, c in targets[:3])
+        print(f'  {name:<20} {count:>10} of {total:>10} pixels -> {became}')
+
+    if args.image:
+        image = np.zeros(changed.shape + (3,), dtype=np.uint8)
+        image[before != _NOT_FOUND_] = 64
+        image[changed] = (255, 0, 255)
+        h_res, v_res = args.resolution
+        export_raster(args.image, [(0, image)], h_res, v_res,
+                      pixelSize=args.width / h_res)
+
+    return 1 if n_changed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
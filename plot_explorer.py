@@ -1,32 +1,89 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
-import os, sys, copy, pickle, openmc
+import argparse, os, sys, copy, threading, openmc
+from concurrent.futures import Future
+import numpy as np
 from PySide2 import QtCore, QtGui
 from PySide2.QtWidgets import (QApplication, QLabel, QSizePolicy, QMainWindow,
-    QScrollArea, QMenu, QAction, QFileDialog, QColorDialog, QInputDialog)
-from plotmodel import PlotModel, DomainTableModel
-from plotgui import PlotImage, ColorDialog, OptionsDock
+    QScrollArea, QMenu, QAction, QFileDialog, QColorDialog, QInputDialog,
+    QMessageBox, QProgressDialog)
+from plotmodel import (PlotModel, DomainTableModel, DOMAIN_KINDS, PROPERTIES,
+    dump_fingerprinted, load_fingerprinted)
+from plotgui import (PlotImage, ColorDialog, OptionsDock, PanesDock,
+    ConsoleDock, ExportDialog, AnimationDialog, CompareDialog, ScanDialog,
+    MemoryDialog)
+from plot_api import PlotController, connect_model
+from plot_server import RenderClient
+from plot_profiler import profiler
+from plot_tally import MeshTallyOverlay, list_mesh_tallies
+from plot_compare import ModelComparison
+from plot_scan import ModelScan, slice_keys
+from plot_workers import WorkerPool
+from plot_scheduler import RenderScheduler, PREFETCH
+from plot_memory import (MemoryAccountant, PREFETCH_CACHE, RENDER_CACHE,
+    WORKERS, HISTORY, format_bytes)
+from plot_shm import arena
+from plot_animation import (interpolate_views, render_animation,
+    ImageSequenceWriter, EncoderWriter)
+
+def close_started_pool(future):
+    """ Close a worker pool started by MainWindow.startWorkers, if it
+    started """
+
+    if future.exception() is None:
+        future.result().close()
 
 class MainWindow(QMainWindow):
-    def __init__(self):
-        super(MainWindow, self).__init__()
 
-        openmc.capi.init(['-c'])
+    # view and future of every id map trace requested by requestPlot
+    traced = QtCore.Signal(object, object)
+    # view and future of every property map trace of requestProperties
+    propertiesTraced = QtCore.Signal(object, object)
+    # future of every worker pool started by startWorkers
+    workersStarted = QtCore.Signal(object)
 
-        self.setWindowTitle('OpenMC Plot Explorer')
+    def __init__(self, server=None, n_workers=2):
+        super(MainWindow, self).__init__()
+
+        if server is None:
+            openmc.capi.init(['-c'])
+            self.setWindowTitle('OpenMC Plot Explorer')
+            self.model = PlotModel()
+        else:
+            # the OpenMC session lives in the server; only the model .xml
+            # files are read here
+            self.model = connect_model(RenderClient(server))
+            self.setWindowTitle(f'OpenMC Plot Explorer - {server}')
+
+        # every trace of the model is queued by priority
+        self.model.scheduler = RenderScheduler(self.model.traceIdsNow)
+        self.traced.connect(self.showTrace)
+        self.propertiesTraced.connect(self.showProperties)
+        # trace settings of the last property map requested for hovering
+        self.propertiesKey = None
 
         self.restored = False
         self.pixmap = None
         self.zoom = 100
+        self.workerPool = None
+        self.workersStarting = None
+        self.workersStarted.connect(self.showWorkers)
+        # workers for the slice panes and animations, started on first use;
+        # through a server, only scans start them, as OpenMC may not be
+        # available here
+        self.n_workers = n_workers if server is None else 0
 
-        self.model = PlotModel()
         self.updateRelativeBases()
         self.restoreModelSettings()
 
+        # scripted changes refresh the GUI after rendering
+        self.controller = PlotController(self.model)
+        self.controller.listeners.append(self.refreshView)
+
         self.cellsModel = DomainTableModel(self.model.activeView.cells)
         self.materialsModel = DomainTableModel(self.model.activeView.materials)
-
+        self.universesModel = DomainTableModel(self.model.activeView.universes)
 
         # Create viewing area
         self.frame = QScrollArea(self)
@@ -43,10 +100,41 @@ class MainWindow(QMainWindow):
         self.dock.setObjectName("OptionsDock")
         self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.dock)
 
+        # Slice Panes
+        self.panesDock = PanesDock(self.model, self)
+        self.panesDock.setObjectName("PanesDock")
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.panesDock)
+        self.panesDock.hide()
+
+        # Console
+        namespace = {'plot': self.controller, 'model': self.model, 'np': np}
+        self.consoleDock = ConsoleDock(namespace, self)
+        self.consoleDock.setObjectName("ConsoleDock")
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.consoleDock)
+        self.consoleDock.hide()
+
         # Color Dialog
         self.colorDialog = ColorDialog(self.model, FM, self)
         self.colorDialog.hide()
 
+        # Animation Dialog
+        self.animationDialog = AnimationDialog(self.model, self)
+        self.animationDialog.hide()
+
+        # Compare Dialog
+        self.compareDialog = CompareDialog(self.model, self)
+        self.compareDialog.hide()
+
+        # Scan Dialog
+        self.scanDialog = ScanDialog(self.model, self)
+        self.scanDialog.hide()
+
+        # Memory accounting
+        self.memory = MemoryAccountant(self.getMemoryBudget())
+        self.registerMemory()
+        self.memoryDialog = MemoryDialog(self.memory, self)
+        self.memoryDialog.hide()
+
         # Restore Window Settings
         self.restoreWindowSettings()
 
@@ -58,6 +146,10 @@ class MainWindow(QMainWindow):
         self.statusBar().addPermanentWidget(self.coord_label)
         self.coord_label.hide()
 
+        self.timing_label = QLabel()
+        self.statusBar().addPermanentWidget(self.timing_label)
+        self.timing_label.setVisible(profiler.enabled)
+
         # Load Plot
         self.statusBar().showMessage('Generating Plot...')
         self.dock.updateDock()
@@ -67,8 +159,7 @@ class MainWindow(QMainWindow):
             self.showCurrentView()
         else:
             # Timer allows GUI to render before plot finishes loading
-            QtCore.QTimer.singleShot(0, self.model.generatePlot)
-            QtCore.QTimer.singleShot(0, self.showCurrentView)
+            QtCore.QTimer.singleShot(0, self.requestPlot)
 
     # Create and update menus:
     def createMenuBar(self):
@@ -82,6 +173,27 @@ class MainWindow(QMainWindow):
         self.saveImageAction.setStatusTip('Save plot image')
         self.saveImageAction.triggered.connect(self.saveImage)
 
+        self.exportImageAction = QAction("&Export Image...", self)
+        self.exportImageAction.setShortcut("Ctrl+E")
+        self.exportImageAction.setToolTip('Export plot image at full resolution')
+        self.exportImageAction.setStatusTip('Write the plot image to PNG, PPM '
+                                            'or TIFF at plot resolution or '
+                                            'any other resolution')
+        self.exportImageAction.triggered.connect(self.exportImage)
+
+        self.animationAction = QAction("Export &Animation...", self)
+        self.animationAction.setToolTip('Render a flythrough along keyframes')
+        self.animationAction.setStatusTip('Render an animation along a path '
+                                          'of keyframe views to a video or '
+                                          'image sequence')
+        self.animationAction.triggered.connect(self.showAnimationDialog)
+
+        self.vectorAction = QAction("Export &Vector Image...", self)
+        self.vectorAction.setToolTip('Export plot regions as SVG or PDF')
+        self.vectorAction.setStatusTip('Export the outlines of every plot '
+                                       'region as an SVG or PDF figure')
+        self.vectorAction.triggered.connect(self.exportVectorImage)
+
         self.saveViewAction = QAction("Save &View Settings...", self)
         self.saveViewAction.setShortcut(QtGui.QKeySequence.Save)
         self.saveViewAction.setStatusTip('Save current view settings')
@@ -93,6 +205,23 @@ class MainWindow(QMainWindow):
         self.openAction.setStatusTip('Open saved view settings')
         self.openAction.triggered.connect(self.openView)
 
+        self.tallyAction = QAction("Open &Tally Overlay...", self)
+        self.tallyAction.setToolTip('Overlay a mesh tally from a statepoint')
+        self.tallyAction.setStatusTip('Overlay a mesh tally from an OpenMC '
+                                      'statepoint file')
+        self.tallyAction.triggered.connect(self.openTallyOverlay)
+
+        self.removeTallyAction = QAction("&Remove Tally Overlay", self)
+        self.removeTallyAction.setToolTip('Remove mesh tally overlay')
+        self.removeTallyAction.setStatusTip('Remove mesh tally overlay')
+        self.removeTallyAction.triggered.connect(self.removeTallyOverlay)
+
+        self.traceAction = QAction("Export &Timing Trace...", self)
+        self.traceAction.setToolTip('Export timings as Chrome trace events')
+        self.traceAction.setStatusTip('Export recorded timings as Chrome '
+                                      'trace-event JSON')
+        self.traceAction.triggered.connect(self.exportTrace)
+
         self.quitAction = QAction("&Quit", self)
         self.quitAction.setShortcut(QtGui.QKeySequence.Quit)
         self.quitAction.setToolTip('Quit OpenMC Plot Explorer')
@@ -100,11 +229,20 @@ class MainWindow(QMainWindow):
         self.quitAction.triggered.connect(self.close)
 
         self.fileMenu = self.mainMenu.addMenu('&File')
+        self.fileMenu.aboutToShow.connect(self.updateFileMenu)
         self.fileMenu.addAction(self.saveImageAction)
+        self.fileMenu.addAction(self.exportImageAction)
+        self.fileMenu.addAction(self.vectorAction)
+        self.fileMenu.addAction(self.animationAction)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.saveViewAction)
         self.fileMenu.addAction(self.openAction)
         self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.tallyAction)
+        self.fileMenu.addAction(self.removeTallyAction)
+        self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.traceAction)
+        self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.quitAction)
 
         # Edit Menu
@@ -192,9 +330,29 @@ class MainWindow(QMainWindow):
         self.materialAction.triggered.connect(lambda :
             self.editColorBy('material', apply=True))
 
+        self.instanceAction = QAction('Cell &Instance', self)
+        self.instanceAction.setCheckable(True)
+        self.instanceAction.setShortcut('Alt+I')
+        self.instanceAction.setToolTip('Color by cell instance')
+        self.instanceAction.setStatusTip('Color plot by distributed cell '
+                                         'instance')
+        self.instanceAction.triggered.connect(lambda :
+            self.editColorBy('instance', apply=True))
+
+        self.universeAction = QAction('&Universe', self)
+        self.universeAction.setCheckable(True)
+        self.universeAction.setShortcut('Alt+U')
+        self.universeAction.setToolTip('Color by universe')
+        self.universeAction.setStatusTip('Color plot by universe at the '
+                                         'traced level')
+        self.universeAction.triggered.connect(lambda :
+            self.editColorBy('universe', apply=True))
+
         self.colorbyMenu = self.editMenu.addMenu('&Color By')
         self.colorbyMenu.addAction(self.cellAction)
         self.colorbyMenu.addAction(self.materialAction)
+        self.colorbyMenu.addAction(self.instanceAction)
+        self.colorbyMenu.addAction(self.universeAction)
         self.colorbyMenu.aboutToShow.connect(self.updateColorbyMenu)
 
         self.editMenu.addSeparator()
@@ -217,6 +375,27 @@ class MainWindow(QMainWindow):
             self.toggleHighlighting(bool, apply=True))
         self.editMenu.addAction(self.highlightingAct)
 
+        self.outlinesAction = QAction('Show &Outlines', self)
+        self.outlinesAction.setShortcut('Ctrl+B')
+        self.outlinesAction.setCheckable(True)
+        self.outlinesAction.setToolTip('Toggle outlines')
+        self.outlinesAction.setStatusTip('Toggle whether cell/material '
+                                         'boundaries are outlined')
+        self.outlinesAction.triggered[bool].connect(lambda bool=bool:
+            self.toggleOutlines(bool, apply=True))
+        self.editMenu.addAction(self.outlinesAction)
+
+        self.neighborAction = QAction('Distinct &Neighbor Colors', self)
+        self.neighborAction.setShortcut('Ctrl+Shift+N')
+        self.neighborAction.setCheckable(True)
+        self.neighborAction.setToolTip('Toggle distinct neighbor colors')
+        self.neighborAction.setStatusTip('Toggle whether touching '
+                                         'cells/materials are always given '
+                                         'different colors')
+        self.neighborAction.triggered[bool].connect(lambda bool=bool:
+            self.toggleNeighborColors(bool, apply=True))
+        self.editMenu.addAction(self.neighborAction)
+
         # View Menu
         self.dockAction = QAction('Hide &Dock', self)
         self.dockAction.setShortcut("Ctrl+D")
@@ -224,18 +403,98 @@ class MainWindow(QMainWindow):
         self.dockAction.setStatusTip('Toggle dock visibility')
         self.dockAction.triggered.connect(self.toggleDockView)
 
+        self.panesAction = QAction('Show Slice &Panes', self)
+        self.panesAction.setShortcut('Ctrl+Shift+P')
+        self.panesAction.setCheckable(True)
+        self.panesAction.setToolTip('Toggle slice panes')
+        self.panesAction.setStatusTip('Toggle linked xy, xz and yz slices '
+                                      'through the plot origin')
+        self.panesAction.triggered[bool].connect(self.togglePanes)
+
+        self.consoleAction = QAction('Show &Console', self)
+        self.consoleAction.setShortcut('Ctrl+Shift+C')
+        self.consoleAction.setCheckable(True)
+        self.consoleAction.setToolTip('Toggle Python console')
+        self.consoleAction.setStatusTip('Toggle a Python console for '
+                                        'scripting the plot')
+        self.consoleAction.triggered[bool].connect(self.toggleConsole)
+
         self.zoomAction = QAction('&Zoom...', self)
         self.zoomAction.setShortcut('Alt+Shift+Z')
         self.zoomAction.setToolTip('Edit zoom factor')
         self.zoomAction.setStatusTip('Edit zoom factor')
         self.zoomAction.triggered.connect(self.editZoomAct)
 
+        self.timingAction = QAction('Show &Timings', self)
+        self.timingAction.setShortcut('Ctrl+T')
+        self.timingAction.setCheckable(True)
+        self.timingAction.setToolTip('Toggle render timings')
+        self.timingAction.setStatusTip('Toggle per-stage timings of the last '
+                                       'render in the status bar')
+        self.timingAction.triggered[bool].connect(self.toggleTimings)
+
         self.viewMenu = self.mainMenu.addMenu('&View')
         self.viewMenu.addAction(self.dockAction)
+        self.viewMenu.addAction(self.panesAction)
+        self.viewMenu.addAction(self.consoleAction)
         self.viewMenu.addSeparator()
         self.viewMenu.addAction(self.zoomAction)
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.timingAction)
         self.viewMenu.aboutToShow.connect(self.updateViewMenu)
 
+        # Tools Menu
+        self.compareAction = QAction('&Compare With Model...', self)
+        self.compareAction.setToolTip('Highlight differences from another model')
+        self.compareAction.setStatusTip('Trace the current view of another '
+                                        'model and highlight the pixels '
+                                        'that differ')
+        self.compareAction.triggered.connect(self.startComparison)
+
+        self.stopCompareAction = QAction('&Stop Comparing', self)
+        self.stopCompareAction.setToolTip('Stop comparing with another model')
+        self.stopCompareAction.setStatusTip('Stop comparing with another model')
+        self.stopCompareAction.triggered.connect(self.stopComparison)
+
+        self.scanAction = QAction('Scan For &Undefined Regions...', self)
+        self.scanAction.setToolTip('Find undefined regions and overlaps')
+        self.scanAction.setStatusTip('Sweep slices across the geometry for '
+                                     'undefined regions and overlapping cells')
+        self.scanAction.triggered.connect(self.showScanDialog)
+
+        self.workerStatusAction = QAction('&Worker Status...', self)
+        self.workerStatusAction.setToolTip('Show the state of the worker '
+                                           'processes')
+        self.workerStatusAction.setStatusTip('Show the jobs, restarts and '
+                                             'utilization of every worker '
+                                             'process')
+        self.workerStatusAction.triggered.connect(self.showWorkerStatus)
+
+        self.stopWorkersAction = QAction('Stop &Workers', self)
+        self.stopWorkersAction.setToolTip('Stop the worker processes')
+        self.stopWorkersAction.setStatusTip('Stop the worker processes kept '
+                                            'running between scans')
+        self.stopWorkersAction.triggered.connect(self.stopWorkers)
+
+        self.memoryAction = QAction('&Memory Usage...', self)
+        self.memoryAction.setToolTip('Show memory usage against the budget')
+        self.memoryAction.setStatusTip('Show the memory held by the plot, '
+                                       'caches and undo history, and set '
+                                       'the memory budget')
+        self.memoryAction.triggered.connect(self.showMemoryDialog)
+
+        self.toolsMenu = self.mainMenu.addMenu('&Tools')
+        self.toolsMenu.addAction(self.compareAction)
+        self.toolsMenu.addAction(self.stopCompareAction)
+        self.toolsMenu.addSeparator()
+        self.toolsMenu.addAction(self.scanAction)
+        self.toolsMenu.addSeparator()
+        self.toolsMenu.addAction(self.workerStatusAction)
+        self.toolsMenu.addAction(self.stopWorkersAction)
+        self.toolsMenu.addSeparator()
+        self.toolsMenu.addAction(self.memoryAction)
+        self.toolsMenu.aboutToShow.connect(self.updateToolsMenu)
+
         # Window Menu
         self.mainWindowAction = QAction('&Main Window', self)
         self.mainWindowAction.setShortcut('Alt+W')
@@ -256,12 +515,22 @@ class MainWindow(QMainWindow):
         self.windowMenu.addAction(self.colorDialogAction)
         self.windowMenu.aboutToShow.connect(self.updateWindowMenu)
 
+    def updateFileMenu(self):
+        self.removeTallyAction.setDisabled(self.model.tallyOverlay is None)
+
+    def updateToolsMenu(self):
+        self.stopCompareAction.setDisabled(self.model.comparison is None)
+        self.workerStatusAction.setDisabled(self.workerPool is None)
+        self.stopWorkersAction.setDisabled(self.workerPool is None)
+
     def updateEditMenu(self):
         changed = self.model.currentView != self.model.defaultView
         self.restoreAction.setDisabled(not changed)
 
         self.maskingAction.setChecked(self.model.currentView.masking)
         self.highlightingAct.setChecked(self.model.currentView.highlighting)
+        self.outlinesAction.setChecked(self.model.currentView.outlines)
+        self.neighborAction.setChecked(self.model.currentView.neighborColors)
 
         self.undoAction.setText(f'&Undo ({len(self.model.previousViews)})')
         self.redoAction.setText(f'&Redo ({len(self.model.subsequentViews)})')
@@ -275,12 +544,17 @@ class MainWindow(QMainWindow):
         cv = self.model.currentView
         self.cellAction.setChecked(cv.colorby == 'cell')
         self.materialAction.setChecked(cv.colorby == 'material')
+        self.instanceAction.setChecked(cv.colorby == 'instance')
+        self.universeAction.setChecked(cv.colorby == 'universe')
 
     def updateViewMenu(self):
         if self.dock.isVisible():
             self.dockAction.setText('Hide &Dock')
         else:
             self.dockAction.setText('Show &Dock')
+        self.panesAction.setChecked(self.panesDock.isVisible())
+        self.consoleAction.setChecked(self.consoleDock.isVisible())
+        self.timingAction.setChecked(profiler.enabled)
 
     def updateWindowMenu(self):
         self.colorDialogAction.setChecked(self.colorDialog.isActiveWindow())
@@ -297,6 +571,105 @@ class MainWindow(QMainWindow):
             self.plotIm.figure.savefig(filename, transparent=True)
             self.statusBar().showMessage('Plot Image Saved', 5000)
 
+    def exportImage(self):
+        dialog = ExportDialog(self.model, self)
+        if not dialog.exec_():
+            return
+
+        filename, ext = QFileDialog.getSaveFileName(self, "Export Image",
+                        "untitled", "PNG (*.png);;PPM (*.ppm);;TIFF (*.tif)")
+        if not filename:
+            return
+        if "." not in filename:
+            filename += {'PPM': '.ppm', 'TIFF': '.tif'}.get(ext.split()[0],
+                                                            '.png')
+
+        h_res, v_res = dialog.getResolution()
+        self.statusBar().showMessage('Exporting Image...')
+        QApplication.processEvents()
+        try:
+            self.controller.exportImage(filename, h_res, v_res,
+                                        dialog.scaleBarCheck.isChecked())
+        except Exception as e:
+            QMessageBox.warning(self, 'Export Image', str(e))
+            self.statusBar().clearMessage()
+            return
+        self.statusBar().showMessage(f'Image Exported ({h_res} x {v_res})',
+                                     5000)
+
+    def exportVectorImage(self):
+        filename, ext = QFileDialog.getSaveFileName(self, "Export Vector Image",
+                                "untitled", "SVG (*.svg);;PDF (*.pdf)")
+        if filename:
+            if "." not in filename:
+                filename += ".pdf" if "pdf" in ext else ".svg"
+            self.statusBar().showMessage('Exporting Vector Image...')
+            QApplication.processEvents()
+            n_regions = self.controller.exportVector(filename)
+            self.statusBar().showMessage(f'Vector Image Exported '
+                                         f'({n_regions} regions)', 5000)
+
+    def showAnimationDialog(self):
+        self.animationDialog.show()
+        self.animationDialog.raise_()
+        self.animationDialog.activateWindow()
+
+    def renderAnimation(self, keyframes, n_frames, fps):
+        if not keyframes:
+            QMessageBox.warning(self, 'Export Animation',
+                                'Add at least one keyframe.')
+            return
+
+        filename, ext = QFileDialog.getSaveFileName(self, "Export Animation",
+                            "animation", "Video (*.mp4 *.mkv *.avi *.gif);;"
+                            "Image Sequence (*.png *.ppm *.tif)")
+        if not filename:
+            return
+        if "." not in os.path.basename(filename):
+            filename += ".png" if ext.startswith("Image") else ".mp4"
+
+        cv = self.model.currentView
+        base, suffix = os.path.splitext(filename)
+        try:
+            if suffix.lower() in ('.png', '.ppm', '.tif', '.tiff'):
+                writer = ImageSequenceWriter(base + '_{:05d}' + suffix)
+            else:
+                writer = EncoderWriter(filename, cv.h_res, cv.v_res, fps)
+        except Exception as e:
+            QMessageBox.warning(self, 'Export Animation', str(e))
+            return
+
+        progress = QProgressDialog('Rendering animation...', 'Cancel', 0,
+                                   n_frames, self)
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def update(done):
+            progress.setValue(done)
+            QApplication.processEvents()
+            return not progress.wasCanceled()
+
+        if self.n_workers:
+            try:
+                self.getWorkerPool(self.n_workers)
+            except Exception as e:
+                # frames are traced in the application instead
+                self.statusBar().showMessage(f'Workers failed to start: '
+                                             f'{e}', 5000)
+
+        views = interpolate_views(cv, keyframes, n_frames)
+        try:
+            with profiler.timer('animation'):
+                done = render_animation(self.model, views, writer,
+                                        progress=update)
+        except Exception as e:
+            QMessageBox.warning(self, 'Export Animation', str(e))
+            return
+        finally:
+            progress.close()
+        self.statusBar().showMessage(f'Animation Exported ({done} frames)',
+                                     5000)
+
     def saveView(self):
         filename, ext = QFileDialog.getSaveFileName(self, "Save View Settings",
                                         "untitled", "View Settings (*.pltvw)")
@@ -307,49 +680,434 @@ class MainWindow(QMainWindow):
             saved = {'default': self.model.defaultView,
                      'current': self.model.currentView}
 
-            with open(filename, 'wb') as file:
-                pickle.dump(saved, file)
+            dump_fingerprinted(filename, self.model.fingerprint, saved)
 
     def openView(self):
         filename, ext = QFileDialog.getOpenFileName(self, "Open View Settings",
                                                     ".", "*.pltvw")
         if filename:
             try:
-                with open(filename, 'rb') as file:
-                    saved = pickle.load(file)
+                saved = load_fingerprinted(filename, self.model.fingerprint)
             except Exception:
-                message = 'Error loading plot settings'
-                saved = {'default': None, 'current': None}
-            if saved['default'] == self.model.defaultView:
+                saved = False
+            if saved:
                 self.model.activeView = saved['current']
                 self.dock.updateDock()
                 self.applyChanges()
                 message = f'{filename} settings loaded'
-            else:
+            elif saved is None:
                 message = 'Error loading plot settings. Incompatible model.'
+            else:
+                message = 'Error loading plot settings'
             self.statusBar().showMessage(message, 5000)
 
-    def applyChanges(self):
-        if self.model.activeView != self.model.currentView:
-            self.statusBar().showMessage('Generating Plot...')
+    def openTallyOverlay(self):
+        filename, ext = QFileDialog.getOpenFileName(self, "Open Statepoint",
+                                        ".", "Statepoint (*.h5 *.hdf5)")
+        if not filename:
+            return
+
+        try:
+            tallies = list_mesh_tallies(filename)
+        except Exception as e:
+            QMessageBox.warning(self, 'Tally Overlay', str(e))
+            return
+        if not tallies:
+            QMessageBox.warning(self, 'Tally Overlay',
+                                'No tallies with a single mesh filter found.')
+            return
+
+        items = [f"Tally {id}: {desc}" for id, column, desc in tallies]
+        item, ok = QInputDialog.getItem(self, 'Tally Overlay', 'Tally:',
+                                        items, 0, False)
+        if not ok:
+            return
+        id, column, desc = tallies[items.index(item)]
+
+        try:
+            overlay = MeshTallyOverlay(filename, id, column, item)
+        except Exception as e:
+            QMessageBox.warning(self, 'Tally Overlay', str(e))
+            return
+
+        if self.model.tallyOverlay is not None:
+            self.model.tallyOverlay.close()
+        self.model.tallyOverlay = overlay
+
+        # the geometry is drawn over the tally, so make it translucent as
+        # an edit that can be undone
+        if self.model.currentView.plotAlpha == 1.0:
+            self.controller.setView(plotAlpha=0.5)
+        else:
+            self.model.updateImage()
+            self.showCurrentView()
+
+    def removeTallyOverlay(self):
+        if self.model.tallyOverlay is not None:
+            self.model.tallyOverlay.close()
+            self.model.tallyOverlay = None
+            self.model.updateImage()
+            self.showCurrentView()
+
+    def startComparison(self):
+        directory = QFileDialog.getExistingDirectory(self,
+                                                     "Compare With Model", "..")
+        if not directory:
+            return
+
+        self.statusBar().showMessage('Loading Model...')
+        QApplication.processEvents()
+        try:
+            comparison = ModelComparison(directory)
+        except Exception as e:
+            QMessageBox.warning(self, 'Compare With Model', str(e))
+            self.statusBar().clearMessage()
+            return
+
+        if self.model.comparison is not None:
+            self.model.comparison.close()
+        self.model.comparison = comparison
+
+        self.statusBar().showMessage('Comparing...')
+        QApplication.processEvents()
+        try:
+            self.model.updateImage()
+        except Exception as e:
+            QMessageBox.warning(self, 'Compare With Model', str(e))
+            self.stopComparison()
+            return
+        self.showCurrentView()
+        self.compareDialog.show()
+        self.compareDialog.raise_()
+
+    def stopComparison(self):
+        if self.model.comparison is not None:
+            self.model.comparison.close()
+            self.model.comparison = None
+            self.model.updateImage()
+            self.showCurrentView()
+        self.compareDialog.hide()
+
+    def showScanDialog(self):
+        self.scanDialog.updateDialog()
+        self.scanDialog.show()
+        self.scanDialog.raise_()
+        self.scanDialog.activateWindow()
+
+    def scanModel(self, lower_left, upper_right, basis, n_slices, resolution,
+                  n_workers, ignoreExterior):
+        try:
+            keys = slice_keys(lower_left, upper_right, basis, n_slices,
+                              resolution, self.model.currentView.level)
+        except ValueError as e:
+            QMessageBox.warning(self, 'Scan', str(e))
+            return
+
+        progress = QProgressDialog('Scanning slices...', 'Cancel', 0,
+                                   len(keys), self)
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        QApplication.processEvents()
+
+        def update(done):
+            progress.setValue(done)
+            QApplication.processEvents()
+            return not progress.wasCanceled()
+
+        scan = ModelScan(os.getcwd(), keys, n_workers, ignoreExterior)
+        try:
+            pool = self.getWorkerPool(n_workers)
+            with profiler.timer('scan'):
+                report = scan.run(update, pool)
+        except Exception as e:
+            QMessageBox.warning(self, 'Scan', str(e))
+            return
+        finally:
+            progress.close()
+        self.scanDialog.setReport(report)
+
+    def startWorkers(self):
+        """ Start the pool of worker processes of the slice panes and
+        animations in the background, unless it is running or disabled;
+        showWorkers takes it into use once started """
+
+        if not self.n_workers or self.workerPool is not None or \
+                self.workersStarting is not None:
+            return
+        n_workers = self.n_workers
+        future = self.workersStarting = Future()
+        directory = os.getcwd()
+
+        def start():
+            try:
+                with profiler.timer('start workers'):
+                    future.set_result(WorkerPool(directory, n_workers))
+            except Exception as e:
+                future.set_exception(e)
+
+        future.add_done_callback(self.workersStarted.emit)
+        # not a daemon, so a pool still starting on exit is closed
+        threading.Thread(target=start).start()
+
+    def showWorkers(self, future):
+        """ Take a pool started by startWorkers into use, unless it was
+        stopped while starting """
+
+        if future is not self.workersStarting:
+            return
+        self.workersStarting = None
+        try:
+            self.setWorkerPool(future.result())
+        except Exception as e:
+            self.statusBar().showMessage(f'Workers failed to start: {e}',
+                                         5000)
+
+    def setWorkerPool(self, pool):
+        """ Use a worker pool for scans, and to trace the slice panes and
+        animation frames in parallel """
+
+        self.workerPool = pool
+        self.model.workers = pool
+
+    def getWorkerPool(self, n_workers):
+        """ Return the pool of worker processes of the model with
+        n_workers, waiting for one that is starting and resizing a running
+        one, or started at once and kept running for later jobs """
+
+        if self.workersStarting is not None:
+            self.statusBar().showMessage('Starting Workers...')
+            QApplication.processEvents()
+            future = self.workersStarting
+            # waits for the pool to start
+            future.exception()
+            self.showWorkers(future)
+        if self.workerPool is not None and \
+                self.workerPool.n_workers != n_workers:
+            self.statusBar().showMessage('Resizing Workers...')
+            QApplication.processEvents()
+            with profiler.timer('start workers'):
+                self.workerPool.resize(n_workers)
+            self.statusBar().clearMessage()
+        if self.workerPool is None:
+            self.statusBar().showMessage('Starting Workers...')
             QApplication.processEvents()
+            with profiler.timer('start workers'):
+                self.setWorkerPool(WorkerPool(os.getcwd(), n_workers))
+            self.statusBar().clearMessage()
+        return self.workerPool
+
+    def stopWorkers(self):
+        starting, self.workersStarting = self.workersStarting, None
+        if starting is not None:
+            starting.add_done_callback(close_started_pool)
+        if self.workerPool is not None:
+            self.model.workers = None
+            self.workerPool.close()
+            self.workerPool = None
+
+    def stopIdleWorkers(self, nbytes):
+        """ Stop the worker processes unless they have jobs, returning the
+        bytes freed; the next animation or scan starts them again """
+
+        pool = self.workerPool
+        if pool is None or not pool.isIdle():
+            return 0
+        freed = pool.memoryBytes()
+        self.stopWorkers()
+        return freed
+
+    def showWorkerStatus(self):
+        if self.workerPool is None:
+            return
+        lines = [f"{'Worker':<8}{'PID':>8}{'Jobs':>8}{'Restarts':>10}"
+                 f"{'Busy':>10}{'Utilization':>13}"]
+        for i, stats in enumerate(self.workerPool.getStats()):
+            pid = stats['pid'] if stats['alive'] else 'down'
+            lines.append(f"{i:<8}{pid:>8}{stats['jobs']:>8}"
+                         f"{stats['restarts']:>10}{stats['busy']:>9.1f}s"
+                         f"{100 * stats['utilization']:>12.1f}%")
+        lines.append(f'{self.workerPool.pending()} jobs queued')
+
+        box = QMessageBox(QMessageBox.Information, 'Worker Status',
+                          '\n'.join(lines), parent=self)
+        font = QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont)
+        box.setFont(font)
+        box.exec_()
+
+    def registerMemory(self):
+        model = self.model
+        memory = self.memory
+        memory.register('Plot buffers', model.getBufferBytes)
+        memory.register('Compared model', lambda: 0 if model.comparison
+                        is None else model.comparison.nbytes)
+        memory.register('Prefetched id maps',
+                        lambda: model.scheduler.cacheBytes,
+                        lambda nbytes: model.scheduler.clearCache(),
+                        PREFETCH_CACHE)
+        memory.register('Slice pane id maps', self.panesDock.getBufferBytes,
+                        self.panesDock.clearBuffers, RENDER_CACHE)
+        memory.register('Idle shared memory', lambda: arena.idleBytes,
+                        lambda nbytes: arena.trim(max(arena.idleBytes -
+                                                      nbytes, 0)),
+                        RENDER_CACHE)
+        memory.register('Worker processes', lambda: 0 if self.workerPool
+                        is None else self.workerPool.memoryBytes(),
+                        self.stopIdleWorkers, WORKERS)
+        memory.register('Undo history', model.getHistoryBytes,
+                        model.trimHistory, HISTORY)
+
+    def getMemoryBudget(self):
+        """ Return the memory budget in bytes saved in the settings, or None
+        for the default budget """
+        budget = int(QtCore.QSettings().value("memory/Budget", 0))
+        return budget * 2**20 or None
+
+    def setMemoryBudget(self, megabytes):
+        QtCore.QSettings().setValue("memory/Budget", megabytes)
+        self.memory.budget = megabytes * 2**20
+        self.enforceMemoryBudget()
+
+    def enforceMemoryBudget(self):
+        with profiler.timer('memory budget'):
+            freed = self.memory.enforce()
+        if freed:
+            self.statusBar().showMessage(f'Freed {format_bytes(freed)} to '
+                                         'stay within the memory budget',
+                                         5000)
+
+    def freeCaches(self):
+        freed = self.memory.evict(float('inf'), maxRank=RENDER_CACHE)
+        self.statusBar().showMessage(f'Freed {format_bytes(freed)}', 5000)
+        self.memoryDialog.updateDialog()
+
+    def showMemoryDialog(self):
+        self.memoryDialog.show()
+        self.memoryDialog.raise_()
+        self.memoryDialog.activateWindow()
+
+    def jumpToPoint(self, point, basis=None, size=None):
+        av = self.model.activeView
+        if basis is not None:
+            av.basis = basis
+        av.origin = [float(x) for x in point]
+        if size is not None:
+            av.width = size
+            av.height = size * av.v_res / av.h_res
+            self.onRatioChange(updateDock=False)
+        self.dock.updateDock()
+        self.applyChanges()
 
-            self.model.storeCurrent()
-            self.model.subsequentViews = []
-            self.model.generatePlot()
+    def exportTrace(self):
+        filename, ext = QFileDialog.getSaveFileName(self, "Export Timing Trace",
+                                    "plot_trace", "Trace Events (*.json)")
+        if filename:
+            if "." not in filename:
+                filename += ".json"
+            profiler.exportChromeTrace(filename)
+            self.statusBar().showMessage('Timing Trace Exported', 5000)
+
+    def requestPlot(self):
+        """ Plot a copy of the active view
+
+        Views that need a new trace are plotted by showTrace once the trace
+        is done, while the GUI stays responsive; a newer request supersedes
+        one whose trace is still pending. Views that only recolor the
+        cached id map are plotted at once.
+        """
+
+        model = self.model
+        view = copy.deepcopy(model.activeView)
+        if model.idBuffer is not None and \
+                view.getTraceKey() == model.traceKey:
+            model.scheduler.cancel('main')
+            model.makePlot(view)
             self.resetModels()
             self.showCurrentView()
+            return
+
+        self.statusBar().showMessage('Generating Plot...')
+        model.pendingView = view
+        future = model.scheduler.submit(view, channel='main')
+        future.add_done_callback(lambda future:
+                                 self.traced.emit(view, future))
+
+    def showTrace(self, view, future):
+        """ Plot a view requested by requestPlot once its id map is traced,
+        unless a newer request superseded it """
+
+        model = self.model
+        if future.cancelled() or view is not model.pendingView:
+            return
+        try:
+            idBuffer = future.result()
+        except Exception as e:
+            model.pendingView = None
+            self.statusBar().showMessage(f'Plot failed: {e}', 5000)
+            return
+
+        model.makePlot(view, idBuffer)
+        self.resetModels()
+        self.showCurrentView()
+        self.prefetchHistory()
+
+    def requestProperties(self):
+        """ Trace the property map of the current plot in the background,
+        once per trace, so the temperature and density under the cursor
+        are shown without tracing on the GUI thread
+
+        Called when the cursor enters or hovers over the plot; plots that
+        neither show nor are queried for properties never trace them.
+        """
+
+        model = self.model
+        if model.props is not None or \
+                self.propertiesKey == model.traceKey:
+            return
+        self.propertiesKey = model.traceKey
+        view = model.currentView
+        future = model.scheduler.submit(view, PREFETCH, channel='properties',
+                                        trace=model.traceProperties)
+        future.add_done_callback(lambda future:
+                                 self.propertiesTraced.emit(view, future))
+
+    def showProperties(self, view, future):
+        """ Keep the property map traced by requestProperties, unless the
+        plot was traced again since """
+
+        model = self.model
+        if future.cancelled() or model.props is not None or \
+                view.getTraceKey() != model.traceKey:
+            return
+        try:
+            model.props = future.result()
+        except Exception as e:
+            # the next hover tries again
+            self.propertiesKey = None
+            self.statusBar().showMessage(f'Property trace failed: {e}', 5000)
+
+    def prefetchHistory(self):
+        """ Trace the views of the next undo and redo ahead of use """
+
+        views = [history[-1] for history in (self.model.previousViews,
+                                             self.model.subsequentViews)
+                 if history and
+                 history[-1].getTraceKey() != self.model.traceKey]
+        self.model.scheduler.prefetch(views)
+
+    def applyChanges(self):
+        if self.model.activeView != self.model.getLatestView():
+            self.model.storeCurrent()
+            self.model.subsequentViews = []
+            self.requestPlot()
 
         else:
             self.statusBar().showMessage('No changes to apply.', 3000)
 
     def undo(self):
-        self.statusBar().showMessage('Generating Plot...')
-        QApplication.processEvents()
-
-        self.model.undo()
-        self.resetModels()
-        self.showCurrentView()
+        if not self.model.previousViews:
+            return
+        self.model.undo(render=False)
+        self.requestPlot()
         self.dock.updateDock()
         self.colorDialog.updateDialogValues()
 
@@ -358,12 +1116,10 @@ class MainWindow(QMainWindow):
         self.redoAction.setDisabled(False)
 
     def redo(self):
-        self.statusBar().showMessage('Generating Plot...')
-        QApplication.processEvents()
-
-        self.model.redo()
-        self.resetModels()
-        self.showCurrentView()
+        if not self.model.subsequentViews:
+            return
+        self.model.redo(render=False)
+        self.requestPlot()
         self.dock.updateDock()
         self.colorDialog.updateDialogValues()
 
@@ -372,21 +1128,15 @@ class MainWindow(QMainWindow):
         self.undoAction.setDisabled(False)
 
     def restoreDefault(self):
-        if self.model.currentView != self.model.defaultView:
-
-            self.statusBar().showMessage('Generating Plot...')
-            QApplication.processEvents()
+        if self.model.getLatestView() != self.model.defaultView:
 
             self.model.storeCurrent()
             self.model.activeView = copy.deepcopy(self.model.defaultView)
-            self.model.generatePlot()
-            self.resetModels()
-            self.showCurrentView()
+            self.model.subsequentViews = []
+            self.requestPlot()
             self.dock.updateDock()
             self.colorDialog.updateDialogValues()
 
-            self.model.subsequentViews = []
-
     def editBasis(self, basis, apply=False):
         self.model.activeView.basis = basis
         self.dock.updateBasis()
@@ -397,9 +1147,13 @@ class MainWindow(QMainWindow):
         self.model.activeView.colorby = domain_kind
         self.dock.updateColorBy()
         self.colorDialog.updateColorBy()
+        self.colorDialog.updatePropertyOptions()
         if apply:
             self.applyChanges()
 
+    def editLevel(self, value):
+        self.model.activeView.level = value
+
     def toggleMasking(self, state, apply=False):
         self.model.activeView.masking = bool(state)
         self.colorDialog.updateMasking()
@@ -424,6 +1178,23 @@ class MainWindow(QMainWindow):
         self.resizePixmap()
         self.showMainWindow()
 
+    def togglePanes(self, state):
+        self.panesDock.setVisible(bool(state))
+
+    def toggleConsole(self, state):
+        self.consoleDock.setVisible(bool(state))
+        if state:
+            self.consoleDock.input.setFocus()
+
+    def toggleTimings(self, state):
+        profiler.enabled = bool(state)
+        self.timing_label.setVisible(profiler.enabled)
+        self.updateTimings()
+
+    def updateTimings(self):
+        if profiler.enabled:
+            self.timing_label.setText(profiler.summary())
+
     def editZoomAct(self):
         percent, ok = QInputDialog.getInt(self, "Edit Zoom", "Zoom Percent:",
                                           self.dock.zoomBox.value(), 25, 2000)
@@ -499,12 +1270,69 @@ class MainWindow(QMainWindow):
             self.model.activeView.highlightBackground = new_color
             self.colorDialog.updateHighlightColor()
 
+    def toggleOutlines(self, state, apply=False):
+        self.model.activeView.outlines = bool(state)
+        self.colorDialog.updateOutlines()
+        if apply:
+            self.applyChanges()
+
+    def toggleNeighborColors(self, state, apply=False):
+        self.model.activeView.neighborColors = bool(state)
+        self.colorDialog.updateNeighborColors()
+        if apply:
+            self.applyChanges()
+
+    def editOutlineColor(self):
+        current_color = self.model.activeView.outlineColor
+        dlg = QColorDialog(self)
+
+        dlg.setCurrentColor(QtGui.QColor.fromRgb(*current_color))
+        if dlg.exec_():
+            new_color = dlg.currentColor().getRgb()[:3]
+            self.model.activeView.outlineColor = new_color
+            self.colorDialog.updateOutlineColor()
+
+    def editOutlineWidth(self, value):
+        self.model.activeView.outlineWidth = value
+
     def editAlpha(self, value):
         self.model.activeView.highlightAlpha = value
 
     def editSeed(self, value):
         self.model.activeView.highlightSeed = value
 
+    def editColormap(self, name):
+        self.model.activeView.propertyCmap = name
+
+    def togglePropertyLog(self, state):
+        self.model.activeView.propertyLog = bool(state)
+
+    def togglePropertyAutoLimits(self, state):
+        av = self.model.activeView
+        if av.colorby not in PROPERTIES:
+            return
+        if state:
+            av.propertyLimits[av.colorby] = None
+        elif av.propertyLimits[av.colorby] is None:
+            if self.model.propertyRange is not None \
+                and self.model.currentView.colorby == av.colorby:
+                av.propertyLimits[av.colorby] = self.model.propertyRange
+            else:
+                av.propertyLimits[av.colorby] = (0., 1.)
+        self.colorDialog.updatePropertyOptions()
+
+    def editPropertyMin(self, value):
+        av = self.model.activeView
+        limits = av.propertyLimits.get(av.colorby)
+        if limits is not None:
+            av.propertyLimits[av.colorby] = (value, limits[1])
+
+    def editPropertyMax(self, value):
+        av = self.model.activeView
+        limits = av.propertyLimits.get(av.colorby)
+        if limits is not None:
+            av.propertyLimits[av.colorby] = (limits[0], value)
+
     def editBackgroundColor(self, apply=False):
         current_color = self.model.activeView.plotBackground
         dlg = QColorDialog(self)
@@ -535,14 +1363,24 @@ class MainWindow(QMainWindow):
         if apply:
             self.applyChanges()
 
+    def editPlotExtents(self, xOr, yOr, width, height):
+        av = self.model.activeView
+
+        origin = list(av.origin)
+        origin[self.xBasis] = xOr
+        origin[self.yBasis] = yOr
+        av.origin = origin
+        av.width = width
+        av.height = height
+
+        self.onRatioChange(updateDock=False)
+        self.dock.updateExtents()
+
     def revertDockControls(self):
         self.dock.revertToCurrent()
 
     def editDomainColor(self, kind, id):
-        if kind == 'Cell':
-            domain = self.model.activeView.cells
-        else:
-            domain = self.model.activeView.materials
+        domain = getattr(self.model.activeView, DOMAIN_KINDS[kind])
 
         current_color = domain[id].color
         dlg = QColorDialog(self)
@@ -559,22 +1397,31 @@ class MainWindow(QMainWindow):
         self.applyChanges()
 
     def toggleDomainMask(self, state, kind, id):
-        if kind == 'Cell':
-            domain = self.model.activeView.cells
-        else:
-            domain = self.model.activeView.materials
-
-        domain[id].masked = bool(state)
-        self.applyChanges()
+        self.controller.setDomains(kind, id, masked=bool(state))
 
     def toggleDomainHighlight(self, state, kind, id):
-        if kind == 'Cell':
-            domain = self.model.activeView.cells
-        else:
-            domain = self.model.activeView.materials
-
-        domain[id].highlighted = bool(state)
-        self.applyChanges()
+        self.controller.setDomains(kind, id, highlighted=bool(state))
+
+    def maskDomains(self, kind, ids, state):
+        if ids:
+            self.controller.mask(kind, ids, state)
+            self.statusBar().showMessage(f"{'M' if state else 'Unm'}asked "
+                                         f"{len(ids)} {DOMAIN_KINDS[kind]}",
+                                         3000)
+
+    def highlightDomains(self, kind, ids, state):
+        if ids:
+            self.controller.highlight(kind, ids, state)
+            self.statusBar().showMessage(f"{'H' if state else 'Unh'}ighlighted"
+                                         f" {len(ids)} {DOMAIN_KINDS[kind]}",
+                                         3000)
+
+    def colorDomains(self, kind, ids):
+        if not ids:
+            return
+        color = QColorDialog.getColor(parent=self.colorDialog)
+        if color.isValid():
+            self.controller.setColor(kind, ids, color.getRgb()[:3])
 
     # Helper methods:
 
@@ -592,25 +1439,37 @@ class MainWindow(QMainWindow):
     def restoreModelSettings(self):
         if os.path.isfile("plot_settings.pkl"):
 
-            with open('plot_settings.pkl', 'rb') as file:
-                model = pickle.load(file)
+            try:
+                model = load_fingerprinted('plot_settings.pkl',
+                                           self.model.fingerprint)
+            except Exception:
+                model = None
 
-            if model.defaultView == self.model.defaultView:
+            if model is not None:
                 self.model.currentView = model.currentView
                 self.model.activeView = copy.deepcopy(model.currentView)
                 self.model.previousViews = model.previousViews
                 self.model.subsequentViews = model.subsequentViews
+                # sessions saved before neighbor palettes have none
+                self.model.neighborPalettes = getattr(model,
+                                                      'neighborPalettes', {})
+                # the saved id map spares tracing the restored view again
+                if model.idBuffer is not None:
+                    self.model.idBuffer = model.idBuffer
+                    self.model.traceKey = model.traceKey
                 if os.path.isfile('plot_ids.binary') \
                     and os.path.isfile('plot.ppm'):
                     self.restored = True
 
+    @profiler.timed('resetModels')
     def resetModels(self):
         self.cellsModel = DomainTableModel(self.model.activeView.cells)
         self.materialsModel = DomainTableModel(self.model.activeView.materials)
-        self.cellsModel.beginResetModel()
-        self.cellsModel.endResetModel()
-        self.materialsModel.beginResetModel()
-        self.materialsModel.endResetModel()
+        self.universesModel = DomainTableModel(self.model.activeView.universes)
+        for tableModel in (self.cellsModel, self.materialsModel,
+                           self.universesModel):
+            tableModel.beginResetModel()
+            tableModel.endResetModel()
         self.colorDialog.updateDomainTabs()
 
     def showCurrentView(self):
@@ -627,6 +1486,17 @@ class MainWindow(QMainWindow):
 
         self.statusBar().showMessage('Done', 1000)
         self.adjustWindow()
+        self.updateTimings()
+        if self.model.comparison is not None:
+            self.compareDialog.updateDialog()
+        self.panesDock.updatePanes()
+        self.enforceMemoryBudget()
+
+    def refreshView(self):
+        self.resetModels()
+        self.dock.updateDock()
+        self.colorDialog.updateDialogValues()
+        self.showCurrentView()
 
     def updateScale(self):
         cv = self.model.currentView
@@ -642,31 +1512,24 @@ class MainWindow(QMainWindow):
         self.screen = app.desktop().screenGeometry()
         self.setMaximumSize(self.screen.width(), self.screen.height())
 
-    def onRatioChange(self):
+    def onRatioChange(self, updateDock=True):
         av = self.model.activeView
         if av.aspectLock:
             ratio = av.width / max(av.height, .001)
             av.v_res = int(av.h_res / ratio)
-            self.dock.updateVRes()
+            if updateDock:
+                self.dock.updateVRes()
 
-    def showCoords(self, xPlotPos, yPlotPos):
-        cv = self.model.currentView
-        if cv.basis == 'xy':
-            coords = (f"({round(xPlotPos, 2)}, {round(yPlotPos, 2)}, "
-                      f"{round(cv.origin[2], 2)})")
-        elif cv.basis == 'xz':
-            coords = (f"({round(xPlotPos, 2)}, {round(cv.origin[1], 2)}, "
-                      f"{round(yPlotPos, 2)})")
-        else:
-            coords = (f"({round(cv.origin[0], 2)}, {round(xPlotPos, 2)}, "
-                      f"{round(yPlotPos, 2)})")
-        self.coord_label.setText(f'{coords}')
+    def showCoords(self, point):
+        coords = ', '.join(f"{round(coord, 2)}" for coord in point)
+        self.coord_label.setText(f'({coords})')
 
     def resizePixmap(self):
         z = self.zoom / 100.
         self.plotIm.setPixmap(self.frame.width() * z,
                               self.frame.height() * z)
-        self.plotIm.adjustSize()
+        with profiler.timer('layout'):
+            self.plotIm.adjustSize()
 
     def moveEvent(self, event):
         self.adjustWindow()
@@ -692,12 +1555,30 @@ class MainWindow(QMainWindow):
         if len(self.model.subsequentViews) > 10:
             self.model.subsequentViews = self.model.subsequentViews[-10:]
 
-        with open('plot_settings.pkl', 'wb') as file:
-            pickle.dump(self.model, file)
+        with profiler.timer('save session'):
+            dump_fingerprinted('plot_settings.pkl', self.model.fingerprint,
+                               self.model)
+
+        if self.model.comparison is not None:
+            self.model.comparison.close()
+        self.panesDock.shutdown()
+        self.model.scheduler.shutdown()
+        self.stopWorkers()
 
 if __name__ == '__main__':
 
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description='OpenMC Plot Explorer')
+    parser.add_argument('--server', help='address of a plot_server.py '
+                        'render server of the model in the working '
+                        'directory, e.g. http://localhost:8765')
+    parser.add_argument('--workers', type=int, default=2, help='number of '
+                        'render worker processes of the slice panes and '
+                        'animations, started when first used (default: 2); '
+                        '0 traces them in the application, and only scans '
+                        'start workers')
+    args, qtArgs = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qtArgs)
     app.setOrganizationName("OpenMC")
     app.setOrganizationDomain("xxxxxgithub.com/openmc-dev/")
     app.setApplicationName("xxxxxOpenMC Plot Explorer")
@@ -705,6 +1586,11 @@ if __name__ == '__main__':
     app.setAttribute(QtCore.Qt.AA_DontShowIconsInMenus, True)
 
     FM = QtGui.QFontMetricsF(app.font())
-    mainWindow = MainWindow()
+    try:
+        mainWindow = MainWindow(args.server, args.workers)
+    except RuntimeError as e:
+        if args.server is None:
+            raise
+        sys.exit(f'Could not connect to render server: {e}')
     mainWindow.show()
     sys.exit(app.exec_())
@@ -0,0 +1,545 @@
+import struct, zlib
+import numpy as np
+
+# directed pixel edges as (dx0, dy0, dx1, dy1) offsets from a pixel's
+# top-left corner, running clockwise on screen so that the region the edge
+# belongs to is always on its right
+_EDGES = ((0, 0, 1, 0),   # top
+          (1, 0, 1, 1),   # right
+          (1, 1, 0, 1),   # bottom
+          (0, 1, 0, 0))   # left
+
+def _boundary_edges(regions):
+    """ Return start vertex, end vertex, direction and region of every
+    pixel edge lying on a region boundary """
+
+    v_res, h_res = regions.shape
+    top = np.ones(regions.shape, dtype=bool)
+    top[1:] = regions[1:] != regions[:-1]
+    bottom = np.ones(regions.shape, dtype=bool)
+    bottom[:-1] = top[1:]
+    left = np.ones(regions.shape, dtype=bool)
+    left[:, 1:] = regions[:, 1:] != regions[:, :-1]
+    right = np.ones(regions.shape, dtype=bool)
+    right[:, :-1] = left[:, 1:]
+
+    starts, ends, dirs, values = [], [], [], []
+    for direction, (mask, (dx0, dy0, dx1, dy1)) in \
+            enumerate(zip((top, right, bottom, left), _EDGES)):
+        row, col = np.nonzero(mask)
+        row = row.astype(np.int64)
+        col = col.astype(np.int64)
+        starts.append((row + dy0) * (h_res + 1) + col + dx0)
+        ends.append((row + dy1) * (h_res + 1) + col + dx1)
+        dirs.append(np.full(len(row), direction, dtype=np.int8))
+        values.append(regions[row, col])
+
+    return (np.concatenate(starts), np.concatenate(ends),
+            np.concatenate(dirs), np.concatenate(values))
+
+def trace_regions(regions):
+    """ Trace the outlines of the regions of equal value in a 2D array
+
+    Boundary pixel edges are found with whole-array comparisons and chained
+    into closed loops by matching end and start vertices. Only the corners
+    of each loop are kept, so straight runs of pixel edges collapse into a
+    single segment. Loops run clockwise on screen around the region and
+    counter-clockwise around its holes, so each region fills correctly as
+    one path with the nonzero winding rule.
+
+    Parameters
+    ----------
+    regions : NumPy int array (v_res, h_res)
+        Region value of every pixel
+
+    Yields
+    ------
+    value : int
+        Region value, in ascending order
+    loops : list of NumPy int arrays (n, 2)
+        Corner vertices (x, y) of every loop of the region, in pixel-corner
+        coordinates with the origin at the top-left of the image
+    """
+
+    regions = np.asarray(regions)
+    if regions.size == 0:
+        return
+    h_res = regions.shape[1]
+    starts, ends, dirs, values = _boundary_edges(regions)
+
+    # group edges by region; vertex keys are made unique per region so
+    # regions touching at a corner never share a loop
+    order = np.argsort(values, kind='stable')
+    starts, ends, dirs, values = \
+        starts[order], ends[order], dirs[order], values[order]
+    unique, first, counts = np.unique(values, return_index=True,
+                                      return_counts=True)
+    group = np.repeat(np.arange(len(unique), dtype=np.int64), counts)
+    n_vertices = (regions.shape[0] + 1) * (h_res + 1)
+    start_keys = group * n_vertices + starts
+    end_keys = group * n_vertices + ends
+
+    # every vertex has as many edges leaving as arriving, so pairing the
+    # sorted end keys with the sorted start keys links each edge to a
+    # successor starting where it ends
+    successor = np.empty(len(starts), dtype=np.int64)
+    successor[np.argsort(end_keys, kind='stable')] = \
+        np.argsort(start_keys, kind='stable')
+
+    # an edge ends at a corner if its successor changes direction; jump
+    # every edge to the next edge ending at a corner by pointer doubling
+    corner = dirs != dirs[successor]
+    jump = successor.copy()
+    done = corner[jump]
+    while not done.all():
+        jump = np.where(done, jump, jump[jump])
+        done = corner[jump]
+
+    x = ends % (h_res + 1)
+    y = ends // (h_res + 1)
+    visited = ~corner
+    for value, start, count in zip(unique, first, counts):
+        loops = []
+        for edge in np.flatnonzero(~visited[start:start + count]) + start:
+            if visited[edge]:
+                continue
+            loop = []
+            while not visited[edge]:
+                visited[edge] = True
+                loop.append(edge)
+                edge = jump[edge]
+            loops.append(np.column_stack((x[loop], y[loop])))
+        yield value.item(), loops
+
+def _hex(color):
+    return '#{:02x}{:02x}{:02x}'.format(*(int(c) for c in color))
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+class SVGWriter():
+    """ Streaming SVG writer of filled rectilinear regions
+
+    Paths are written to the file as they are added. Coordinates are pixel
+    corners, scaled to the output size by the viewBox.
+    """
+
+    def __init__(self, filename, h_res, v_res, scale=1.):
+        self.file = open(filename, 'w')
+        self.file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+            f'width="{h_res * scale:g}" height="{v_res * scale:g}" '
+            f'viewBox="0 0 {h_res} {v_res}" shape-rendering="crispEdges">\n')
+
+    def addRegion(self, loops, color, label=None):
+        parts = []
+        for loop in loops:
+            # consecutive corners alternate between horizontal and
+            # vertical segments, so H/V commands suffice after the move
+            x0, y0 = loop[-1]
+            parts.append(f'M{x0} {y0}')
+            horizontal = loop[0][1] == y0
+            for x, y in loop[:-1]:
+                parts.append(f'H{x}' if horizontal else f'V{y}')
+                horizontal = not horizontal
+            parts.append('Z')
+        self.file.write(f'<path fill="{_hex(color)}" d="{"".join(parts)}"')
+        if label:
+            self.file.write(f'><title>{_escape(label)}</title></path>\n')
+        else:
+            self.file.write('/>\n')
+
+    def close(self):
+        self.file.write('</svg>\n')
+        self.file.close()
+
+class PDFWriter():
+    """ Streaming single-page PDF writer of filled rectilinear regions
+
+    The page content stream is written as regions are added, its length is
+    written as an indirect object once known, and the cross-reference table
+    is built from the recorded object offsets on close.
+    """
+
+    # largest page dimension allowed by PDF viewers, in points
+    MAX_PAGE = 14400.
+
+    def __init__(self, filename, h_res, v_res, scale=1.):
+        scale = min(scale, self.MAX_PAGE / max(h_res, v_res))
+        self.file = open(filename, 'wb')
+        self.offsets = []
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+        width, height = h_res * scale, v_res * scale
+        self._object(b'<< /Type /Catalog /Pages 2 0 R >>')
+        self._object(b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>')
+        self._object(f'<< /Type /Page /Parent 2 0 R '
+                     f'/MediaBox [0 0 {width:g} {height:g}] '
+                     f'/Resources << >> /Contents 4 0 R >>'.encode())
+
+        self.offsets.append(self.file.tell())
+        self.file.write(b'4 0 obj\n<< /Length 5 0 R >>\nstream\n')
+        self.streamStart = self.file.tell()
+        # flip to pixel coordinates with the origin at the top left
+        self.file.write(f'{scale:g} 0 0 {-scale:g} 0 {height:g} cm\n'.encode())
+
+    def _object(self, content):
+        self.offsets.append(self.file.tell())
+        number = len(self.offsets)
+        self.file.write(f'{number} 0 obj\n'.encode() + content +
+                        b'\nendobj\n')
+
+    def addRegion(self, loops, color, label=None):
+        r, g, b = (int(c) / 255. for c in color)
+        parts = [f'{r:.4g} {g:.4g} {b:.4g} rg\n']
+        for loop in loops:
+            x0, y0 = loop[0]
+            parts.append(f'{x0} {y0} m\n')
+            parts.extend(f'{x} {y} l\n' for x, y in loop[1:])
+            parts.append('h\n')
+        parts.append('f\n')
+        self.file.write(''.join(parts).encode())
+
+    def close(self):
+        length = self.file.tell() - self.streamStart
+        self.file.write(b'endstream\nendobj\n')
+        self._object(str(length).encode())
+
+        xref = self.file.tell()
+        self.file.write(f'xref\n0 {len(self.offsets) + 1}\n'.encode())
+        self.file.write(b'0000000000 65535 f \n')
+        for offset in self.offsets:
+            self.file.write(f'{offset:010d} 00000 n \n'.encode())
+        self.file.write(f'trailer\n<< /Size {len(self.offsets) + 1} '
+                        f'/Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+        self.file.close()
+
+def export_vector(filename, regions, colors, labels=None, scale=1.):
+    """ Write an image of uniformly colored regions as SVG or PDF
+
+    Parameters
+    ----------
+    filename : str
+        Output path; written as PDF if it ends in .pdf, otherwise as SVG
+    regions : NumPy int array (v_res, h_res)
+        Index into colors of every pixel
+    colors : NumPy uint8 array (n, 3)
+        RGB color of each region
+    labels : sequence of str, optional
+        Description of each region, written as SVG path titles
+    scale : float
+        Output size of one pixel, in SVG user units or PDF points
+
+    Returns
+    -------
+    n_regions : int
+        Number of paths written
+    """
+
+    v_res, h_res = regions.shape
+    if filename.lower().endswith('.pdf'):
+        writer = PDFWriter(filename, h_res, v_res, scale)
+    else:
+        writer = SVGWriter(filename, h_res, v_res, scale)
+
+    n_regions = 0
+    try:
+        for value, loops in trace_regions(regions):
+            label = labels[value] if labels is not None else None
+            writer.addRegion(loops, colors[value], label)
+            n_regions += 1
+    finally:
+        writer.close()
+    return n_regions
+
+class PNGWriter():
+    """ Streaming 8-bit RGB PNG writer
+
+    Rows are filtered and deflated as they are written and flushed to the
+    file as IDAT chunks of at most chunkSize bytes.
+    """
+
+    def __init__(self, filename, width, height, text=None, chunkSize=1 << 20):
+        self.file = open(filename, 'wb')
+        self.chunkSize = chunkSize
+        self.pending = []
+        self.pendingSize = 0
+        self.compressor = zlib.compressobj(6)
+
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                         8, 2, 0, 0, 0))
+        for key, value in (text or {}).items():
+            self._chunk(b'tEXt', key.encode('latin-1') + b'\0' +
+                        value.encode('latin-1', 'replace'))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)) + kind + data +
+                        struct.pack('>I', zlib.crc32(kind + data)))
+
+    def _compressed(self, data, flush=False):
+        if data:
+            self.pending.append(data)
+            self.pendingSize += len(data)
+        if self.pendingSize >= self.chunkSize or (flush and self.pending):
+            self._chunk(b'IDAT', b''.join(self.pending))
+            self.pending = []
+            self.pendingSize = 0
+
+    def writeRows(self, rows):
+        # 'sub' filter: difference with the previous pixel of the row,
+        # which turns the flat regions of a plot into runs of zeros
+        flat = np.ascontiguousarray(rows, dtype=np.uint8).reshape(len(rows), -1)
+        filtered = np.empty((len(rows), flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = flat[:, :3]
+        np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+        self._compressed(self.compressor.compress(filtered.tobytes()))
+
+    def close(self):
+        self._compressed(self.compressor.flush(), flush=True)
+        self._chunk(b'IEND', b'')
+        self.file.close()
+
+class PPMWriter():
+    """ Streaming binary (P6) PPM writer """
+
+    def __init__(self, filename, width, height, text=None):
+        self.file = open(filename, 'wb')
+        comments = ''.join(f'# {key}: {value}\n'
+                           for key, value in (text or {}).items())
+        self.file.write(f'P6\n{comments}{width} {height}\n255\n'.encode())
+
+    def writeRows(self, rows):
+        self.file.write(np.ascontiguousarray(rows, dtype=np.uint8).tobytes())
+
+    def close(self):
+        self.file.close()
+
+class TIFFWriter():
+    """ Streaming uncompressed baseline RGB TIFF writer
+
+    Pixel data is written as a single strip directly after the header, and
+    the image file directory is appended on close.
+    """
+
+    # TIFF field types
+    ASCII, SHORT, LONG, RATIONAL = 2, 3, 4, 5
+
+    def __init__(self, filename, width, height, text=None):
+        if width * height * 3 >= 1 << 32:
+            raise ValueError('Image is too large for a TIFF file')
+        self.width = width
+        self.height = height
+        self.text = text
+        self.file = open(filename, 'wb')
+        self.file.write(b'II*\0' + struct.pack('<I', 0))
+
+    def writeRows(self, rows):
+        self.file.write(np.ascontiguousarray(rows, dtype=np.uint8).tobytes())
+
+    def close(self):
+        if self.file.tell() % 2:
+            self.file.write(b'\0')
+        ifd = self.file.tell()
+
+        description = None
+        if self.text:
+            description = '\n'.join(f'{key}: {value}' for key, value
+                                     in self.text.items()).encode('latin-1',
+                                                                  'replace')
+            description += b'\0'
+
+        # (tag, type, count, value or out-of-line data)
+        entries = [(256, self.LONG, 1, self.width),
+                   (257, self.LONG, 1, self.height),
+                   (258, self.SHORT, 3, struct.pack('<3H', 8, 8, 8)),
+                   (259, self.SHORT, 1, 1),
+                   (262, self.SHORT, 1, 2)]
+        if description is not None:
+            entries.append((270, self.ASCII, len(description), description))
+        entries += [(273, self.LONG, 1, 8),
+                    (277, self.SHORT, 1, 3),
+                    (278, self.LONG, 1, self.height),
+                    (279, self.LONG, 1, self.width * self.height * 3),
+                    (282, self.RATIONAL, 1, struct.pack('<2I', 72, 1)),
+                    (283, self.RATIONAL, 1, struct.pack('<2I', 72, 1)),
+                    (296, self.SHORT, 1, 2)]
+
+        extra = ifd + 2 + 12 * len(entries) + 4
+        table, data = [], []
+        for tag, kind, count, value in entries:
+            if isinstance(value, bytes) and len(value) > 4:
+                table.append(struct.pack('<HHII', tag, kind, count, extra))
+                data.append(value)
+                extra += len(value) + len(value) % 2
+                if len(value) % 2:
+                    data.append(b'\0')
+            elif isinstance(value, bytes):
+                table.append(struct.pack('<HHI', tag, kind, count) +
+                             value.ljust(4, b'\0'))
+            elif kind == self.SHORT:
+                table.append(struct.pack('<HHIHH', tag, kind, count, value, 0))
+            else:
+                table.append(struct.pack('<HHII', tag, kind, count, value))
+
+        self.file.write(struct.pack('<H', len(entries)) + b''.join(table) +
+                        struct.pack('<I', 0) + b''.join(data))
+        self.file.seek(4)
+        self.file.write(struct.pack('<I', ifd))
+        self.file.close()
+
+RASTER_WRITERS = {'.png': PNGWriter, '.ppm': PPMWriter,
+                  '.tif': TIFFWriter, '.tiff': TIFFWriter}
+
+def _text_coverage(text, size):
+    """ Render text with matplotlib's Agg backend
+
+    Returns
+    -------
+    coverage : NumPy float array (rows, cols)
+        Opacity of the text at each pixel
+    """
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(dpi=72)
+    canvas = FigureCanvasAgg(figure)
+    label = figure.text(0.5, 0.5, text, fontsize=size, color='black',
+                        ha='center', va='center')
+    bbox = label.get_window_extent(canvas.get_renderer())
+    figure.set_size_inches((bbox.width + 4) / 72., (bbox.height + 4) / 72.)
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba())
+    return 1. - rgba[:, :, 0] / 255.
+
+def scale_bar(h_res, v_res, pixelSize, units='cm'):
+    """ Draw a scale bar for the lower-left corner of an image
+
+    The bar length is the largest 1, 2 or 5 times a power of ten that is
+    no longer than a fifth of the image width.
+
+    Parameters
+    ----------
+    h_res, v_res : int
+        Image resolution
+    pixelSize : float
+        Width of a pixel in model units
+
+    Returns
+    -------
+    patch : NumPy float array (rows, cols, 4)
+        RGBA scale bar in [0, 1]: a white bar and label on a translucent
+        black box
+    top, left : int
+        Image position of the upper-left corner of the patch
+    label : str
+        Length of the bar
+    """
+
+    target = h_res * pixelSize / 5.
+    magnitude = 10. ** np.floor(np.log10(target))
+    length = max(m for m in (1., 2., 5.) if m * magnitude <= target * 1.0001)
+    length *= magnitude
+    label = f'{length:g} {units}'
+
+    font = max(10, min(h_res, v_res) // 40)
+    thickness = max(2, font // 4)
+    margin = max(2, font // 2)
+    bar = max(int(round(length / pixelSize)), 1)
+    text = _text_coverage(label, font)
+
+    rows = 3 * margin + text.shape[0] + thickness
+    cols = 2 * margin + max(bar, text.shape[1])
+    patch = np.zeros((rows, cols, 4))
+    patch[:, :, 3] = 0.5
+
+    # white text over the box
+    box = patch[margin:margin + text.shape[0], margin:margin + text.shape[1]]
+    box[:, :, :3] = text[:, :, None]
+    box[:, :, 3] = text + (1. - text) * 0.5
+
+    top = 2 * margin + text.shape[0]
+    patch[top:top + thickness, margin:margin + bar] = 1.
+
+    return patch, v_res - rows - margin, margin, label
+
+def composite(image, row, patch, top, left):
+    """ Blend an RGBA patch over a band of image rows in place
+
+    Parameters
+    ----------
+    image : NumPy uint8 array (n, h_res, 3)
+        Band of rows of the full image
+    row : int
+        Image row of the first row of the band
+    patch : NumPy float array (rows, cols, 4)
+        RGBA data in [0, 1]
+    top, left : int
+        Image position of the upper-left corner of the patch
+    """
+
+    first = max(top, row, 0)
+    last = min(top + patch.shape[0], row + image.shape[0])
+    stop = min(left + patch.shape[1], image.shape[1])
+    if first >= last or left >= stop:
+        return
+
+    over = patch[first - top:last - top, :stop - left]
+    under = image[first - row:last - row, left:stop]
+    alpha = over[:, :, 3:]
+    under[:] = np.round(over[:, :, :3] * 255. * alpha +
+                        under * (1. - alpha)).astype(np.uint8)
+
+def export_raster(filename, bands, h_res, v_res, pixelSize=None,
+                  scaleBar=False, text=None):
+    """ Write an RGB image to PNG, PPM or TIFF a band of rows at a time
+
+    Parameters
+    ----------
+    filename : str
+        Output path; the format is chosen by the extension
+    bands : iterable of (int, NumPy uint8 array (n, h_res, 3))
+        Consecutive bands of image rows, with the image row of their
+        first row
+    h_res, v_res : int
+        Image resolution
+    pixelSize : float, optional
+        Width of a pixel in model units, recorded in the file metadata
+    scaleBar : bool
+        Whether to draw a scale bar in the lower-left corner; requires
+        pixelSize
+    text : dict, optional
+        Additional metadata entries
+    """
+
+    ext = filename[filename.rfind('.'):].lower()
+    if ext not in RASTER_WRITERS:
+        raise ValueError(f'Unsupported image format: {ext}')
+
+    text = dict(text or {})
+    patch = None
+    if pixelSize is not None:
+        text['Pixel size'] = f'{pixelSize:g} cm'
+        if scaleBar:
+            patch, top, left, label = scale_bar(h_res, v_res, pixelSize)
+            text['Scale bar'] = label
+
+    writer = RASTER_WRITERS[ext](filename, h_res, v_res, text)
+    written = 0
+    try:
+        for row, band in bands:
+            if row != written or band.shape[1:] != (h_res, 3):
+                raise ValueError('Image bands must be consecutive rows of '
+                                 'the image')
+            if patch is not None and row + len(band) > top:
+                band = band.copy()
+                composite(band, row, patch, top, left)
+            writer.writeRows(band)
+            written += len(band)
+    finally:
+        writer.close()
+    if written != v_res:
+        raise ValueError(f'Expected {v_res} image rows, got {written}')
@@ -0,0 +1,202 @@
+""" Memory accounting of the application
+
+Every subsystem holding large buffers registers with a MemoryAccountant,
+which measures the bytes each one holds against a budget. When the total
+exceeds the budget, subsystems that can free memory are asked to, in
+order of their eviction rank:
+
+    PREFETCH_CACHE  id maps traced ahead of use
+    RENDER_CACHE    id maps kept for recoloring, idle shared memory
+    WORKERS         idle render worker processes, started again on next use
+    HISTORY         the oldest views of the undo and redo history
+
+Buffers of the current plot are measured but never evicted.
+"""
+
+import itertools, os, sys, weakref
+import numpy as np
+
+PREFETCH_CACHE, RENDER_CACHE, WORKERS, HISTORY = 0, 1, 2, 3
+RANK_NAMES = {PREFETCH_CACHE: 'Prefetch cache', RENDER_CACHE: 'Render cache',
+              WORKERS: 'Workers', HISTORY: 'History'}
+
+# dicts larger than this, such as the domain settings of a view, are
+# estimated from this many of their items
+_SAMPLE = 256
+
+def physical_memory():
+    """ Return the size of the physical memory, or None if unknown """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def default_budget():
+    """ Return half the physical memory, or 4 GB if unknown """
+    memory = physical_memory()
+    return memory // 2 if memory else 4 * 2**30
+
+def format_bytes(n):
+    """ Return a byte count in readable units, e.g. 1.5 GB """
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            break
+        n /= 1024
+    return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+
+def array_bytes(*arrays):
+    """ Return the memory held by arrays, counting the memory shared by
+    views of the same array once; None entries are skipped """
+
+    roots = {}
+    for array in arrays:
+        if array is None:
+            continue
+        while isinstance(array.base, np.ndarray):
+            array = array.base
+        roots[id(array)] = array.nbytes
+    return sum(roots.values())
+
+def _object_bytes(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return array_bytes(obj)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        sample = list(itertools.islice(obj.items(), _SAMPLE))
+        items = sum(_object_bytes(key, seen) + _object_bytes(value, seen)
+                    for key, value in sample)
+        size += items * len(obj) // max(len(sample), 1)
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_object_bytes(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += _object_bytes(obj.__dict__, seen)
+    return size
+
+# sizes of the views in the undo history, which don't change while there,
+# by id as hashing a view formats all its settings
+_viewBytes = {}
+
+def view_bytes(view):
+    """ Estimate the memory of a PlotView, mostly its domain settings
+
+    Estimates are cached per view, so views must not be changed after
+    they were measured, as for the views of the undo history.
+    """
+
+    size = _viewBytes.get(id(view))
+    if size is None:
+        size = _viewBytes[id(view)] = _object_bytes(view, set())
+        weakref.finalize(view, _viewBytes.pop, id(view), None)
+    return size
+
+class _Subsystem():
+
+    def __init__(self, name, measure, evict, rank):
+        self.name = name
+        self.measure = measure
+        self.evict = evict
+        self.rank = rank
+        self.evicted = 0
+
+class MemoryAccountant():
+    """ Bytes held by the subsystems of the application against a budget
+
+    Parameters
+    ----------
+    budget : int, optional
+        Memory budget in bytes; defaults to default_budget()
+
+    Attributes
+    ----------
+    budget : int
+        Memory budget in bytes
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or default_budget()
+        self._subsystems = {}
+
+    def register(self, name, measure, evict=None, rank=None):
+        """ Account for the memory of a subsystem
+
+        Parameters
+        ----------
+        name : str
+            Name of the subsystem, as shown in diagnostics
+        measure : callable
+            Returns the bytes held by the subsystem
+        evict : callable, optional
+            Called with a number of bytes to free as much of them as the
+            subsystem can; returns the bytes freed. Subsystems without one
+            are never evicted.
+        rank : {PREFETCH_CACHE, RENDER_CACHE, WORKERS, HISTORY}, optional
+            Eviction order; subsystems of lower rank are evicted first
+        """
+
+        if evict is not None and rank is None:
+            raise ValueError('Evictable subsystems need an eviction rank')
+        self._subsystems[name] = _Subsystem(name, measure, evict, rank)
+
+    def unregister(self, name):
+        self._subsystems.pop(name, None)
+
+    def getUsage(self):
+        """ Return the memory of every subsystem
+
+        Returns
+        -------
+        usage : list of dict
+            Name, bytes held, eviction rank (None if never evicted) and
+            bytes evicted so far, of every subsystem in registration order
+        """
+
+        return [{'name': sub.name, 'bytes': sub.measure(), 'rank': sub.rank,
+                 'evicted': sub.evicted}
+                for sub in self._subsystems.values()]
+
+    def total(self):
+        return sum(sub.measure() for sub in self._subsystems.values())
+
+    def evict(self, nbytes, maxRank=HISTORY):
+        """ Free nbytes from evictable subsystems in order of rank
+
+        Parameters
+        ----------
+        nbytes : int
+            Bytes to free
+        maxRank : int
+            Highest eviction rank evicted
+
+        Returns
+        -------
+        freed : int
+            Bytes freed, which may fall short of nbytes
+        """
+
+        freed = 0
+        evictable = sorted((sub for sub in self._subsystems.values()
+                            if sub.evict is not None and sub.rank <= maxRank),
+                           key=lambda sub: sub.rank)
+        for sub in evictable:
+            if freed >= nbytes:
+                break
+            n = sub.evict(nbytes - freed)
+            sub.evicted += n
+            freed += n
+        return freed
+
+    def enforce(self):
+        """ Evict until the total is within the budget, if it can be
+
+        Returns
+        -------
+        freed : int
+            Bytes freed
+        """
+
+        excess = self.total() - self.budget
+        return self.evict(excess) if excess > 0 else 0
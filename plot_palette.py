@@ -0,0 +1,226 @@
+import threading
+import numpy as np
+
+from plot_colors import hash_ids, distinct_colors
+
+def adjacency_edges(ids):
+    """ Find the pairs of domains that touch in an id map
+
+    Parameters
+    ----------
+    ids : NumPy int array (v_res, h_res)
+        Domain id of every pixel; negative ids (void, overlaps) are not
+        domains
+
+    Returns
+    -------
+    edges : NumPy int64 array (m, 2)
+        Distinct id pairs (a, b), a < b, of horizontally or vertically
+        neighboring pixels
+    """
+
+    packed = []
+    for a, b in ((ids[:, :-1], ids[:, 1:]), (ids[:-1, :], ids[1:, :])):
+        border = (a != b) & (a >= 0) & (b >= 0)
+        a = a[border].astype(np.int64)
+        b = b[border].astype(np.int64)
+        # pack (low, high) so one sort removes the duplicate pairs
+        packed.append((np.minimum(a, b) << 32) | np.maximum(a, b))
+    packed = np.unique(np.concatenate(packed))
+    return np.column_stack((packed >> 32, packed & 0xffffffff))
+
+def color_graph(n_nodes, edges, n_colors, colors=None, preferred=None,
+                priority=None):
+    """ Assign colors to the nodes of a graph so that neighbors differ
+
+    Nodes are colored in rounds, all at once, in the manner of
+    Jones-Plassmann: each round colors every uncolored node whose uncolored
+    neighbors all have lower priority, with the first color after its
+    preferred color that none of its neighbors has. Nodes with n_colors or
+    more colored neighbors may end up sharing a color with one of them.
+
+    Parameters
+    ----------
+    n_nodes : int
+        Number of nodes
+    edges : NumPy int array (m, 2)
+        Node index pairs of the edges
+    n_colors : int
+        Number of colors, at most 32
+    colors : NumPy int array (n_nodes,), optional
+        Colors of nodes already colored, -1 for the others
+    preferred : NumPy int array (n_nodes,), optional
+        First color tried for every node
+    priority : NumPy int array (n_nodes,), optional
+        Distinct priorities of the nodes
+
+    Returns
+    -------
+    colors : NumPy int array (n_nodes,)
+    """
+
+    if not 0 < n_colors <= 32:
+        raise ValueError('Between 1 and 32 colors are supported')
+
+    colors = np.full(n_nodes, -1) if colors is None else colors.copy()
+    if preferred is None:
+        preferred = np.zeros(n_nodes, dtype=np.int64)
+    if priority is None:
+        priority = np.arange(n_nodes)
+    full = np.uint64((1 << n_colors) - 1)
+    shift = preferred.astype(np.uint64)
+
+    source = np.concatenate((edges[:, 0], edges[:, 1]))
+    target = np.concatenate((edges[:, 1], edges[:, 0]))
+
+    while True:
+        uncolored = colors < 0
+        if not uncolored.any():
+            break
+
+        # nodes with an uncolored neighbor of higher priority wait
+        waiting = uncolored[source] & uncolored[target] & \
+            (priority[target] > priority[source])
+        ready = uncolored & (np.bincount(source[waiting],
+                                         minlength=n_nodes) == 0)
+
+        # bit mask of the colors of the neighbors of ready nodes; distinct
+        # bits summed as floats are exact up to 32 colors
+        taken = ready[source] & ~uncolored[target]
+        pairs = np.unique(source[taken] * 32 + colors[target[taken]])
+        mask = np.bincount(pairs // 32, weights=2. ** (pairs % 32),
+                           minlength=n_nodes).astype(np.uint64)
+
+        # first free color at or after the preferred one
+        nodes = np.flatnonzero(ready)
+        m, s = mask[nodes], shift[nodes]
+        rotated = ((m >> s) | (m << (np.uint64(n_colors) - s))) & full
+        free = ~rotated & full
+        lowest = free & (~free + np.uint64(1))
+        offset = np.where(free > 0,
+                          np.log2(np.maximum(lowest, 1).astype(float)), 0)
+        colors[nodes] = (preferred[nodes] + offset.astype(np.int64)) % n_colors
+
+    return colors
+
+class NeighborPalette():
+    """ Domain colors that differ between neighboring domains
+
+    The adjacency graph is accumulated from the id maps of every view
+    drawn, and domains are colored from a set of perceptually distinct
+    colors so that no two touching domains share a color. New domains and
+    conflicts found in later views are colored without changing the
+    colors of the other domains, so colors stay stable while navigating.
+
+    Parameters
+    ----------
+    n_colors : int
+        Number of distinct colors, at most 32
+    seed : int
+        Seed of the preferred color and priority of every domain
+
+    Attributes
+    ----------
+    nodes : NumPy int64 array (n,)
+        Sorted ids of the domains seen
+    colors : NumPy int array (n,)
+        Color index of every domain
+    edges : NumPy int64 array (m,)
+        Packed id pairs of the touching domains seen
+    """
+
+    def __init__(self, n_colors=24, seed=0):
+        self.n_colors = n_colors
+        self.seed = seed
+        self.nodes = np.empty(0, dtype=np.int64)
+        self.colors = np.empty(0, dtype=np.int64)
+        self.edges = np.empty(0, dtype=np.int64)
+        self.traceKeys = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def update(self, ids, traceKey=None):
+        """ Add the domains and adjacencies of an id map, coloring new
+        domains and recoloring domains that conflict with a new neighbor
+
+        Parameters
+        ----------
+        ids : NumPy int array (v_res, h_res)
+            Domain id of every pixel
+        traceKey : tuple, optional
+            Trace settings of ids; id maps of trace settings already seen
+            are skipped
+        """
+
+        with self._lock:
+            if traceKey is not None and traceKey in self.traceKeys:
+                return
+
+            edges = adjacency_edges(ids)
+            nodes = np.unique(ids)
+            nodes = nodes[nodes >= 0].astype(np.int64)
+            packed = (edges[:, 0] << 32) | edges[:, 1]
+
+            newNodes = nodes[~np.isin(nodes, self.nodes)]
+            newEdges = packed[~np.isin(packed, self.edges)]
+            if len(newNodes) or len(newEdges):
+                self._recolor(newNodes, newEdges)
+
+            if traceKey is not None:
+                self.traceKeys.add(traceKey)
+
+    def _recolor(self, newNodes, newEdges):
+        nodes = np.union1d(self.nodes, newNodes)
+        colors = np.full(len(nodes), -1)
+        colors[np.searchsorted(nodes, self.nodes)] = self.colors
+        self.edges = np.union1d(self.edges, newEdges)
+
+        pairs = np.column_stack((np.searchsorted(nodes, self.edges >> 32),
+                                 np.searchsorted(nodes,
+                                                 self.edges & 0xffffffff)))
+
+        # the higher id of every new edge between equal colors is recolored
+        new = np.column_stack((np.searchsorted(nodes, newEdges >> 32),
+                               np.searchsorted(nodes, newEdges & 0xffffffff)))
+        clash = colors[new[:, 0]] == colors[new[:, 1]]
+        colors[new[clash, 1]] = -1
+
+        preferred = (hash_ids(nodes, self.seed) %
+                     np.uint64(self.n_colors)).astype(np.int64)
+        priority = np.argsort(np.argsort(hash_ids(nodes, self.seed + 1)))
+        self.colors = color_graph(len(nodes), pairs, self.n_colors, colors,
+                                  preferred, priority)
+        self.nodes = nodes
+
+    def getColors(self, ids):
+        """ Return the RGB colors of domain ids
+
+        Ids that were never added, such as the void, are given the first
+        color.
+
+        Parameters
+        ----------
+        ids : NumPy int array (n,)
+            Domain ids
+
+        Returns
+        -------
+        rgb : NumPy uint8 array (n, 3)
+        """
+
+        lut = distinct_colors(self.n_colors)
+        with self._lock:
+            if not len(self.nodes):
+                return np.repeat(lut[:1], len(ids), axis=0)
+            index = np.minimum(np.searchsorted(self.nodes, ids),
+                               len(self.nodes) - 1)
+            found = self.nodes[index] == ids
+            return lut[np.where(found, self.colors[index], 0)]
@@ -0,0 +1,322 @@
+import copy, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from plotmodel import APPEARANCE, DOMAIN_ATTRIBUTES
+from plot_memory import array_bytes
+from plot_profiler import profiler
+
+# index of the in-plane and normal axes of each basis
+BASIS_AXES = {'xy': (0, 1, 2), 'xz': (0, 2, 1), 'yz': (1, 2, 0)}
+
+def view_state(view):
+    """ Return a key of the trace settings and appearance of a view
+
+    Domain settings are keyed by the identity of the domain dictionaries,
+    which are copied rather than edited in place for every plot, so the
+    key is cheap however many domains the model has. Callers keep the view
+    alive while they hold its key, so the identities are not reused.
+    """
+
+    return (view.getTraceKey(),
+            tuple(copy.copy(getattr(view, name)) for name in APPEARANCE),
+            tuple(id(getattr(view, name)) for name in DOMAIN_ATTRIBUTES))
+
+class SlicePane():
+    """ View of one axis-aligned slice through the shared origin
+
+    The in-plane extent of a pane is its own, while the position of the
+    slice along the normal of the pane follows the shared origin, so the
+    panes show orthogonal slices through the same point.
+
+    Parameters
+    ----------
+    basis : {'xy', 'xz', 'yz'}
+        Basis of the slice
+    center : 2-tuple of float
+        Center of the pane in the plane of the slice
+    width, height : float
+        Size of the pane in model units
+    h_res, v_res : int
+        Resolution of the pane image
+
+    Attributes
+    ----------
+    traceKey : tuple
+        Trace settings of idBuffer
+    idBuffer : NumPy int array (v_res, h_res, n_channels)
+        Id map of the last rendered image
+    image : NumPy uint8 array (v_res, h_res, 3)
+        Last rendered image
+    view : PlotView instance
+        View of the last rendered image
+    requested : tuple
+        Trace settings and appearance key, from view_state, of the view
+        last requested for the pane
+    requestedView : PlotView instance
+        View last requested for the pane, kept while its key is held
+    """
+
+    def __init__(self, basis, center, width, height, h_res=400, v_res=400):
+        self.basis = basis
+        self.center = tuple(center)
+        self.width = width
+        self.height = height
+        self.h_res = h_res
+        self.v_res = v_res
+
+        self.traceKey = None
+        self.idBuffer = None
+        self.image = None
+        self.view = None
+        self.requested = None
+        self.requestedView = None
+
+    def getView(self, base, origin):
+        """ Return the view of the pane through origin
+
+        Parameters
+        ----------
+        base : PlotView instance
+            View whose appearance settings the pane shares; the domain
+            settings are shared, not copied
+        origin : 3-tuple of float
+            Shared origin of the panes
+        """
+
+        xb, yb, zb = BASIS_AXES[self.basis]
+        point = [0., 0., 0.]
+        point[xb], point[yb] = self.center
+        point[zb] = float(origin[zb])
+
+        view = copy.copy(base)
+        view.basis = self.basis
+        view.origin = point
+        view.width = self.width
+        view.height = self.height
+        view.h_res = self.h_res
+        view.v_res = self.v_res
+        return view
+
+    def planeToWorld(self, x, y, origin):
+        """ Return the model point of pane coordinates (x, y) in the slice
+        through origin """
+
+        xb, yb, zb = BASIS_AXES[self.basis]
+        point = [0., 0., 0.]
+        point[xb], point[yb], point[zb] = x, y, float(origin[zb])
+        return tuple(point)
+
+    def worldToPlane(self, point):
+        """ Return the pane coordinates of a model point """
+
+        xb, yb = BASIS_AXES[self.basis][:2]
+        return point[xb], point[yb]
+
+    def zoom(self, factor, x=None, y=None):
+        """ Scale the pane extent by factor, keeping the pane coordinates
+        (x, y) fixed, or the center if not given """
+
+        cx, cy = self.center
+        if x is None:
+            x, y = cx, cy
+        self.center = (x + (cx - x) * factor, y + (cy - y) * factor)
+        self.width *= factor
+        self.height *= factor
+
+class RenderQueue():
+    """ Shared queue rendering the views of several panes concurrently
+
+    Every pane has at most one pending request; a newer request for a pane
+    replaces the pending one, and the result of a request superseded while
+    it was rendering is dropped. Panes are traced in parallel by the
+    worker pool of the model, if it has one. Otherwise, as openmc.capi
+    holds a single session, traces are queued by the scheduler of the
+    model, if it has one, and serialized by PlotModel.traceLock while
+    coloring, overlays and outlines of different panes overlap.
+
+    Parameters
+    ----------
+    model : PlotModel instance
+        Model rendering the views
+    callback : callable
+        Called from a render thread with the pane name, view, image and id
+        buffer of every request that completes without being superseded
+    n_threads : int
+        Number of render threads
+    onError : callable, optional
+        Called from a render thread with the pane name and the exception of
+        any request that fails
+    """
+
+    def __init__(self, model, callback, n_threads=3, onError=None):
+        self.model = model
+        self.callback = callback
+        self.onError = onError
+        self._pool = ThreadPoolExecutor(n_threads)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._serials = {}
+
+    def submit(self, name, view, idBuffer=None):
+        """ Request an image of a view for a pane
+
+        Parameters
+        ----------
+        name : str
+            Pane the image is rendered for
+        view : PlotView instance
+            View to render
+        idBuffer : NumPy int array (v_res, h_res, n_channels), optional
+            Id map of the view, if already traced
+        """
+
+        with self._lock:
+            serial = self._serials.get(name, 0) + 1
+            self._serials[name] = serial
+            queued = name in self._pending
+            self._pending[name] = (serial, view, idBuffer)
+        if not queued:
+            self._pool.submit(self._render, name)
+
+    def _render(self, name):
+        with self._lock:
+            serial, view, idBuffer = self._pending.pop(name)
+
+        try:
+            with profiler.timer(f'pane {name}'):
+                image, idBuffer = self.model.renderView(view, idBuffer)
+        except Exception as e:
+            if self.onError is not None:
+                self.onError(name, e)
+            return
+
+        with self._lock:
+            if serial != self._serials[name]:
+                return
+        self.callback(name, view, image, idBuffer)
+
+    def shutdown(self):
+        """ Drop pending requests and wait for running ones to finish """
+
+        with self._lock:
+            self._pending.clear()
+            for name in self._serials:
+                self._serials[name] += 1
+        self._pool.shutdown(wait=True)
+
+class SlicePanes():
+    """ Synchronized xy, xz and yz slice panes through a shared origin
+
+    The panes share the geometry session and the domain appearance of the
+    current plot. An update re-renders only the panes whose view changed:
+    moving the origin along an axis re-traces only the pane normal to it,
+    and appearance changes recolor the cached id map of each pane without
+    tracing it again.
+
+    Parameters
+    ----------
+    model : PlotModel instance
+        Model rendering the panes
+    callback : callable
+        Called from a render thread with the name of each pane whose image
+        was rendered
+    resolution : int
+        Horizontal and vertical resolution of each pane
+    n_threads : int
+        Number of render threads of the shared queue
+    onError : callable, optional
+        Called from a render thread with the pane name and the exception of
+        any render that fails
+
+    Attributes
+    ----------
+    panes : dict of SlicePane instances
+        Panes by basis
+    origin : 3-tuple of float
+        Shared origin of the panes
+    """
+
+    def __init__(self, model, callback, resolution=400, n_threads=3,
+                 onError=None):
+        self.model = model
+        self.notify = callback
+        cv = model.currentView
+        self.origin = tuple(float(x) for x in cv.origin)
+
+        size = max(cv.width, cv.height)
+        self.panes = {}
+        for basis, (xb, yb, zb) in BASIS_AXES.items():
+            center = (self.origin[xb], self.origin[yb])
+            self.panes[basis] = SlicePane(basis, center, size, size,
+                                          resolution, resolution)
+
+        self.queue = RenderQueue(model, self._rendered, n_threads, onError)
+
+    def _rendered(self, name, view, image, idBuffer):
+        pane = self.panes[name]
+        pane.view = view
+        pane.image = image
+        pane.idBuffer = idBuffer
+        pane.traceKey = view.getTraceKey()
+        self.notify(name)
+
+    def update(self, origin=None, force=False):
+        """ Request images of the panes whose view changed
+
+        Parameters
+        ----------
+        origin : 3-tuple of float, optional
+            New shared origin
+        force : bool
+            Whether all panes are recolored, e.g. after the tally overlay
+            changed; cached id maps are still reused
+
+        Returns
+        -------
+        names : list of str
+            Panes that are re-rendered
+        """
+
+        if origin is not None:
+            self.origin = tuple(float(x) for x in origin)
+
+        names = []
+        for name, pane in self.panes.items():
+            view = pane.getView(self.model.currentView, self.origin)
+            state = view_state(view)
+            if state == pane.requested and not force:
+                continue
+            pane.requested = state
+            pane.requestedView = view
+
+            key = state[0]
+
+            idBuffer = pane.idBuffer if key == pane.traceKey else None
+            self.queue.submit(name, view, idBuffer)
+            names.append(name)
+        return names
+
+    def getBufferBytes(self):
+        """ Return the size of the images and id maps of the panes """
+        return sum(array_bytes(pane.idBuffer, pane.image)
+                   for pane in self.panes.values())
+
+    def clearBuffers(self):
+        """ Drop the id maps of the panes, which are traced again when the
+        panes are next re-rendered
+
+        Returns
+        -------
+        freed : int
+            Size of the dropped id maps
+        """
+
+        freed = 0
+        for pane in self.panes.values():
+            freed += array_bytes(pane.idBuffer)
+            pane.idBuffer = None
+            pane.traceKey = None
+        return freed
+
+    def close(self):
+        self.queue.shutdown()
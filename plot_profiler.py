@@ -0,0 +1,145 @@
+import functools, json, os, threading, time
+from collections import OrderedDict, deque
+
+class _NullTimer():
+    """ Shared no-op context manager returned while profiling is disabled """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer():
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        stop = time.perf_counter()
+        nested = self.profiler._exit()
+        self.profiler.record(self.name, self.start, stop, nested)
+        return False
+
+class Profiler():
+    """ Named timers around the hot paths of the plot pipeline
+
+    While disabled, timer() returns a shared no-op context manager and
+    timed() wrappers cost a single attribute check.
+
+    Attributes
+    ----------
+    enabled : bool
+        Indication of whether timings are recorded
+    stages : collections.OrderedDict
+        Accumulated seconds per timer name on the thread that last called
+        newFrame since that call, i.e. the per-stage breakdown of the last
+        render; stages may be nested in one another
+    total : float
+        Seconds of the stages not nested in other stages, i.e. the time
+        of the last render
+    events : collections.deque of tuple
+        (name, start, stop, thread id) of every recorded timing, bounded to
+        the most recent maxEvents entries
+    """
+
+    def __init__(self, enabled=False, maxEvents=100000):
+        self.enabled = enabled
+        self.stages = OrderedDict()
+        self.total = 0.
+        self.events = deque(maxlen=maxEvents)
+        self._epoch = time.perf_counter()
+        self._lock = threading.Lock()
+        self._frameThread = None
+        # depth of the running timers of each thread
+        self._local = threading.local()
+
+    def timer(self, name):
+        """ Return a context manager timing the enclosed block as name """
+
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """ Decorator timing every call of the wrapped function as name """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def newFrame(self):
+        """ Start a new per-stage breakdown """
+
+        if self.enabled:
+            with self._lock:
+                self.stages = OrderedDict()
+                self.total = 0.
+                self._frameThread = threading.get_ident()
+
+    def _enter(self):
+        self._local.depth = getattr(self._local, 'depth', 0) + 1
+
+    def _exit(self):
+        """ Leave a timer, returning whether it was nested in another """
+        self._local.depth -= 1
+        return self._local.depth > 0
+
+    def record(self, name, start, stop, nested=False):
+        """ Record a timing; timings of other threads than the one of the
+        current frame, such as background traces, are only kept as events
+        """
+
+        thread = threading.get_ident()
+        with self._lock:
+            self.events.append((name, start, stop, thread))
+            if self._frameThread not in (None, thread):
+                return
+            self.stages[name] = self.stages.get(name, 0.) + (stop - start)
+            if not nested:
+                self.total += stop - start
+
+    def summary(self):
+        """ Return a one-line text breakdown of the last render """
+
+        if not self.stages:
+            return ''
+        parts = [f"{name} {secs * 1e3:.1f}" for name, secs in self.stages.items()]
+        return f"{' | '.join(parts)} | total {self.total * 1e3:.1f} ms"
+
+    def exportChromeTrace(self, filename):
+        """ Write recorded timings as Chrome trace-event JSON
+
+        The file can be opened in chrome://tracing or Perfetto.
+        """
+
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        trace = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                  'ts': (start - self._epoch) * 1e6,
+                  'dur': (stop - start) * 1e6}
+                 for name, start, stop, tid in events]
+
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+
+# application-wide profiler, enabled from the View menu or PLOT_PROFILE=1
+profiler = Profiler(enabled=bool(os.environ.get('PLOT_PROFILE')))
@@ -0,0 +1,208 @@
+""" Query language for selecting cells, materials and universes
+
+A query is a list of terms separated by spaces, all of which a domain must
+match. A term is prefixed with ! to negate it:
+
+    1-500,1000      ids 1 to 500 and 1000 (also >100, <=20)
+    name:fuel.*     name matching a regular expression, ignoring case
+    material:3,7    cells filled with material 3 or 7, or those materials
+    visible         domains in the current plot
+    masked          masked domains
+    highlighted     highlighted domains
+    fuel            any other term matches names, as name:fuel
+
+Terms containing spaces are quoted, e.g. "name:upper grid".
+"""
+
+import re, shlex
+import numpy as np
+
+QUERY_SYNTAX = __doc__.strip()
+
+class QueryError(ValueError):
+    """ Raised for queries that can't be parsed """
+
+_RANGE = re.compile(r'^(\d+)-(\d+)$')
+_COMPARISON = re.compile(r'^(>=|<=|>|<)(\d+)$')
+
+def parse_ids(text):
+    """ Parse a comma separated list of ids, ranges and comparisons
+
+    Returns
+    -------
+    singles : NumPy int64 array
+        Single ids
+    intervals : list of (int, int)
+        Inclusive id ranges; comparisons are open ended ranges
+    """
+
+    singles, intervals = [], []
+    for part in text.split(','):
+        part = part.strip()
+        if part.isdigit():
+            singles.append(int(part))
+        elif _RANGE.match(part):
+            low, high = map(int, _RANGE.match(part).groups())
+            intervals.append((min(low, high), max(low, high)))
+        elif _COMPARISON.match(part):
+            op, value = _COMPARISON.match(part).groups()
+            value = int(value)
+            intervals.append({'>': (value + 1, np.inf),
+                              '>=': (value, np.inf),
+                              '<': (-np.inf, value - 1),
+                              '<=': (-np.inf, value)}[op])
+        else:
+            raise QueryError(f'Invalid id or range "{part}"')
+    return np.array(singles, dtype=np.int64), intervals
+
+def match_ids(ids, text):
+    """ Return a mask of the ids in an id list, as parsed by parse_ids """
+
+    singles, intervals = parse_ids(text)
+    mask = np.isin(ids, singles)
+    for low, high in intervals:
+        mask |= (ids >= low) & (ids <= high)
+    return mask
+
+class DomainIndex():
+    """ Columnar data of the domains of one kind for vectorized queries
+
+    Rows are in the order of the domain dictionary, which is also the row
+    order of the domain tables. Ids and cell fills are read once; names and
+    mask and highlight states are read on each query that uses them, as
+    they are edited in the tables.
+
+    Parameters
+    ----------
+    kind : {'Cell', 'Material', 'Universe'}
+        Domain kind
+    domains : dict of DomainView instances
+        Domains by id
+    model : PlotModel instance
+        Model providing the cell fills and the current plot
+
+    Attributes
+    ----------
+    ids : NumPy int64 array (n,)
+        Id of every domain
+    """
+
+    def __init__(self, kind, domains, model):
+        self.kind = kind
+        self.domains = domains
+        self.model = model
+        self.views = list(domains.values())
+        self.ids = np.fromiter((int(id) for id in domains), dtype=np.int64,
+                               count=len(domains))
+        self._fills = None
+
+    def getFills(self):
+        """ Return (row, material id) pairs of the cells filled with
+        materials, with one pair per material of distributed fills """
+
+        if self._fills is None:
+            rows, materials = [], []
+            cells = self.model.modelCells
+            for row, id in enumerate(self.ids.tolist()):
+                cell = cells.get(id)
+                if cell is None or cell.fill_type not in ('material',
+                                                          'distribmat'):
+                    continue
+                fill = cell.fill
+                for material in fill if isinstance(fill, (list, tuple)) \
+                        else (fill,):
+                    if material is not None:
+                        rows.append(row)
+                        materials.append(material.id)
+            self._fills = (np.array(rows, dtype=np.int64),
+                           np.array(materials, dtype=np.int64))
+        return self._fills
+
+    def getPresent(self):
+        """ Return the ids of the domains in the current plot """
+
+        model = self.model
+        if model.idBuffer is None:
+            return np.empty(0, dtype=np.int64)
+        cells, instances, materials = model.getIdChannels()
+        if self.kind == 'Material':
+            ids = materials
+        elif self.kind == 'Universe':
+            ids = model.getUniverseIds(cells)
+        else:
+            ids = cells
+        return np.unique(ids)
+
+    def evaluate(self, query):
+        """ Return a mask of the domains matching a query
+
+        Parameters
+        ----------
+        query : str
+            Query, as described in the module documentation; an empty
+            query matches all domains
+
+        Returns
+        -------
+        mask : NumPy bool array (n,)
+
+        Raises
+        ------
+        QueryError
+            If the query can't be parsed
+        """
+
+        try:
+            terms = shlex.split(query)
+        except ValueError as e:
+            raise QueryError(str(e))
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        for term in terms:
+            negate = term.startswith('!')
+            if negate:
+                term = term[1:]
+            matches = self._match(term)
+            mask &= ~matches if negate else matches
+        return mask
+
+    def _match(self, term):
+        key, _, value = term.partition(':')
+        key = key.lower()
+
+        if not value and (term[:1].isdigit() or term[:1] in ('<', '>')):
+            return match_ids(self.ids, term)
+        elif value and key == 'id':
+            return match_ids(self.ids, value)
+        elif value and key in ('material', 'mat'):
+            if self.kind == 'Material':
+                return match_ids(self.ids, value)
+            if self.kind != 'Cell':
+                raise QueryError('Material membership applies to cells and '
+                                 'materials')
+            rows, materials = self.getFills()
+            found = rows[match_ids(materials, value)]
+            return np.bincount(found, minlength=len(self.ids)) > 0
+        elif value and key == 'name':
+            return self._matchName(value)
+        elif not value and key in ('visible', 'inslice'):
+            return np.isin(self.ids, self.getPresent())
+        elif not value and key == 'masked':
+            return np.fromiter((view.masked for view in self.views),
+                               dtype=bool, count=len(self.views))
+        elif not value and key == 'highlighted':
+            return np.fromiter((view.highlighted for view in self.views),
+                               dtype=bool, count=len(self.views))
+        elif value:
+            raise QueryError(f'Unknown query field "{key}"')
+        return self._matchName(term)
+
+    def _matchName(self, pattern):
+        try:
+            search = re.compile(pattern, re.IGNORECASE).search
+        except re.error as e:
+            raise QueryError(f'Invalid name pattern "{pattern}": {e}')
+        return np.fromiter((view.name is not None and
+                            search(view.name) is not None
+                            for view in self.views),
+                           dtype=bool, count=len(self.views))
@@ -0,0 +1,296 @@
+import os, types
+from collections import namedtuple
+from concurrent.futures import as_completed
+import numpy as np
+
+from plot_workers import WorkerPool
+
+_NOT_FOUND_ = -2
+_OVERLAP_ = -3
+
+# kinds of defect pixels
+UNDEFINED, OVERLAP = 0, 1
+KIND_NAMES = {UNDEFINED: 'Undefined', OVERLAP: 'Overlap'}
+
+Cluster = namedtuple('Cluster', ['kind', 'size', 'center', 'lower', 'upper'])
+Cluster.__doc__ = """ Connected group of defect pixels of one kind
+
+Attributes
+----------
+kind : int
+    UNDEFINED or OVERLAP
+size : int
+    Number of pixels in the cluster
+center : NumPy float array (3,)
+    Centroid of the cluster in model coordinates
+lower, upper : NumPy float arrays (3,)
+    Corners of the bounding box of the cluster pixel centers
+"""
+
+def label_voxels(coords):
+    """ Label face-connected clusters of integer grid coordinates
+
+    Clusters are found by union-find over the neighbor pairs, with roots
+    hooked and paths compressed for all points at once, which converges in
+    a number of rounds logarithmic in the cluster size.
+
+    Parameters
+    ----------
+    coords : NumPy int array (n, d)
+        Distinct grid coordinates of the points
+
+    Returns
+    -------
+    labels : NumPy int array (n,)
+        Cluster of each point, numbered from 0
+    """
+
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    shifted = coords.astype(np.int64) - coords.min(axis=0) + 1
+    dims = shifted.max(axis=0) + 2
+    strides = np.cumprod(np.concatenate(([1], dims[:-1])))
+    keys = shifted @ strides
+    order = np.argsort(keys)
+    sortedKeys = keys[order]
+
+    # pairs of points one grid step apart along each axis
+    first, second = [], []
+    for stride in strides:
+        neighbor = keys + stride
+        pos = np.minimum(np.searchsorted(sortedKeys, neighbor), n - 1)
+        found = sortedKeys[pos] == neighbor
+        first.append(np.flatnonzero(found))
+        second.append(order[pos[found]])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+
+    parent = np.arange(n)
+    while True:
+        a, b = parent[first], parent[second]
+        if (a == b).all():
+            break
+        np.minimum.at(parent, np.maximum(a, b), np.minimum(a, b))
+        while True:
+            grand = parent[parent]
+            if (grand == parent).all():
+                break
+            parent = grand
+
+    return np.unique(parent, return_inverse=True)[1].ravel()
+
+def defect_pixels(idBuffer, ignoreExterior=True):
+    """ Find undefined and overlapping pixels of an id map
+
+    Parameters
+    ----------
+    idBuffer : NumPy int array (v_res, h_res, n_channels)
+        Traced id map
+    ignoreExterior : bool
+        Whether undefined regions touching the edge of the slice, such as
+        the space around a cylindrical core, are left out
+
+    Returns
+    -------
+    undefined, overlap : NumPy int32 arrays
+        Flat pixel indices of undefined and overlapping pixels
+    """
+
+    cells = idBuffer[:, :, 0]
+    v_res, h_res = cells.shape
+
+    undefined = np.flatnonzero(cells == _NOT_FOUND_)
+    if ignoreExterior and len(undefined):
+        rows, cols = np.divmod(undefined, h_res)
+        labels = label_voxels(np.column_stack((cols, rows)))
+        edge = (rows == 0) | (rows == v_res - 1) | \
+            (cols == 0) | (cols == h_res - 1)
+        undefined = undefined[~np.isin(labels, labels[edge])]
+
+    overlap = np.flatnonzero(cells == _OVERLAP_)
+    return undefined.astype(np.int32), overlap.astype(np.int32)
+
+def slice_keys(lower_left, upper_right, basis='xy', n_slices=100,
+               resolution=1000, level=-1):
+    """ Trace settings of a stack of slices through a box
+
+    Slices are centered in n_slices equal layers of the box along the
+    normal of the basis, with square pixels and resolution pixels along
+    the longer side.
+
+    Returns
+    -------
+    keys : list of tuple
+        Trace settings of every slice, as from PlotView.getTraceKey
+    """
+
+    lower_left = np.asarray(lower_left, dtype=float)
+    upper_right = np.asarray(upper_right, dtype=float)
+    if not (np.isfinite(lower_left).all() and np.isfinite(upper_right).all()):
+        raise ValueError('The scanned box must be finite')
+
+    xb = 0 if basis[0] == 'x' else 1
+    yb = 1 if basis[1] == 'y' else 2
+    zb = 3 - (xb + yb)
+
+    size = upper_right - lower_left
+    pixel = max(size[xb], size[yb]) / resolution
+    h_res = max(int(np.ceil(size[xb] / pixel)), 1)
+    v_res = max(int(np.ceil(size[yb] / pixel)), 1)
+    center = (lower_left + upper_right) / 2.
+
+    keys = []
+    for z in lower_left[zb] + (np.arange(n_slices) + 0.5) * size[zb] / n_slices:
+        origin = center.copy()
+        origin[zb] = z
+        keys.append((tuple(origin.tolist()), float(h_res * pixel),
+                     float(v_res * pixel), basis, h_res, v_res, level))
+    return keys
+
+class ScanReport():
+    """ Sparse record of the defect pixels found by a scan
+
+    Attributes
+    ----------
+    keys : list of tuple
+        Trace settings of the scanned slices
+    points : NumPy float32 array (n, 3)
+        Model coordinates of the center of every defect pixel
+    kinds : NumPy int8 array (n,)
+        UNDEFINED or OVERLAP for every pixel
+    labels : NumPy int array (n,)
+        Cluster of every pixel
+    clusters : list of Cluster
+        Clusters, largest first
+    """
+
+    def __init__(self, keys, slices):
+        # imported here so worker processes don't load the GUI modules
+        from plotmodel import ViewMapping
+
+        self.keys = keys
+
+        # grid coordinates (col, row, slice) and model coordinates
+        grid, points, kinds = [], [], []
+        for index, (undefined, overlap) in sorted(slices.items()):
+            origin, width, height, basis, h_res, v_res, level = keys[index]
+            view = types.SimpleNamespace(origin=origin, width=width,
+                                         height=height, basis=basis,
+                                         h_res=h_res, v_res=v_res)
+            mapping = ViewMapping(view)
+            for kind, pixels in ((UNDEFINED, undefined), (OVERLAP, overlap)):
+                rows, cols = np.divmod(pixels.astype(np.int64), h_res)
+                grid.append(np.column_stack((cols, rows,
+                                             np.full(len(rows), index))))
+                points.append(mapping.pixelToWorld(cols + 0.5, rows + 0.5))
+                kinds.append(np.full(len(rows), kind, dtype=np.int8))
+
+        if grid:
+            grid = np.concatenate(grid)
+            self.points = np.concatenate(points).reshape(-1, 3)
+            self.points = self.points.astype(np.float32)
+            self.kinds = np.concatenate(kinds)
+        else:
+            grid = np.empty((0, 3), dtype=np.int64)
+            self.points = np.empty((0, 3), dtype=np.float32)
+            self.kinds = np.empty(0, dtype=np.int8)
+
+        # clusters never mix kinds, so the kind is a fourth grid axis two
+        # steps apart
+        self.labels = label_voxels(np.column_stack((grid, 2 * self.kinds)))
+        self.clusters = self._clusters()
+
+    def _clusters(self):
+        n = self.labels.max() + 1 if len(self.labels) else 0
+        sizes = np.bincount(self.labels, minlength=n)
+        centers = np.column_stack([np.bincount(self.labels, self.points[:, i],
+                                               minlength=n)
+                                   for i in range(3)]) / sizes[:, None]
+        order = np.argsort(self.labels, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        lower = np.minimum.reduceat(self.points[order], starts) if n else []
+        upper = np.maximum.reduceat(self.points[order], starts) if n else []
+        kinds = self.kinds[order][starts] if n else []
+
+        clusters = [Cluster(int(kinds[i]), int(sizes[i]), centers[i],
+                            lower[i], upper[i]) for i in range(n)]
+        clusters.sort(key=lambda cluster: -cluster.size)
+        return clusters
+
+    def save(self, filename):
+        """ Write the report to a compressed NumPy .npz file """
+
+        np.savez_compressed(filename, points=self.points, kinds=self.kinds,
+                            labels=self.labels,
+                            keys=np.array(self.keys, dtype=object))
+
+class ModelScan():
+    """ Scan of a model for undefined regions and overlaps
+
+    Slices are traced by the RenderWorker processes of a WorkerPool, each
+    with its own openmc.capi session, which reduce every slice to the
+    indices of its defect pixels before returning it.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with the model .xml files
+    keys : list of tuple
+        Trace settings of the slices to scan, e.g. from slice_keys
+    n_workers : int, optional
+        Number of worker processes; defaults to the number of CPUs
+    ignoreExterior : bool
+        Whether undefined regions touching the edge of a slice are left out
+    """
+
+    def __init__(self, directory, keys, n_workers=None, ignoreExterior=True):
+        self.directory = directory
+        self.keys = keys
+        self.n_workers = max(1, min(n_workers or os.cpu_count() or 1,
+                                    len(keys)))
+        self.ignoreExterior = ignoreExterior
+
+    def run(self, progress=None, pool=None, priority=0):
+        """ Scan all slices
+
+        Parameters
+        ----------
+        progress : callable, optional
+            Called from the calling thread with the number of slices done
+            after each slice; the scan stops early if it returns False
+        pool : WorkerPool instance, optional
+            Pool of workers of the model to scan with; a pool of n_workers
+            workers is started for the scan if not given
+        priority : int
+            Priority of the slices in the pool
+
+        Returns
+        -------
+        report : ScanReport
+            Defect pixels of the slices scanned
+        """
+
+        own = pool is None
+        if own:
+            pool = WorkerPool(self.directory, self.n_workers)
+
+        slices = {}
+        futures = {}
+        try:
+            for index, key in enumerate(self.keys):
+                future = pool.submit('scan', key, priority,
+                                     ignoreExterior=self.ignoreExterior)
+                futures[future] = index
+            for future in as_completed(futures):
+                slices[futures[future]] = future.result()
+                if progress is not None and progress(len(slices)) is False:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+            if own:
+                pool.close()
+
+        return ScanReport(self.keys, slices)
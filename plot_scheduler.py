@@ -0,0 +1,260 @@
+""" Prioritized scheduling of the id and property map traces of a model
+
+Interactions produce bursts of trace requests, e.g. undo spam or zoom box
+releases, on top of prefetches of views the user is likely to go to next
+and batch work such as exports and animations. A RenderScheduler runs
+them in order of priority:
+
+    INTERACTIVE     the view the user is looking at, and the slice panes
+    PREFETCH        maps traced ahead of use, e.g. of the undo and redo
+                    views, and the property map of the plot under the
+                    cursor
+    BATCH           image exports and animations
+
+Requests for a view that is already queued, running or cached share its
+trace, and a request made on a channel supersedes the earlier request of
+the channel, whose trace is dropped if it has not started. A trace that
+has started can't be interrupted, but its id map is cached for a later
+request.
+"""
+
+import itertools, queue, threading
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+
+INTERACTIVE, PREFETCH, BATCH = 2, 1, 0
+
+class _Trace():
+    __slots__ = ('key', 'view', 'trace', 'priority', 'futures', 'running')
+
+    def __init__(self, key, view, trace, priority):
+        self.key = key
+        self.view = view
+        self.trace = trace
+        self.priority = priority
+        self.futures = []
+        self.running = False
+
+class RenderScheduler():
+    """ Priority queue of the id map traces of a model
+
+    Parameters
+    ----------
+    trace : callable
+        Traces the id map of a PlotView, e.g. PlotModel.traceIdsNow
+    n_threads : int
+        Number of traces run at once; openmc.capi runs one at a time
+    cacheSize : int
+        Number of maps kept for later requests: prefetched maps, and maps
+        of superseded requests whose trace had already started
+
+    Attributes
+    ----------
+    stats : dict
+        Number of requests, of traces run, and of requests that shared a
+        queued or running trace, were superseded or were served from the
+        cache
+    """
+
+    def __init__(self, trace, n_threads=1, cacheSize=4):
+        self.trace = trace
+        self.cacheSize = cacheSize
+        self.stats = dict.fromkeys(('requested', 'traced', 'shared',
+                                    'superseded', 'cached'), 0)
+
+        self._queue = queue.PriorityQueue()
+        self._serials = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._traces = {}
+        self._channels = {}
+        self._prefetches = []
+        self._cache = OrderedDict()
+
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(n_threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, view, priority=INTERACTIVE, channel=None, trace=None):
+        """ Request the id map of a view
+
+        Parameters
+        ----------
+        view : PlotView instance
+            View to trace; it must not be changed until the request is done
+        priority : {INTERACTIVE, PREFETCH, BATCH}
+            Queued traces of higher priority run first, and traces of equal
+            priority in the order they were requested
+        channel : str, optional
+            Requests of a channel supersede each other: the previous request
+            of the channel is cancelled if it is not done yet
+        trace : callable, optional
+            Traces another map of the view in place of the id map, e.g.
+            PlotModel.traceProperties; requests share traces and cached
+            maps only with requests of the same map
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Id map of the view, or the map traced by trace; cancelled if
+            the request is superseded
+        """
+
+        key = view.getTraceKey()
+        if trace is not None:
+            key = (trace, key)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The render scheduler is shut down')
+            self.stats['requested'] += 1
+            previous = None
+            if channel is not None:
+                previous = self._channels.get(channel)
+                self._channels[channel] = future
+
+            idBuffer = self._cache.get(key)
+            if idBuffer is not None:
+                self._cache.move_to_end(key)
+                self.stats['cached'] += 1
+            else:
+                queued = self._traces.get(key)
+                if queued is None:
+                    queued = self._traces[key] = \
+                        _Trace(key, view, trace or self.trace, priority)
+                    self._enqueue(queued)
+                else:
+                    self.stats['shared'] += 1
+                    if priority > queued.priority and not queued.running:
+                        # the entry of the old priority is skipped
+                        queued.priority = priority
+                        self._enqueue(queued)
+                queued.futures.append(future)
+
+        if previous is not None:
+            self._supersede(previous)
+        if idBuffer is not None:
+            future.set_result(idBuffer)
+        return future
+
+    def prefetch(self, views):
+        """ Trace views ahead of use, superseding earlier prefetches
+
+        Views that are already cached, queued or running are not traced
+        again.
+
+        Returns
+        -------
+        futures : list of concurrent.futures.Future
+            Id maps of the views
+        """
+
+        futures = [self.submit(view, PREFETCH) for view in views]
+        with self._lock:
+            previous, self._prefetches = self._prefetches, futures
+        for future in previous:
+            if future not in futures:
+                self._supersede(future)
+        return futures
+
+    def cancel(self, channel):
+        """ Cancel the pending request of a channel, if any """
+
+        with self._lock:
+            future = self._channels.pop(channel, None)
+        if future is not None:
+            self._supersede(future)
+
+    def _supersede(self, future):
+        if future.cancel():
+            with self._lock:
+                self.stats['superseded'] += 1
+
+    def _enqueue(self, trace):
+        self._queue.put((-trace.priority, next(self._serials), trace))
+
+    def _run(self):
+        while True:
+            _, _, trace = self._queue.get()
+            if trace is None:
+                break
+
+            with self._lock:
+                if trace.running or self._traces.get(trace.key) is not trace:
+                    continue
+                if all(future.cancelled() for future in trace.futures):
+                    # every request of the trace was superseded
+                    del self._traces[trace.key]
+                    continue
+                trace.running = True
+
+            error = None
+            try:
+                idBuffer = trace.trace(trace.view)
+            except Exception as e:
+                error = e
+
+            with self._lock:
+                del self._traces[trace.key]
+                self.stats['traced'] += 1
+                futures = trace.futures
+                wanted = [future for future in futures
+                          if not future.cancelled()]
+                if error is None and (trace.priority == PREFETCH or
+                                      not wanted):
+                    self._cache[trace.key] = idBuffer
+                    self._cache.move_to_end(trace.key)
+                    while len(self._cache) > self.cacheSize:
+                        self._cache.popitem(last=False)
+
+            for future in futures:
+                try:
+                    if error is None:
+                        future.set_result(idBuffer)
+                    else:
+                        future.set_exception(error)
+                except InvalidStateError:
+                    # cancelled since
+                    pass
+
+    @property
+    def cacheBytes(self):
+        """ Size of the cached id maps """
+        with self._lock:
+            return sum(idBuffer.nbytes for idBuffer in self._cache.values())
+
+    def clearCache(self):
+        """ Drop the cached id maps
+
+        Returns
+        -------
+        freed : int
+            Size of the dropped id maps
+        """
+
+        with self._lock:
+            freed = sum(idBuffer.nbytes for idBuffer in self._cache.values())
+            self._cache.clear()
+        return freed
+
+    def pending(self):
+        """ Return the number of queued and running traces """
+        with self._lock:
+            return len(self._traces)
+
+    def shutdown(self):
+        """ Cancel queued requests and wait for running traces to finish """
+
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            futures = [future for trace in self._traces.values()
+                       for future in trace.futures]
+            for _ in self._threads:
+                self._queue.put((float('inf'), next(self._serials), None))
+        for future in futures:
+            future.cancel()
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,595 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+""" Render server hosting an OpenMC model for remote plot clients
+
+The server holds the openmc.capi session of one model directory in a
+single long-lived process, for instance on a node with enough memory for a
+large geometry, and answers view requests over HTTP with encoded id,
+property and RGB buffers. Results are cached, identical requests in flight
+are traced once, and requests beyond the queue size are refused with 503
+so clients never wait behind an unbounded backlog.
+
+Usage:
+
+    python plot_server.py path/to/model --port 8765
+    python plot_explorer.py --server http://localhost:8765
+
+The GUI reads the model .xml files (e.g. from a shared file system) for
+its domain tables and traces every view through the server. Scripts use
+RenderClient directly:
+
+    client = RenderClient('http://localhost:8765')
+    idBuffer = client.idMap(((0., 0., 0.), 100., 100., 'xy', 1000, 1000, -1))
+
+Protocol:
+
+    GET  /info          JSON with the model fingerprint and server stats
+    POST /id_map        {"key": trace settings}
+    POST /property_map  {"key": trace settings}
+    POST /render        {"key": trace settings, "appearance": {...},
+                         "domains": {...}}, as built by view_settings
+
+Buffers are returned run-length encoded by plot_codec, typically a few
+hundredths to thousandths of their size; errors as JSON with an "error"
+message.
+"""
+
+import argparse, copy, json, os, sys, threading, time
+import urllib.error, urllib.request
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+from plot_codec import EncodedArray, encode_array
+from plot_profiler import profiler
+
+# appearance settings of a PlotView that are RGB tuples
+_COLORS = ('maskBackground', 'highlightBackground', 'plotBackground',
+           'outlineColor')
+
+def encode_arrays(**arrays):
+    """ Return named arrays run-length encoded and compressed by
+    plot_codec, preceded by a JSON line of their names and sizes """
+
+    encoded = {name: encode_array(array).tobytes()
+               for name, array in arrays.items()}
+    sizes = json.dumps({name: len(data) for name, data in encoded.items()})
+    return b'\n'.join([sizes.encode(), b''.join(encoded.values())])
+
+def decode_arrays(data):
+    """ Return the named arrays of data written by encode_arrays """
+
+    header, _, data = bytes(data).partition(b'\n')
+    arrays = {}
+    position = 0
+    for name, size in json.loads(header).items():
+        arrays[name] = EncodedArray.frombytes(
+            data[position:position + size]).decode()
+        position += size
+    return arrays
+
+def parse_key(data):
+    """ Validate trace settings received as JSON
+
+    Returns
+    -------
+    key : tuple
+        (origin, width, height, basis, h_res, v_res, level), as from
+        PlotView.getTraceKey
+
+    Raises
+    ------
+    ValueError
+        If the settings are malformed
+    """
+
+    from plotmodel import BASES
+
+    try:
+        origin, width, height, basis, h_res, v_res, level = data
+        key = (tuple(float(x) for x in origin), float(width), float(height),
+               basis, int(h_res), int(v_res), int(level))
+    except (TypeError, ValueError):
+        raise ValueError('Trace settings must be [origin, width, height, '
+                         'basis, h_res, v_res, level]')
+    if len(key[0]) != 3 or basis not in BASES or \
+            not (key[1] > 0 and key[2] > 0 and key[4] > 0 and key[5] > 0):
+        raise ValueError(f'Invalid trace settings {data}')
+    return key
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def view_settings(view, base=None):
+    """ Return the trace, appearance and domain settings of a view as a
+    JSON serializable render request
+
+    Parameters
+    ----------
+    view : PlotView instance
+        View to render
+    base : PlotView instance, optional
+        View with the default domain settings of the same model, such as
+        PlotModel.defaultView; only domains that differ from it are sent.
+        All domains are sent if not given.
+
+    Returns
+    -------
+    settings : dict
+    """
+
+    from plotmodel import APPEARANCE, DOMAIN_ATTRIBUTES
+
+    domains = {}
+    for attribute in DOMAIN_ATTRIBUTES:
+        defaults = getattr(base, attribute) if base is not None else {}
+        changed = {}
+        for id, dom in getattr(view, attribute).items():
+            default = defaults.get(id)
+            if default is None or dom.color != default.color or \
+                    dom.masked != default.masked or \
+                    dom.highlighted != default.highlighted:
+                changed[id] = [dom.color, dom.masked, dom.highlighted]
+        domains[attribute] = changed
+
+    settings = {'key': view.getTraceKey(),
+                'appearance': {name: getattr(view, name)
+                               for name in APPEARANCE},
+                'domains': domains}
+    # round trip so numpy values are converted once, here
+    return json.loads(json.dumps(settings, default=_to_json))
+
+def apply_view_settings(view, settings):
+    """ Return a copy of a view with the appearance and domain settings of
+    a render request applied
+
+    The domain dictionaries of the view are copied, not the domains that
+    are left unchanged, so this is cheap for models with many domains.
+
+    Raises
+    ------
+    ValueError
+        If a setting is unknown or malformed
+    """
+
+    from plotmodel import (APPEARANCE, COLOR_DOMAINS, DOMAIN_ATTRIBUTES,
+        DomainView)
+
+    view = copy.copy(view)
+    appearance = settings.get('appearance', {})
+    unknown = set(appearance) - set(APPEARANCE)
+    if unknown:
+        raise ValueError(f"Unknown view settings {', '.join(sorted(unknown))}")
+    if appearance.get('colorby', view.colorby) not in COLOR_DOMAINS:
+        raise ValueError(f"Invalid color mode {appearance['colorby']}")
+
+    for name, value in appearance.items():
+        if name in _COLORS:
+            value = tuple(value)
+        elif name == 'propertyLimits':
+            value = {prop: None if limits is None else tuple(limits)
+                     for prop, limits in value.items()}
+        setattr(view, name, value)
+
+    for attribute, changed in settings.get('domains', {}).items():
+        if attribute not in DOMAIN_ATTRIBUTES:
+            raise ValueError(f'Unknown domain kind {attribute}')
+        domains = dict(getattr(view, attribute))
+        for id, (color, masked, highlighted) in changed.items():
+            if id not in domains:
+                raise ValueError(f'No domain {id} in {attribute}')
+            if isinstance(color, list):
+                color = tuple(color)
+            domains[id] = DomainView(id, domains[id].name, color,
+                                     bool(masked), bool(highlighted))
+        setattr(view, attribute, domains)
+
+    return view
+
+class ServerBusy(RuntimeError):
+    """ Raised when the request queue of a server is full """
+
+class ResultCache():
+    """ Least recently used cache of encoded results, bounded in bytes
+
+    Parameters
+    ----------
+    maxBytes : int
+        Total size of the cached results
+    """
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.nbytes = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, request):
+        with self._lock:
+            data = self._results.get(request)
+            if data is not None:
+                self._results.move_to_end(request)
+            return data
+
+    def put(self, request, data):
+        if len(data) > self.maxBytes:
+            return
+        with self._lock:
+            if request in self._results:
+                return
+            self._results[request] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.maxBytes:
+                request, evicted = self._results.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/info':
+            self._error(404, f'No resource {self.path}')
+            return
+        self._send(200, 'application/json',
+                   json.dumps(self.server.getInfo()).encode())
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        if path not in ('/id_map', '/property_map', '/render'):
+            self._error(404, f'No resource {self.path}')
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise ValueError('Requests must be JSON objects')
+            key = parse_key(request.get('key'))
+            if path == '/id_map':
+                data = self.server.idMap(key)
+            elif path == '/property_map':
+                data = self.server.propertyMap(key)
+            else:
+                data = self.server.render(key, request)
+        except ServerBusy as e:
+            self._error(503, str(e))
+        except ValueError as e:
+            self._error(400, str(e))
+        except Exception as e:
+            self._error(500, f'{type(e).__name__}: {e}')
+        else:
+            self._send(200, 'application/octet-stream', data)
+
+    def _send(self, status, contentType, data):
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message):
+        self.server._count('errors')
+        self._send(status, 'application/json',
+                   json.dumps({'error': message}).encode())
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class RenderServer(ThreadingHTTPServer):
+    """ HTTP server rendering views of a PlotModel for remote clients
+
+    Every connection is served on its own thread. Traces are serialized by
+    the trace lock of the model, while coloring of render requests runs
+    concurrently. Encoded results are cached by request, and concurrent
+    identical requests wait for the one being computed.
+
+    Parameters
+    ----------
+    model : PlotModel instance
+        Model with the openmc.capi session of this process
+    address : 2-tuple
+        Host and port to listen on; port 0 picks a free port
+    queueSize : int
+        Number of requests computed or waiting to trace at once; further
+        requests are refused as busy
+    cacheBytes : int
+        Size of the result cache
+    verbose : bool
+        Whether every request is logged to stderr
+
+    Attributes
+    ----------
+    url : str
+        Address of the server
+    stats : collections.Counter
+        Number of requests, cache hits, coalesced requests, busy refusals
+        and errors
+    """
+
+    daemon_threads = True
+
+    def __init__(self, model, address=('127.0.0.1', 0), queueSize=8,
+                 cacheBytes=512 * 2**20, verbose=False):
+        super().__init__(address, _RequestHandler)
+        self.model = model
+        self.verbose = verbose
+        self.queueSize = queueSize
+        self.cache = ResultCache(cacheBytes)
+        self.stats = Counter()
+        self._slots = threading.BoundedSemaphore(queueSize)
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def getInfo(self):
+        return {'fingerprint': self.model.fingerprint,
+                'directory': os.getcwd(),
+                'queueSize': self.queueSize,
+                'cachedResults': len(self.cache),
+                'cachedBytes': self.cache.nbytes,
+                'stats': dict(self.stats)}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def getResult(self, request, compute, queued=True):
+        """ Return the encoded result of a request from the cache, from an
+        identical request in flight, or by calling compute
+
+        Parameters
+        ----------
+        request : tuple
+            Cache key of the request
+        compute : callable
+            Returns the encoded result
+        queued : bool
+            Whether computing takes a place in the queue; requests made
+            while computing another one don't
+
+        Raises
+        ------
+        ServerBusy
+            If the result has to be computed and the queue is full
+        """
+
+        self._count('requests')
+        data = self.cache.get(request)
+        if data is not None:
+            self._count('cache hits')
+            return data
+
+        with self._lock:
+            future = self._inflight.get(request)
+            owner = future is None
+            if owner:
+                future = self._inflight[request] = Future()
+        if not owner:
+            self._count('coalesced')
+            return future.result()
+
+        try:
+            if queued and not self._slots.acquire(blocking=False):
+                self._count('busy')
+                raise ServerBusy(f'Server busy with {self.queueSize} '
+                                 'requests')
+            try:
+                data = compute()
+            finally:
+                if queued:
+                    self._slots.release()
+            self.cache.put(request, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[request]
+
+    def _keyView(self, key):
+        view = copy.copy(self.model.defaultView)
+        origin, view.width, view.height, view.basis, view.h_res, \
+            view.v_res, view.level = key
+        view.origin = list(origin)
+        return view
+
+    def idMap(self, key, queued=True):
+        """ Return the encoded id map of trace settings """
+
+        def compute():
+            with profiler.timer('server id_map'):
+                ids = self.model.traceIds(self._keyView(key))
+            return encode_arrays(ids=ids)
+
+        return self.getResult(('id_map', key), compute, queued)
+
+    def propertyMap(self, key, queued=True):
+        """ Return the encoded property map of trace settings """
+
+        def compute():
+            with profiler.timer('server property_map'):
+                props = self.model.traceProperties(self._keyView(key))
+            return encode_arrays(props=props)
+
+        return self.getResult(('property_map', key), compute, queued)
+
+    def render(self, key, settings):
+        """ Return the encoded id map and image of a render request, as
+        built by view_settings
+
+        Id and property maps are shared with the id_map and property_map
+        requests of the same trace settings, so appearance changes only
+        recolor. Property heatmaps without limits are fitted to the view.
+        """
+
+        from plotmodel import PROPERTIES
+
+        view = apply_view_settings(self._keyView(key), settings)
+        request = ('render', key, json.dumps([settings.get('appearance'),
+                                              settings.get('domains')],
+                                             sort_keys=True))
+
+        def compute():
+            ids = decode_arrays(self.idMap(key, queued=False))['ids']
+            props = None
+            if view.colorby in PROPERTIES:
+                props = decode_arrays(self.propertyMap(key,
+                                                      queued=False))['props']
+            with profiler.timer('server render'):
+                image, ids = self.model.renderView(view, ids, props,
+                                                   fitLimits=True)
+            return encode_arrays(ids=ids, image=image)
+
+        return self.getResult(request, compute)
+
+class RenderClient():
+    """ Client of a RenderServer
+
+    Clients can be used as the tracer of a PlotModel of the same model, so
+    that the model is traced by the server instead of an openmc.capi
+    session in this process.
+
+    Parameters
+    ----------
+    url : str
+        Address of the server, e.g. http://localhost:8765
+    timeout : float
+        Seconds to wait for a response
+    retries : int
+        Number of times a request refused as busy is retried, waiting
+        twice as long before each retry
+
+    Attributes
+    ----------
+    fingerprint : str
+        Content fingerprint of the model of the server
+
+    Raises
+    ------
+    RuntimeError
+        If the server can't be reached
+    """
+
+    def __init__(self, url, timeout=600., retries=4):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.fingerprint = self.getInfo()['fingerprint']
+
+    def _request(self, path, payload=None):
+        for attempt in range(self.retries):
+            try:
+                return self._send(path, payload)
+            except ServerBusy:
+                time.sleep(0.25 * 2**attempt)
+        return self._send(path, payload)
+
+    def _send(self, path, payload):
+        data = None if payload is None else \
+            json.dumps(payload, default=_to_json).encode()
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={'Content-Type':
+                                                  'application/json'})
+        try:
+            with urllib.request.urlopen(request,
+                                        timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())['error']
+            except (ValueError, KeyError, TypeError):
+                message = f'HTTP {e.code}'
+            if e.code == 503:
+                raise ServerBusy(f'{self.url}: {message}')
+            raise RuntimeError(f'{self.url}: {message}')
+        except OSError as e:
+            raise RuntimeError(f'{self.url}: {e}')
+
+    def getInfo(self):
+        """ Return the model fingerprint and statistics of the server """
+        return json.loads(self._request('/info'))
+
+    def idMap(self, key):
+        """ Trace the id map of a view given its trace settings """
+        return decode_arrays(self._request('/id_map', {'key': key}))['ids']
+
+    def propertyMap(self, key):
+        """ Trace the property map of a view given its trace settings """
+        return decode_arrays(self._request('/property_map',
+                                           {'key': key}))['props']
+
+    def render(self, view, base=None):
+        """ Render a view on the server
+
+        Parameters
+        ----------
+        view : PlotView instance
+            View to render
+        base : PlotView instance, optional
+            Default view of the model; only domains that differ from it
+            are sent
+
+        Returns
+        -------
+        image : NumPy uint8 array (v_res, h_res, 3)
+            RGB data of the view
+        idBuffer : NumPy int array (v_res, h_res, n_channels)
+            Id map of the view
+        """
+
+        arrays = decode_arrays(self._request('/render',
+                                             view_settings(view, base)))
+        return arrays['image'], arrays['ids']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve plots of an OpenMC model to remote clients')
+    parser.add_argument('directory', nargs='?', default='.',
+                        help='directory with the model .xml files')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on; the default only '
+                        'accepts local clients')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--queue', type=int, default=8,
+                        help='requests computed at once before clients '
+                        'are refused as busy')
+    parser.add_argument('--cache-mb', type=int, default=512,
+                        help='size of the result cache in MB')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request')
+    args = parser.parse_args(argv)
+
+    import openmc.capi
+    from plotmodel import PlotModel
+
+    os.chdir(args.directory)
+    openmc.capi.init(['-c'])
+    try:
+        server = RenderServer(PlotModel(), (args.host, args.port), args.queue,
+                              args.cache_mb * 2**20, args.verbose)
+        print(f'Serving {os.getcwd()} at {server.url}', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    finally:
+        openmc.capi.finalize()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+""" Shared memory for maps traced in worker processes
+
+RenderWorker processes write id and property maps straight into blocks of
+a SharedArena of the requesting process, which views them as NumPy arrays
+without copying them or sending them through a pipe.
+"""
+
+import atexit, threading, weakref
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import numpy as np
+
+class SharedBlock():
+    """ Shared memory block of an arena
+
+    Attributes
+    ----------
+    name : str
+        Name under which worker processes attach the block
+    size : int
+        Size of the block in bytes
+    refs : int
+        Number of holders: requests writing the block and arrays viewing it
+    """
+
+    def __init__(self, size):
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self.size = size
+        self.refs = 0
+
+    def destroy(self):
+        self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # still viewed by an array; the mapping goes when it does
+            pass
+
+class SharedArena():
+    """ Shared memory blocks written by worker processes and viewed in
+    place by this one
+
+    Blocks are reference counted: a block is held by the request a worker
+    is writing it for and by the array viewing the result, including any
+    views of that array. Once all are gone, the block is kept for the next
+    request of the same size, i.e. the next trace at the same resolution,
+    up to maxIdleBytes of idle blocks.
+
+    Parameters
+    ----------
+    maxIdleBytes : int
+        Size of the idle blocks kept for reuse
+
+    Attributes
+    ----------
+    allocated : int
+        Number of blocks created
+    reused : int
+        Number of requests served with an idle block
+    """
+
+    def __init__(self, maxIdleBytes=2**30):
+        self.maxIdleBytes = maxIdleBytes
+        self.allocated = 0
+        self.reused = 0
+        self._idle = OrderedDict()
+        self._idleBytes = 0
+        self._usedBytes = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """ Bytes of the blocks held and the idle blocks """
+        with self._lock:
+            return self._usedBytes + self._idleBytes
+
+    @property
+    def idleBytes(self):
+        """ Bytes of the idle blocks """
+        with self._lock:
+            return self._idleBytes
+
+    def acquire(self, size):
+        """ Return a block of size bytes, held by the caller until it calls
+        release """
+
+        size = max(int(size), 1)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The shared memory arena is closed')
+            blocks = self._idle.get(size)
+            if blocks:
+                block = blocks.pop()
+                if not blocks:
+                    del self._idle[size]
+                self._idleBytes -= size
+                self.reused += 1
+            else:
+                block = None
+            self._usedBytes += size
+
+        if block is None:
+            block = SharedBlock(size)
+            with self._lock:
+                self.allocated += 1
+        block.refs = 1
+        return block
+
+    def wrap(self, block, shape, dtype):
+        """ Return an array viewing the start of a block, which holds the
+        block until it and all views of it are garbage collected """
+
+        array = np.ndarray(shape, dtype, buffer=block.shm.buf)
+        with self._lock:
+            block.refs += 1
+        weakref.finalize(array, self.release, block)
+        return array
+
+    def release(self, block):
+        """ Drop a hold on a block, keeping it for reuse or freeing it once
+        it has no holders """
+
+        with self._lock:
+            block.refs -= 1
+            if block.refs > 0:
+                return
+            self._usedBytes -= block.size
+            keep = not self._closed and \
+                self._idleBytes + block.size <= self.maxIdleBytes
+            if keep:
+                self._idle.setdefault(block.size, []).append(block)
+                self._idle.move_to_end(block.size)
+                self._idleBytes += block.size
+        if not keep:
+            block.destroy()
+
+    def trim(self, maxIdleBytes=0):
+        """ Free idle blocks, least recently sized first, until at most
+        maxIdleBytes are left
+
+        Returns
+        -------
+        freed : int
+            Bytes freed
+        """
+
+        freed = []
+        with self._lock:
+            while self._idleBytes > maxIdleBytes and self._idle:
+                size, blocks = next(iter(self._idle.items()))
+                freed.append(blocks.pop())
+                if not blocks:
+                    del self._idle[size]
+                self._idleBytes -= size
+        for block in freed:
+            block.destroy()
+        return sum(block.size for block in freed)
+
+    def close(self):
+        """ Free the idle blocks, and any held block once released """
+
+        with self._lock:
+            self._closed = True
+        self.trim()
+
+# arena of the maps returned by the render workers of this process
+arena = SharedArena()
+atexit.register(arena.close)
+
+# blocks of other processes written by this one, by name
+_attached = OrderedDict()
+
+def write_block(name, array, maxAttached=8):
+    """ Copy an array to the start of a block of another process's arena
+
+    Blocks stay attached for the next write to them, up to maxAttached of
+    them, as the arena recycles blocks.
+
+    Raises
+    ------
+    ValueError
+        If the array is larger than the block
+    """
+
+    shm = _attached.pop(name, None)
+    if shm is None:
+        # spawned workers share the resource tracker of their parent, which
+        # already tracks the block
+        shm = shared_memory.SharedMemory(name=name)
+    _attached[name] = shm
+    while len(_attached) > maxAttached:
+        _attached.popitem(last=False)[1].close()
+
+    if array.nbytes > shm.size:
+        raise ValueError(f'{array.nbytes} bytes do not fit in a block of '
+                         f'{shm.size}')
+    target = np.ndarray(array.shape, array.dtype, buffer=shm.buf)
+    target[...] = array
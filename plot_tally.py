@@ -0,0 +1,293 @@
+import threading
+import numpy as np
+
+from plot_colors import colormap_lut, apply_lut
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+def _read(group, name, default=None):
+    """ Read a statepoint value stored as a dataset or an attribute """
+
+    if name in group:
+        return group[name][()]
+    return group.attrs.get(name, default)
+
+def _decode(values):
+    return [v.decode() if isinstance(v, bytes) else str(v)
+            for v in np.atleast_1d(values)]
+
+def _mesh_filter(file, tally):
+    """ Return the mesh ID of a tally with a single mesh filter, or None """
+
+    filter_ids = np.atleast_1d(_read(tally, 'filters', []))
+    if len(filter_ids) != 1:
+        return None
+    filt = file['tallies/filters'].get(f'filter {filter_ids[0]}')
+    if filt is None or _decode(_read(filt, 'type'))[0] != 'mesh':
+        return None
+    return int(np.atleast_1d(_read(filt, 'bins'))[0])
+
+def list_mesh_tallies(filename):
+    """ List the overlayable tallies of a statepoint file
+
+    Returns
+    -------
+    tallies : list of (int, int, str)
+        Tally ID, results column and a description of the score and
+        nuclide of every column of tallies with a single mesh filter
+    """
+
+    if h5py is None:
+        raise ImportError('h5py is required to read statepoint files')
+
+    tallies = []
+    with h5py.File(filename, 'r') as file:
+        for name, tally in file['tallies'].items():
+            if not name.startswith('tally ') or \
+                _mesh_filter(file, tally) is None:
+                continue
+            id = int(name.split()[1])
+            scores = _decode(_read(tally, 'score_bins', []))
+            nuclides = _decode(_read(tally, 'nuclides', ['total']))
+            for i, nuclide in enumerate(nuclides):
+                for j, score in enumerate(scores):
+                    column = i * len(scores) + j
+                    tallies.append((id, column, f'{score} ({nuclide})'))
+    return tallies
+
+class MeshTallyOverlay():
+    """ Regular mesh tally from a statepoint file drawn over the geometry
+
+    The results dataset is never loaded whole. Contiguous, uncompressed
+    datasets are memory-mapped, others are read through h5py, and only the
+    mesh bins in the plane of the current view are read.
+
+    Parameters
+    ----------
+    filename : str
+        Path to an OpenMC statepoint HDF5 file
+    tally_id : int
+        ID of a tally with a single mesh filter
+    column : int
+        Column of the tally results (nuclide/score combination) to show
+    label : str
+        Description used for the colorbar
+
+    Attributes
+    ----------
+    dimension, lower_left, width : NumPy arrays (3,)
+        Number of mesh cells, lower-left corner and mesh cell width along
+        each model axis
+    cmap : str
+        Name of the matplotlib colormap of the overlay
+    log : bool
+        Indication of whether the overlay uses a logarithmic scale
+    interpolation : {'nearest', 'linear'}
+        Resampling of mesh cells onto the plot raster
+    hideZeros : bool
+        Indication of whether bins with no score are left transparent
+    valueRange : 2-tuple of float
+        Colormap limits of the last blended slice
+    """
+
+    def __init__(self, filename, tally_id, column=0, label=''):
+        if h5py is None:
+            raise ImportError('h5py is required to read statepoint files')
+
+        self.filename = filename
+        self.tally_id = tally_id
+        self.column = column
+        self.label = label or f'Tally {tally_id}'
+
+        self.file = h5py.File(filename, 'r')
+        tally = self.file[f'tallies/tally {tally_id}']
+        mesh_id = _mesh_filter(self.file, tally)
+        if mesh_id is None:
+            raise ValueError(f'Tally {tally_id} does not have a single '
+                             'mesh filter')
+
+        mesh = self.file[f'tallies/meshes/mesh {mesh_id}']
+        dimension = np.atleast_1d(_read(mesh, 'dimension')).astype(int)
+        lower_left = np.atleast_1d(_read(mesh, 'lower_left')).astype(float)
+        width = _read(mesh, 'width')
+        if width is None:
+            upper_right = np.atleast_1d(_read(mesh, 'upper_right'))
+            width = (upper_right - lower_left) / dimension
+        width = np.atleast_1d(width).astype(float)
+
+        # pad 1D/2D meshes to infinite extent along missing axes
+        n = len(dimension)
+        self.dimension = np.concatenate((dimension, np.ones(3 - n, int)))
+        self.lower_left = np.concatenate((lower_left, np.full(3 - n, -1e300)))
+        self.width = np.concatenate((width, np.full(3 - n, 2e300)))
+        # mesh bins are ordered with x varying fastest
+        self.strides = np.array([1, self.dimension[0],
+                                 self.dimension[0] * self.dimension[1]])
+
+        self.n_realizations = max(int(_read(tally, 'n_realizations', 1)), 1)
+        self.results = self._openResults(tally['results'])
+
+        self.cmap = 'inferno'
+        self.log = False
+        self.interpolation = 'nearest'
+        self.hideZeros = True
+        self.valueRange = None
+
+        # slices may be read by several render threads at once
+        self._lock = threading.Lock()
+        self._sliceKey = None
+        self._slice = None
+
+    def _openResults(self, dataset):
+        """ Memory-map the results dataset if possible """
+
+        if dataset.chunks is None and dataset.compression is None:
+            offset = dataset.id.get_offset()
+            if offset is not None:
+                return np.memmap(self.filename, dtype=dataset.dtype, mode='r',
+                                 offset=offset, shape=dataset.shape)
+        return dataset
+
+    def close(self):
+        self.results = None
+        self.file.close()
+
+    def getSlice(self, mapping):
+        """ Read mean values of the mesh bins intersecting a view
+
+        A margin of one bin around the view is read where the mesh has
+        one, so pixels at the edges of the view are interpolated with
+        their neighbors beyond it.
+
+        Returns
+        -------
+        values : NumPy float array (nj, ni) or None
+            Means of the bins in the view plane and its margin, rows along
+            the vertical axis of the view; None if the view misses the mesh
+        start : 2-tuple of int
+            Mesh index of values[0, 0] along the horizontal and vertical
+            view axes
+        """
+
+        xb, yb, zb = mapping.xBasis, mapping.yBasis, mapping.zBasis
+        left, right, bottom, top = mapping.extent
+
+        k = int(np.floor((mapping.origin[zb] - self.lower_left[zb]) /
+                         self.width[zb]))
+        if not 0 <= k < self.dimension[zb]:
+            return None, (0, 0)
+
+        ranges = []
+        for axis, lo, hi in ((xb, left, right), (yb, bottom, top)):
+            first = np.floor((lo - self.lower_left[axis]) / self.width[axis])
+            last = np.floor((hi - self.lower_left[axis]) / self.width[axis])
+            if last < 0 or first >= self.dimension[axis]:
+                return None, (0, 0)
+            ranges.append((int(max(first - 1, 0)),
+                           int(min(last + 1, self.dimension[axis] - 1))))
+        (i0, i1), (j0, j1) = ranges
+
+        key = (xb, yb, k, i0, i1, j0, j1, self.column)
+        with self._lock:
+            if key != self._sliceKey:
+                values = np.empty((j1 - j0 + 1, i1 - i0 + 1))
+                step = int(self.strides[xb])
+                for row, j in enumerate(range(j0, j1 + 1)):
+                    start = int(i0 * step + j * self.strides[yb] +
+                                k * self.strides[zb])
+                    stop = start + (i1 - i0) * step + 1
+                    values[row] = self.results[start:stop:step, self.column, 0]
+                self._slice = values / self.n_realizations
+                self._sliceKey = key
+            return self._slice, (i0, j0)
+
+    def resample(self, mapping):
+        """ Resample the tally onto the pixels of a view
+
+        Returns
+        -------
+        values : NumPy float array (v_res, h_res) or None
+            Tally mean at each pixel
+        valid : NumPy bool array (v_res, h_res)
+            Pixels covered by the mesh
+        """
+
+        values, (i0, j0) = self.getSlice(mapping)
+        if values is None:
+            return None, None
+
+        xb, yb = mapping.xBasis, mapping.yBasis
+        x, y = mapping.pixelCenters()
+        # continuous mesh coordinates relative to the slice read
+        fx = (x - self.lower_left[xb]) / self.width[xb] - i0
+        fy = (y - self.lower_left[yb]) / self.width[yb] - j0
+        nj, ni = values.shape
+        valid = ((fx >= 0) & (fx < ni))[None, :] & \
+            ((fy >= 0) & (fy < nj))[:, None]
+
+        if self.interpolation == 'linear':
+            # bilinear between mesh cell centers, clamped to the outer cell
+            # centers of the mesh
+            fx = np.clip(fx - 0.5, -i0, self.dimension[xb] - 1 - i0)
+            fy = np.clip(fy - 0.5, -j0, self.dimension[yb] - 1 - j0)
+            ix = np.clip(np.floor(fx).astype(int), 0, max(ni - 2, 0))
+            iy = np.clip(np.floor(fy).astype(int), 0, max(nj - 2, 0))
+            tx = np.clip(fx - ix, 0, 1)[None, :]
+            ty = np.clip(fy - iy, 0, 1)[:, None]
+            ix1 = np.minimum(ix + 1, ni - 1)
+            iy1 = np.minimum(iy + 1, nj - 1)
+            top = values[iy][:, ix] * (1 - tx) + values[iy][:, ix1] * tx
+            bottom = values[iy1][:, ix] * (1 - tx) + values[iy1][:, ix1] * tx
+            resampled = top * (1 - ty) + bottom * ty
+        else:
+            ix = np.clip(fx.astype(int), 0, ni - 1)
+            iy = np.clip(fy.astype(int), 0, nj - 1)
+            resampled = values[iy[:, None], ix[None, :]]
+
+        valid &= np.isfinite(resampled)
+        if self.hideZeros:
+            valid &= resampled != 0
+        if self.log:
+            valid &= resampled > 0
+        return resampled, valid
+
+    def blend(self, image, mapping, alpha, limits=None):
+        """ Blend the tally under a geometry image
+
+        Parameters
+        ----------
+        image : NumPy uint8 array (v_res, h_res, 3)
+            Colorized geometry image
+        mapping : ViewMapping instance
+            Mapping of the geometry image
+        alpha : float
+            Opacity of the geometry over the tally
+        limits : 2-tuple of float, optional
+            Colormap limits; defaults to the range of the resampled values,
+            which is stored as valueRange
+
+        Returns
+        -------
+        image : NumPy uint8 array (v_res, h_res, 3)
+        """
+
+        values, valid = self.resample(mapping)
+        if values is None or not valid.any():
+            if limits is None:
+                self.valueRange = None
+            return image
+
+        if limits is None:
+            limits = (float(values[valid].min()), float(values[valid].max()))
+            self.valueRange = limits
+        vmin, vmax = limits
+        overlay = apply_lut(values[valid], colormap_lut(self.cmap),
+                            vmin, vmax, self.log)
+
+        blended = image.copy()
+        blended[valid] = np.round(alpha * image[valid] +
+                                  (1. - alpha) * overlay).astype(np.uint8)
+        return blended
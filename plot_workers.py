@@ -0,0 +1,545 @@
+import itertools, multiprocessing, os, queue, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from plot_codec import EncodedArray, encode_array
+from plot_shm import arena, write_block
+
+# bytes per pixel of the blocks of maps before a worker returned one: three
+# int32 ids, and temperature and density as float64
+_PIXEL_BYTES = {'id_map': 12, 'property_map': 16}
+
+def trace_view(key, overlaps=False):
+    """ Build an openmc.capi plot from trace settings
+
+    Parameters
+    ----------
+    key : tuple
+        (origin, width, height, basis, h_res, v_res, level), as returned by
+        PlotView.getTraceKey
+    overlaps : bool
+        Whether overlapping cells are flagged in id maps, if the OpenMC
+        build supports it
+
+    Returns
+    -------
+    view : openmc.capi.plot._PlotBase instance
+    """
+
+    from openmc.capi import plot as capi_plot
+
+    origin, width, height, basis, h_res, v_res, level = key
+    view = capi_plot._PlotBase()
+    view.origin = origin
+    view.width = width
+    view.height = height
+    view.basis = basis
+    view.h_res = h_res
+    view.v_res = v_res
+    view.level = level
+    if overlaps and hasattr(type(view), 'color_overlaps'):
+        view.color_overlaps = True
+    return view
+
+def _scan(view, ignoreExterior=True):
+    from openmc.capi import plot as capi_plot
+    from plot_scan import defect_pixels
+    return defect_pixels(capi_plot.id_map(view), ignoreExterior)
+
+def _serve(directory, connection):
+    """ Render requests of a RenderWorker in a model directory """
+
+    try:
+        os.chdir(directory)
+        import openmc.capi
+        openmc.capi.init(['-c'])
+    except Exception as e:
+        connection.send(('error', f'{type(e).__name__}: {e}'))
+        return
+    connection.send(('ok', None))
+
+    try:
+        while True:
+            try:
+                request = connection.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+
+            kind, key, options = request
+            try:
+                if kind == 'ping':
+                    result = None
+                elif kind == 'scan':
+                    result = _scan(trace_view(key, overlaps=True), **options)
+                else:
+                    result = getattr(openmc.capi.plot, kind)(trace_view(key))
+                    block = options.get('block')
+                    if block is not None and result.nbytes <= block[1]:
+                        write_block(block[0], result)
+                        result = (result.shape, result.dtype.str)
+                    else:
+                        # maps are run-length encoded, which shrinks them
+                        # far more than it costs to encode them
+                        result = encode_array(result, compression=None)
+                connection.send(('ok', result))
+            except Exception as e:
+                connection.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        openmc.capi.finalize()
+
+class WorkerLost(RuntimeError):
+    """ Raised when a render worker exits or hangs during a request """
+
+class RenderWorker():
+    """ Process tracing plots of a model with its own openmc.capi session
+
+    openmc.capi holds one model per process, so every model besides the
+    one loaded by the application is traced in a worker. Workers are
+    spawned rather than forked, so they never inherit the session of the
+    parent process. Requests carry only the trace settings of a view.
+    Maps are written by the worker into a block of plot_shm.arena and
+    returned as arrays viewing it, or sent back through the pipe in the
+    run-length encoding of plot_codec if shared is False.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with the model .xml files
+    timeout : float, optional
+        Seconds to wait for the result of a request before the worker is
+        considered hung and terminated; waits indefinitely if not given
+    shared : bool
+        Whether maps are returned in shared memory
+
+    Raises
+    ------
+    RuntimeError
+        If OpenMC fails to initialize the model
+    """
+
+    def __init__(self, directory, timeout=None, shared=True):
+        self.directory = os.path.abspath(directory)
+        self.timeout = timeout
+        self.shared = shared
+        self._pixelBytes = dict(_PIXEL_BYTES)
+
+        context = multiprocessing.get_context('spawn')
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve,
+                                       args=(self.directory, child),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+
+        try:
+            status, message = self._receive()
+        except WorkerLost as e:
+            status, message = 'error', str(e)
+        if status != 'ok':
+            self.process.join()
+            raise RuntimeError(f'{self.directory}: {message}')
+
+    def _receive(self):
+        try:
+            return self.connection.recv()
+        except EOFError:
+            raise WorkerLost('render worker exited unexpectedly')
+
+    def _request(self, kind, key, timeout=None, **options):
+        try:
+            self.connection.send((kind, key, options))
+        except OSError:
+            raise WorkerLost('render worker exited unexpectedly')
+
+        timeout = timeout or self.timeout
+        if timeout is not None and not self.connection.poll(timeout):
+            # a hung worker would answer this request in place of the next
+            self.process.terminate()
+            self.process.join(5)
+            raise WorkerLost(f'{self.directory}: render worker did not '
+                             f'respond within {timeout:g} s')
+        status, result = self._receive()
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+    def _traceMap(self, kind, key):
+        if not self.shared:
+            return self._request(kind, key).decode()
+
+        h_res, v_res = key[4], key[5]
+        pixels = max(h_res * v_res, 1)
+        block = arena.acquire(pixels * self._pixelBytes[kind])
+        try:
+            result = self._request(kind, key, block=(block.name, block.size))
+            if isinstance(result, EncodedArray):
+                # larger than expected; the next block will fit
+                array = result.decode()
+            else:
+                array = arena.wrap(block, *result)
+        finally:
+            arena.release(block)
+        self._pixelBytes[kind] = array.nbytes // pixels
+        return array
+
+    def idMap(self, key):
+        """ Trace the id map of a view given its trace settings """
+        return self._traceMap('id_map', key)
+
+    def propertyMap(self, key):
+        """ Trace the property map of a view given its trace settings """
+        return self._traceMap('property_map', key)
+
+    def scan(self, key, ignoreExterior=True):
+        """ Return flat indices of the undefined and overlapping pixels of
+        a view, found by plot_scan.defect_pixels in the worker """
+        return self._request('scan', key, ignoreExterior=ignoreExterior)
+
+    def isAlive(self):
+        return self.process.is_alive()
+
+    def memoryBytes(self):
+        """ Return the memory held by the worker process alone, its
+        resident pages less those shared with other processes, or 0 if
+        unknown """
+
+        try:
+            with open(f'/proc/{self.process.pid}/statm') as file:
+                resident, shared = map(int, file.read().split()[1:3])
+            return (resident - shared) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return 0
+
+    def ping(self, timeout=10.):
+        """ Check that the worker answers requests within timeout
+
+        Raises
+        ------
+        WorkerLost
+            If the worker exited or hung; hung workers are terminated
+        """
+        self._request('ping', None, timeout)
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.connection.close()
+
+class _Job():
+    __slots__ = ('method', 'key', 'options', 'future')
+
+    def __init__(self, method, key, options):
+        self.method = method
+        self.key = key
+        self.options = options
+        self.future = Future()
+
+class _Slot():
+    """ A worker of a pool and its statistics """
+
+    def __init__(self, index):
+        self.index = index
+        self.worker = None
+        self.started = time.perf_counter()
+        self.jobs = 0
+        self.failures = 0
+        self.restarts = 0
+        self.busy = 0.
+        self.running = False
+
+class WorkerPool():
+    """ RenderWorker processes of one model, started ahead of use
+
+    Every worker loads the model once, when the pool is created, and then
+    takes jobs from a shared priority queue. Workers that exit or stop
+    responding are restarted, and the job they were running is retried on
+    the new worker. Idle workers are checked with a ping every
+    checkInterval seconds, so lost workers are replaced before the next
+    job needs them. resize starts or stops workers without touching the
+    others.
+
+    The pool has the idMap and propertyMap methods of a PlotModel tracer.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with the model .xml files
+    n_workers : int, optional
+        Number of worker processes; defaults to the number of CPUs
+    timeout : float
+        Seconds a job may run before its worker is considered hung
+    retries : int
+        Number of times a job is retried after its worker was lost
+    checkInterval : float
+        Seconds between health checks of idle workers
+    shared : bool
+        Whether maps are returned in shared memory
+
+    Raises
+    ------
+    RuntimeError
+        If OpenMC fails to initialize the model
+    """
+
+    def __init__(self, directory, n_workers=None, timeout=600., retries=1,
+                 checkInterval=30., shared=True):
+        self.directory = os.path.abspath(directory)
+        self.n_workers = max(1, n_workers or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.retries = retries
+        self.checkInterval = checkInterval
+        self.shared = shared
+
+        self._queue = queue.PriorityQueue()
+        self._serials = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._indices = itertools.count()
+        self.slots = []
+        self._threads = []
+        self._addWorkers(self.n_workers)
+
+    def _addWorkers(self, count):
+        slots = [_Slot(next(self._indices)) for _ in range(count)]
+        # workers load the model concurrently
+        with ThreadPoolExecutor(count) as pool:
+            futures = [pool.submit(RenderWorker, self.directory,
+                                   self.timeout, self.shared)
+                       for _ in slots]
+        try:
+            for slot, future in zip(slots, futures):
+                slot.worker = future.result()
+        except Exception:
+            for future in futures:
+                if future.exception() is None:
+                    future.result().close()
+            raise
+
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                for slot in slots:
+                    thread = threading.Thread(target=self._run,
+                                              args=(slot,), daemon=True)
+                    self.slots.append(slot)
+                    self._threads.append(thread)
+                    thread.start()
+        if closed:
+            for slot in slots:
+                self._discard(slot)
+            raise RuntimeError('The worker pool is closed')
+
+    def resize(self, n_workers):
+        """ Start or stop workers to keep n_workers, leaving the running
+        ones with their loaded models; workers are stopped once their job
+        is done
+
+        Parameters
+        ----------
+        n_workers : int, optional
+            Number of worker processes; defaults to the number of CPUs
+
+        Raises
+        ------
+        RuntimeError
+            If OpenMC fails to initialize the model in a new worker
+        """
+
+        n_workers = max(1, n_workers or os.cpu_count() or 1)
+        change = n_workers - self.n_workers
+        if change > 0:
+            self._addWorkers(change)
+        else:
+            with self._lock:
+                # ahead of every job, so the next free workers take them
+                for _ in range(-change):
+                    self._queue.put((float('-inf'), next(self._serials),
+                                     None))
+        self.n_workers = n_workers
+
+    def submit(self, method, key, priority=0, **options):
+        """ Queue a job for the next free worker
+
+        Parameters
+        ----------
+        method : {'idMap', 'propertyMap', 'scan'}
+            RenderWorker method run by the job
+        key : tuple
+            Trace settings of the view, as from PlotView.getTraceKey
+        priority : int
+            Jobs of higher priority are started first, and jobs of equal
+            priority in the order they were submitted
+        options
+            Keyword arguments of the method
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Result of the job
+        """
+
+        job = _Job(method, key, options)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The worker pool is closed')
+            self._queue.put((-priority, next(self._serials), job))
+        return job.future
+
+    def idMap(self, key, priority=0):
+        """ Trace the id map of a view given its trace settings """
+        return self.submit('idMap', key, priority).result()
+
+    def propertyMap(self, key, priority=0):
+        """ Trace the property map of a view given its trace settings """
+        return self.submit('propertyMap', key, priority).result()
+
+    def _run(self, slot):
+        while True:
+            try:
+                priority, _, job = self._queue.get(
+                    timeout=self.checkInterval)
+            except queue.Empty:
+                self._check(slot)
+                continue
+            if job is None:
+                if priority < 0:
+                    self._retire(slot)
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            self._finish(slot, job)
+            # the future of the job holds its map, and with it a shared
+            # memory block, until the caller drops it
+            del job
+
+    def _finish(self, slot, job):
+        slot.running = True
+        try:
+            result = self._execute(slot, job)
+        except BaseException as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            slot.running = False
+
+    def _execute(self, slot, job):
+        for attempt in range(self.retries + 1):
+            if slot.worker is None:
+                self._restart(slot)
+
+            start = time.perf_counter()
+            try:
+                return getattr(slot.worker, job.method)(job.key,
+                                                        **job.options)
+            except WorkerLost:
+                slot.failures += 1
+                self._discard(slot)
+                if attempt == self.retries:
+                    raise
+            finally:
+                slot.jobs += 1
+                slot.busy += time.perf_counter() - start
+
+    def _retire(self, slot):
+        """ Remove the worker of the calling thread, as asked by resize """
+
+        with self._lock:
+            self.slots.remove(slot)
+            self._threads.remove(threading.current_thread())
+        self._discard(slot)
+
+    def _check(self, slot):
+        try:
+            if slot.worker is None:
+                self._restart(slot)
+            else:
+                slot.worker.ping()
+        except RuntimeError:
+            slot.failures += 1
+            self._discard(slot)
+
+    def _discard(self, slot):
+        if slot.worker is not None:
+            slot.worker.close()
+            slot.worker = None
+
+    def _restart(self, slot):
+        self._discard(slot)
+        slot.worker = RenderWorker(self.directory, self.timeout,
+                                   self.shared)
+        slot.restarts += 1
+
+    def getStats(self):
+        """ Return the state and utilization of every worker
+
+        Returns
+        -------
+        stats : list of dict
+            Process id, whether the process is alive, number of jobs run,
+            failures and restarts, seconds spent on jobs, and the fraction
+            of time spent on jobs since the worker slot was started, for
+            every worker
+        """
+
+        now = time.perf_counter()
+        stats = []
+        for slot in self.slots:
+            worker = slot.worker
+            stats.append({'pid': worker.process.pid if worker else None,
+                          'alive': worker is not None and worker.isAlive(),
+                          'jobs': slot.jobs,
+                          'failures': slot.failures,
+                          'restarts': slot.restarts,
+                          'busy': slot.busy,
+                          'utilization': slot.busy / max(now - slot.started,
+                                                         1e-9)})
+        return stats
+
+    def pending(self):
+        """ Return the number of queued jobs """
+        return self._queue.qsize()
+
+    def isIdle(self):
+        """ Return whether no job is queued or running """
+        return not self.pending() and \
+            not any(slot.running for slot in self.slots)
+
+    def memoryBytes(self):
+        """ Return the memory held by the worker processes, as measured by
+        RenderWorker.memoryBytes """
+        workers = [slot.worker for slot in self.slots]
+        return sum(worker.memoryBytes() for worker in workers
+                   if worker is not None)
+
+    def close(self):
+        """ Cancel queued jobs, wait for running ones and shut the workers
+        down, finalizing their openmc.capi sessions """
+
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    _, _, job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    job.future.cancel()
+            threads = list(self._threads)
+            for _ in threads:
+                self._queue.put((float('inf'), next(self._serials), None))
+
+        for thread in threads:
+            thread.join()
+        for slot in self.slots:
+            self._discard(slot)
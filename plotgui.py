@@ -1,18 +1,23 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
+import code, contextlib, io, os
+import numpy as np
 from PySide2 import QtCore, QtGui
 from PySide2.QtWidgets import (QWidget, QPushButton, QHBoxLayout, QVBoxLayout,
     QApplication, QGroupBox, QFormLayout, QLabel, QLineEdit, QComboBox,
     QSpinBox, QDoubleSpinBox, QSizePolicy, QSpacerItem, QMainWindow,
     QCheckBox, QRubberBand, QMenu, QAction, QMenuBar, QFileDialog, QDialog,
     QTabWidget, QGridLayout, QToolButton, QColorDialog, QFrame, QDockWidget,
-    QTableView, QItemDelegate, QHeaderView, QSlider)
+    QTableView, QItemDelegate, QHeaderView, QSlider, QListWidget,
+    QTableWidget, QTableWidgetItem, QPlainTextEdit)
 from plotmodel import DomainDelegate
 
 from matplotlib.backends.qt_compat import is_pyqt5
 from matplotlib.figure import Figure
 from matplotlib import image as mpimage
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize, LogNorm
 
 if is_pyqt5():
     from matplotlib.backends.backend_qt5agg import (
@@ -22,7 +27,13 @@ else:
         FigureCanvas, NavigationToolbar2QT as NavigationToolbar)
 
 from plot_colors import rgb_normalize
-from plotmodel import _NOT_FOUND_
+from plotmodel import (_NOT_FOUND_, COLOR_DOMAINS, DOMAIN_KINDS, PROPERTIES,
+    PROPERTY_UNITS, ViewMapping)
+from plot_panes import BASIS_AXES, SlicePanes
+from plot_query import DomainIndex, QueryError, QUERY_SYNTAX
+from plot_profiler import profiler
+from plot_scan import KIND_NAMES
+from plot_memory import RANK_NAMES, format_bytes
 
 class PlotImage(FigureCanvas):
 
@@ -42,24 +53,43 @@ class PlotImage(FigureCanvas):
 
         self.rubber_band = QRubberBand(QRubberBand.Rectangle, self)
         self.band_origin = QtCore.QPoint()
+        self.band_pixel_origin = None
         self.x_plot_origin = None
         self.y_plot_origin = None
 
         self.menu = QMenu(self)
 
+        # Widget to image pixel transform of the displayed view, cached on redraw
+        self.mapping = None
+        self.pixelTransform = None
+        self.mpl_connect('draw_event', lambda event: self.updateTransforms())
+
+        # Mouse moves are coalesced so at most one is handled per frame
+        self.pendingMove = None
+        self.moveTimer = QtCore.QTimer(self)
+        self.moveTimer.setSingleShot(True)
+        self.moveTimer.setInterval(16)
+        self.moveTimer.timeout.connect(self.flushMouseMove)
+
     def enterEvent(self, event):
         self.setCursor(QtCore.Qt.CrossCursor)
         self.mw.coord_label.show()
+        self.mw.requestProperties()
 
     def leaveEvent(self, event):
+        self.moveTimer.stop()
+        self.pendingMove = None
         self.mw.coord_label.hide()
         self.mw.statusBar().showMessage("")
 
     def mousePressEvent(self, event):
+        if self.pixelTransform is None:
+            return
         self.mw.coord_label.hide()
 
         # Set rubber band absolute and relative position
         self.band_origin = event.pos()
+        self.band_pixel_origin = self.getPixelCoords(event.pos())
         self.x_plot_origin, self.y_plot_origin = self.getPlotCoords(event.pos())
 
         # Create rubber band
@@ -67,69 +97,84 @@ class PlotImage(FigureCanvas):
 
         FigureCanvas.mousePressEvent(self, event)
 
-    def getPlotCoords(self, pos):
+    def updateTransforms(self):
+        """ Cache the affine transform from widget positions to image pixels
 
-        cv = self.model.currentView
+        Called on every redraw, so mouse handling needs no matplotlib
+        transform calls. Combined with the model's ViewMapping this maps
+        widget positions to model coordinates.
+        """
+
+        if not self.figure.axes:
+            return
+
+        self.mapping = self.model.mapping
+        x0, y0, width, height = self.ax.get_window_extent().bounds
+
+        # display pixels per widget pixel (device pixel ratio)
+        ratio = self.figure.bbox.width / max(self.width(), 1)
+        # distance of the axes top from the top of the figure
+        top = self.figure.bbox.height - (y0 + height)
 
-        # get the normalized axis coordinates from the event display units
-        xPlotCoord, yPlotCoord = self.ax.transAxes.inverted().transform((pos.x(), pos.y()))
-        # flip the y-axis (its zero is in the upper left)
-        yPlotCoord = 1 - yPlotCoord
+        sx = ratio * self.mapping.h_res / width
+        sy = ratio * self.mapping.v_res / height
+        self.pixelTransform = (sx, -x0 * sx / ratio, sy, -top * sy / ratio)
 
-        # scale axes using the plot extents
-        xPlotCoord = self.ax.dataLim.x0 + xPlotCoord * self.ax.dataLim.width
-        yPlotCoord = self.ax.dataLim.y0 + yPlotCoord * self.ax.dataLim.height
+    def getPixelCoords(self, pos):
+        """ Return the continuous image pixel position of a widget position """
 
-        # set coordinate label if pointer is in the axes
-        if self.ax.contains_point((pos.x(), pos.y())):
+        sx, ox, sy, oy = self.pixelTransform
+        return (pos.x() * sx + ox, pos.y() * sy + oy)
+
+    def inImage(self, pos):
+        col, row = self.getPixelCoords(pos)
+        return 0 <= col < self.mapping.h_res and 0 <= row < self.mapping.v_res
+
+    def getPlotCoords(self, pos):
+
+        col, row = self.getPixelCoords(pos)
+        xPlotCoord, yPlotCoord = self.mapping.pixelToPlane(col, row)
+
+        # set coordinate label if pointer is in the image
+        if self.inImage(pos):
             self.mw.coord_label.show()
-            self.mw.showCoords(xPlotCoord, yPlotCoord)
+            self.mw.showCoords(self.mapping.planeToWorld(xPlotCoord, yPlotCoord))
         else:
             self.mw.coord_label.hide()
 
-        return (xPlotCoord, yPlotCoord)
+        return (float(xPlotCoord), float(yPlotCoord))
 
-    def getIDinfo(self, event):
+    def getIDinfo(self, pos):
 
-        cv = self.model.currentView
+        xPos, yPos, inside = self.mapping.pixelIndex(*self.getPixelCoords(pos))
 
-        # get origin in axes coordinates
-        x0, y0 = self.ax.transAxes.transform((0.,0.))
-
-        # get the extents of the axes box in axes coordinates
-        bbox = self.ax.get_window_extent().transformed(
-            self.figure.dpi_scale_trans.inverted())
-        # get dimensions and scale using dpi
-        width, height = bbox.width, bbox.height
-        width *= self.figure.dpi
-        height *= self.figure.dpi
-
-        # use factor to get proper x,y position in pixels
-        factor = (width/cv.h_res, height/cv.v_res)
-        xPos = int((event.pos().x()-x0 + 0.05) / factor[0])
-        yPos = int((event.pos().y()-y0 + 0.05) / factor[1])
-
-        # check that the position is in the axes view
-        if yPos < self.model.currentView.v_res \
-            and xPos < self.model.currentView.h_res:
+        # check that the position is in the image
+        if inside:
             id = f"{self.model.ids[yPos][xPos]}"
-            temp = f"{self.model.props[yPos][xPos][0]:g}"
-            density = f"{self.model.props[yPos][xPos][1]:g}"
+            # the property map is traced in the background on first hover
+            props = self.model.props
+            if props is None:
+                self.mw.requestProperties()
+                temp = density = '--'
+            else:
+                temp = f"{props[yPos][xPos][0]:g}"
+                density = f"{props[yPos][xPos][1]:g}"
         else:
             id = '-1'
             density = '-1'
             temp = '-1'
 
-        if self.model.currentView.colorby == 'cell':
-            domain = self.model.activeView.cells
-            domain_kind = 'Cell'
-        else:
-            domain = self.model.activeView.materials
-            domain_kind = 'Material'
+        colorby = self.model.currentView.colorby
+        domain = self.model.activeView.getColorDomains(colorby)
+        domain_kind = COLOR_DOMAINS[colorby]
 
         properties = {'density' : density,
                       'temperature' : temp}
 
+        if inside and colorby == 'instance' \
+            and self.model.instances is not None:
+            properties['instance'] = f"{self.model.instances[yPos][xPos]}"
+
         return id, properties, domain, domain_kind
 
     def mouseDoubleClickEvent(self, event):
@@ -141,12 +186,29 @@ class PlotImage(FigureCanvas):
 
     def mouseMoveEvent(self, event):
 
+        self.pendingMove = (QtCore.QPoint(event.pos()), event.buttons(),
+                            event.modifiers())
+
+        # Handle a move at once when idle; otherwise the timer handles the
+        # latest move at the end of the interval
+        if not self.moveTimer.isActive():
+            self.flushMouseMove()
+
+    def flushMouseMove(self):
+
+        if self.pendingMove is None or self.pixelTransform is None:
+            return
+        pos, buttons, modifiers = self.pendingMove
+        self.pendingMove = None
+        # at most one move per timer interval, timed from this one
+        self.moveTimer.start()
+
         # Show Cursor position relative to plot in status bar
-        xPlotPos, yPlotPos = self.getPlotCoords(event.pos())
+        xPlotPos, yPlotPos = self.getPlotCoords(pos)
 
         # Show Cell/Material ID, Name in status bar
-        id, properties, domain, domain_kind = self.getIDinfo(event)
-        if self.ax.contains_point((event.pos().x(), event.pos().y())):
+        id, properties, domain, domain_kind = self.getIDinfo(pos)
+        if self.inImage(pos):
 
             if id != str(_NOT_FOUND_) and domain[id].name:
                 domainInfo = (f"{domain_kind} {id}: \"{domain[id].name}\"\t "
@@ -159,15 +221,18 @@ class PlotImage(FigureCanvas):
 
             else:
                 domainInfo = ""
+
+            if domainInfo and 'instance' in properties:
+                domainInfo += f"\tInstance: {properties['instance']}"
         else:
             domainInfo = ""
 
         self.mw.statusBar().showMessage(f" {domainInfo}")
 
         # Update rubber band and values if mouse button held down
-        if event.buttons() == QtCore.Qt.LeftButton:
+        if buttons == QtCore.Qt.LeftButton:
             self.rubber_band.setGeometry(
-                QtCore.QRect(self.band_origin, event.pos()).normalized())
+                QtCore.QRect(self.band_origin, pos).normalized())
 
             # Show rubber band if both dimensions > 10 pixels
             if self.rubber_band.width() > 10 and self.rubber_band.height() > 10:
@@ -178,26 +243,27 @@ class PlotImage(FigureCanvas):
             # Update plot X Origin
             xCenter = (self.x_plot_origin + xPlotPos) / 2
             yCenter = (self.y_plot_origin + yPlotPos) / 2
-            self.mw.editPlotOrigin(xCenter, yCenter)
-
-            modifiers = event.modifiers()
 
             # Zoom out if Shift held
             if modifiers == QtCore.Qt.ShiftModifier:
                 cv = self.model.currentView
-                bandwidth = abs(self.band_origin.x() - event.pos().x())
+                col, row = self.getPixelCoords(pos)
+                bandwidth = abs(self.band_pixel_origin[0] - col)
                 width = cv.width * (cv.h_res / max(bandwidth, .001))
-                bandheight = abs(self.band_origin.y() - event.pos().y())
+                bandheight = abs(self.band_pixel_origin[1] - row)
                 height = cv.height * (cv.v_res / max(bandheight, .001))
             else: # Zoom in
                 width = max(abs(self.x_plot_origin - xPlotPos), 0.1)
                 height = max(abs(self.y_plot_origin - yPlotPos), 0.1)
 
-            self.mw.editWidth(width)
-            self.mw.editHeight(height)
+            self.mw.editPlotExtents(xCenter, yCenter, width, height)
 
     def mouseReleaseEvent(self, event):
 
+        # Apply the last coalesced move before acting on the selection
+        self.moveTimer.stop()
+        self.flushMouseMove()
+
         if self.rubber_band.isVisible():
             self.rubber_band.hide()
             self.mw.applyChanges()
@@ -219,7 +285,7 @@ class PlotImage(FigureCanvas):
         self.mw.undoAction.setText(f'&Undo ({len(self.model.previousViews)})')
         self.mw.redoAction.setText(f'&Redo ({len(self.model.subsequentViews)})')
 
-        id, properties, domain, domain_kind = self.getIDinfo(event)
+        id, properties, domain, domain_kind = self.getIDinfo(event.pos())
 
         if id != '-1':
 
@@ -295,6 +361,7 @@ class PlotImage(FigureCanvas):
 
         self.menu.exec_(event.globalPos())
 
+    @profiler.timed('setPixmap')
     def setPixmap(self, w, h):
 
         # clear out figure
@@ -307,26 +374,47 @@ class PlotImage(FigureCanvas):
         # set figure width
         self.figure.set_figwidth(0.99 * w / self.figure.get_dpi())
         self.figure.set_figheight(0.99 * h / self.figure.get_dpi())
-        # set data extents for automatic reporting of pointer location
-        data_bounds = [cv.origin[self.mw.xBasis] - cv.width/2.,
-                    cv.origin[self.mw.xBasis] + cv.width/2.,
-                    cv.origin[self.mw.yBasis] - cv.height/2.,
-                    cv.origin[self.mw.yBasis] + cv.height/2.]
 
         # make sure we have an image to load
         if not hasattr(self.model,'image'):
             self.model.generatePlot()
+
+        # set data extents for automatic reporting of pointer location
+        data_bounds = self.model.mapping.extent
+        # a tally overlay is already blended using the plot alpha
+        overlay = self.model.tallyOverlay
+        alpha = 1.0 if overlay is not None else cv.plotAlpha
         c = self.figure.subplots().imshow(self.model.image,
                                           extent=data_bounds,
-                                          alpha=cv.plotAlpha)
+                                          alpha=alpha)
         self.ax = self.figure.axes[0]
         self.ax.margins(0.0, 0.0)
+        if cv.colorby in PROPERTIES:
+            label = f"{cv.colorby.capitalize()} ({PROPERTY_UNITS[cv.colorby]})"
+            self.addColorbar(self.model.propertyRange, cv.propertyLog,
+                             cv.propertyCmap, label)
+        if overlay is not None and overlay.valueRange is not None:
+            self.addColorbar(overlay.valueRange, overlay.log, overlay.cmap,
+                             overlay.label)
         self.figure.set_tight_layout({'pad': 1.0})
         # set axis labels
         axis_label_str = "{} (cm)"
         self.ax.set_xlabel(axis_label_str.format(cv.basis[0]))
         self.ax.set_ylabel(axis_label_str.format(cv.basis[1]))
-        self.draw()
+        with profiler.timer('draw'):
+            self.draw()
+
+    def addColorbar(self, valueRange, log, cmap, label):
+        vmin, vmax = valueRange
+        if log:
+            tiny = np.finfo(float).tiny
+            norm = LogNorm(max(vmin, tiny), max(vmax, tiny))
+        else:
+            norm = Normalize(vmin, vmax)
+        mappable = ScalarMappable(norm=norm, cmap=cmap)
+        mappable.set_array([])
+        colorbar = self.figure.colorbar(mappable, ax=self.ax)
+        colorbar.set_label(label)
 
 class OptionsDock(QDockWidget):
     def __init__(self, model, FM, parent=None):
@@ -428,10 +516,17 @@ class OptionsDock(QDockWidget):
 
         # ColorBy
         self.colorbyBox = QComboBox(self)
-        self.colorbyBox.addItem("material")
-        self.colorbyBox.addItem("cell")
+        for colorby in COLOR_DOMAINS:
+            self.colorbyBox.addItem(colorby)
         self.colorbyBox.currentTextChanged[str].connect(self.mw.editColorBy)
 
+        # Universe level
+        self.levelBox = QSpinBox(self)
+        self.levelBox.setRange(-1, 99)
+        self.levelBox.setSpecialValueText('Deepest')
+        self.levelBox.setToolTip('Universe level at which cells are traced')
+        self.levelBox.valueChanged.connect(self.mw.editLevel)
+
         # Alpha
         self.plotAlphaBox = QDoubleSpinBox(self)
         self.plotAlphaBox.setValue(self.model.activeView.plotAlpha)
@@ -458,6 +553,7 @@ class OptionsDock(QDockWidget):
         self.opLayout.addRow('Height:', self.heightBox)
         self.opLayout.addRow('Basis:', self.basisBox)
         self.opLayout.addRow('Color By:', self.colorbyBox)
+        self.opLayout.addRow('Level:', self.levelBox)
         self.opLayout.addRow('Plot alpha:', self.plotAlphaBox)
         self.opLayout.addRow(self.colorOptionsButton)
         self.opLayout.setLabelAlignment(QtCore.Qt.AlignLeft)
@@ -505,6 +601,7 @@ class OptionsDock(QDockWidget):
         self.updateWidth()
         self.updateHeight()
         self.updateColorBy()
+        self.updateLevel()
         self.updatePlotAlpha()
         self.updateBasis()
         self.updateAspectLock()
@@ -525,6 +622,9 @@ class OptionsDock(QDockWidget):
     def updateColorBy(self):
         self.colorbyBox.setCurrentText(self.model.activeView.colorby)
 
+    def updateLevel(self):
+        self.levelBox.setValue(self.model.activeView.level)
+
     def updatePlotAlpha(self):
         self.plotAlphaBox.setValue(self.model.activeView.plotAlpha)
 
@@ -547,6 +647,25 @@ class OptionsDock(QDockWidget):
     def updateVRes(self):
         self.vResBox.setValue(self.model.activeView.v_res)
 
+    def updateExtents(self):
+        """ Update origin, size and resolution boxes in one batch
+
+        Signals are blocked so the boxes don't feed each value back into
+        the active view while it is being changed interactively.
+        """
+
+        boxes = (self.xOrBox, self.yOrBox, self.zOrBox, self.widthBox,
+                 self.heightBox, self.vResBox)
+        blocked = [box.blockSignals(True) for box in boxes]
+
+        self.updateOrigin()
+        self.updateWidth()
+        self.updateHeight()
+        self.updateVRes()
+
+        for box, state in zip(boxes, blocked):
+            box.blockSignals(state)
+
     def revertToCurrent(self):
         cv = self.model.currentView
 
@@ -587,8 +706,15 @@ class ColorDialog(QDialog):
 
         self.cellTable = self.createDomainTable(self.mw.cellsModel)
         self.matTable = self.createDomainTable(self.mw.materialsModel)
-        self.cellTab = self.createDomainTab(self.cellTable)
-        self.matTab = self.createDomainTab(self.matTable)
+        self.univTable = self.createDomainTable(self.mw.universesModel)
+        self.domainTables = (self.cellTable, self.matTable, self.univTable)
+        self.domainIndexes = {}
+        self.filterBoxes = {}
+        self.filterLabels = {}
+        self.matches = {}
+        self.cellTab = self.createDomainTab(self.cellTable, 'Cell')
+        self.matTab = self.createDomainTab(self.matTable, 'Material')
+        self.univTab = self.createDomainTab(self.univTable, 'Universe')
 
         self.tabs = QTabWidget()
         self.tabs.setMaximumHeight(800)
@@ -596,6 +722,9 @@ class ColorDialog(QDialog):
         self.tabs.addTab(self.generalTab, 'General')
         self.tabs.addTab(self.cellTab, 'Cells')
         self.tabs.addTab(self.matTab, 'Materials')
+        self.tabs.addTab(self.univTab, 'Universes')
+        for kind in self.filterBoxes:
+            self.filterDomains(kind)
 
         self.createButtonBox()
 
@@ -644,10 +773,52 @@ class ColorDialog(QDialog):
         self.bgButton.clicked.connect(self.mw.editBackgroundColor)
 
         self.colorbyBox = QComboBox(self)
-        self.colorbyBox.addItem("material")
-        self.colorbyBox.addItem("cell")
+        for colorby in COLOR_DOMAINS:
+            self.colorbyBox.addItem(colorby)
         self.colorbyBox.currentTextChanged[str].connect(self.mw.editColorBy)
 
+        # Outline options
+        self.outlineCheck = QCheckBox('')
+        self.outlineCheck.stateChanged.connect(self.mw.toggleOutlines)
+
+        self.outlineColorButton = QPushButton()
+        self.outlineColorButton.setCursor(QtCore.Qt.PointingHandCursor)
+        self.outlineColorButton.setFixedWidth(self.FM.width("XXXXXXXXXX"))
+        self.outlineColorButton.setFixedHeight(self.FM.height() * 1.5)
+        self.outlineColorButton.clicked.connect(self.mw.editOutlineColor)
+
+        self.outlineWidthBox = QSpinBox()
+        self.outlineWidthBox.setRange(1, 10)
+        self.outlineWidthBox.setSuffix(' px')
+        self.outlineWidthBox.valueChanged.connect(self.mw.editOutlineWidth)
+
+        self.neighborCheck = QCheckBox('')
+        self.neighborCheck.stateChanged.connect(self.mw.toggleNeighborColors)
+
+        # Property heatmap options
+        self.cmapBox = QComboBox(self)
+        for cmap in ('viridis', 'plasma', 'inferno', 'magma', 'cividis',
+                     'coolwarm', 'jet'):
+            self.cmapBox.addItem(cmap)
+        self.cmapBox.currentTextChanged[str].connect(self.mw.editColormap)
+
+        self.logCheck = QCheckBox('')
+        self.logCheck.stateChanged.connect(self.mw.togglePropertyLog)
+
+        self.autoLimitsCheck = QCheckBox('')
+        self.autoLimitsCheck.stateChanged.connect(
+            self.mw.togglePropertyAutoLimits)
+
+        self.minBox = QDoubleSpinBox()
+        self.minBox.setDecimals(4)
+        self.minBox.setRange(-1e9, 1e9)
+        self.minBox.valueChanged.connect(self.mw.editPropertyMin)
+
+        self.maxBox = QDoubleSpinBox()
+        self.maxBox.setDecimals(4)
+        self.maxBox.setRange(-1e9, 1e9)
+        self.maxBox.valueChanged.connect(self.mw.editPropertyMax)
+
         formLayout = QFormLayout()
         formLayout.setAlignment(QtCore.Qt.AlignHCenter)
         formLayout.setFormAlignment(QtCore.Qt.AlignHCenter)
@@ -662,8 +833,19 @@ class ColorDialog(QDialog):
         formLayout.addRow('Highlight Alpha:', self.alphaBox)
         formLayout.addRow('Highlight Seed:', self.seedBox)
         formLayout.addRow(HorizontalLine())
+        formLayout.addRow('Outlines:', self.outlineCheck)
+        formLayout.addRow('Outline Color:', self.outlineColorButton)
+        formLayout.addRow('Outline Width:', self.outlineWidthBox)
+        formLayout.addRow(HorizontalLine())
         formLayout.addRow('Background Color:          ', self.bgButton)
         formLayout.addRow('Color Plot By:', self.colorbyBox)
+        formLayout.addRow('Distinct Neighbors:', self.neighborCheck)
+        formLayout.addRow(HorizontalLine())
+        formLayout.addRow('Property Colormap:', self.cmapBox)
+        formLayout.addRow('Log Scale:', self.logCheck)
+        formLayout.addRow('Auto Limits:', self.autoLimitsCheck)
+        formLayout.addRow('Minimum:', self.minBox)
+        formLayout.addRow('Maximum:', self.maxBox)
 
         generalLayout = QHBoxLayout()
         innerWidget = QWidget()
@@ -688,16 +870,87 @@ class ColorDialog(QDialog):
 
         return domainTable
 
-    def createDomainTab(self, domaintable):
+    def createDomainTab(self, domaintable, kind):
 
         domainTab = QWidget()
         domainTab.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         domainLayout = QVBoxLayout()
+        domainLayout.addLayout(self.createFilterBar(kind))
         domainLayout.addWidget(domaintable)
         domainTab.setLayout(domainLayout)
 
         return domainTab
 
+    def createFilterBar(self, kind):
+
+        filterBox = QLineEdit()
+        filterBox.setPlaceholderText('Filter, e.g. 1-500 name:fuel '
+                                     'material:3 visible !masked')
+        filterBox.setToolTip(QUERY_SYNTAX)
+        filterBox.setClearButtonEnabled(True)
+        filterBox.textChanged.connect(lambda text: self.filterDomains(kind))
+        self.filterBoxes[kind] = filterBox
+
+        filterLabel = QLabel()
+        self.filterLabels[kind] = filterLabel
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addWidget(filterLabel)
+        buttonLayout.addStretch(1)
+        for text, slot in (('Mask', lambda: self.mw.maskDomains(
+                               kind, self.matches[kind], True)),
+                           ('Unmask', lambda: self.mw.maskDomains(
+                               kind, self.matches[kind], False)),
+                           ('Highlight', lambda: self.mw.highlightDomains(
+                               kind, self.matches[kind], True)),
+                           ('Unhighlight', lambda: self.mw.highlightDomains(
+                               kind, self.matches[kind], False)),
+                           ('Color...', lambda: self.mw.colorDomains(
+                               kind, self.matches[kind]))):
+            button = QPushButton(text)
+            button.setToolTip(f'{text.rstrip(".")} all matching '
+                              f'{DOMAIN_KINDS[kind]}')
+            button.clicked.connect(slot)
+            buttonLayout.addWidget(button)
+
+        filterLayout = QVBoxLayout()
+        filterLayout.addWidget(filterBox)
+        filterLayout.addLayout(buttonLayout)
+        return filterLayout
+
+    def getDomainIndex(self, kind):
+        domains = getattr(self.model.activeView, DOMAIN_KINDS[kind])
+        index = self.domainIndexes.get(kind)
+        if index is None or index.domains is not domains:
+            index = DomainIndex(kind, domains, self.model)
+            self.domainIndexes[kind] = index
+        return index
+
+    def filterDomains(self, kind):
+        """ Show the domains matching the filter of a domain tab """
+
+        index = self.getDomainIndex(kind)
+        tableModel = self.domainTableModels()[kind]
+        label = self.filterLabels[kind]
+        try:
+            with profiler.timer('domain filter'):
+                mask = index.evaluate(self.filterBoxes[kind].text())
+        except QueryError as e:
+            label.setStyleSheet('color: red')
+            label.setText(str(e))
+            self.matches[kind] = []
+            tableModel.setFilter(np.zeros(len(index.ids), dtype=bool))
+            return
+
+        self.matches[kind] = index.ids[mask].tolist()
+        label.setStyleSheet('')
+        label.setText(f'{mask.sum()} of {len(mask)} match')
+        tableModel.setFilter(None if mask.all() else mask)
+
+    def domainTableModels(self):
+        return {'Cell': self.mw.cellsModel, 'Material': self.mw.materialsModel,
+                'Universe': self.mw.universesModel}
+
     def createButtonBox(self):
 
         applyButton = QPushButton("Apply Changes")
@@ -722,7 +975,12 @@ class ColorDialog(QDialog):
         self.updateAlpha()
         self.updateSeed()
         self.updateBackgroundColor()
+        self.updateOutlines()
+        self.updateOutlineColor()
+        self.updateOutlineWidth()
         self.updateColorBy()
+        self.updateNeighborColors()
+        self.updatePropertyOptions()
 
         self.updateDomainTabs()
 
@@ -732,12 +990,8 @@ class ColorDialog(QDialog):
         self.maskingCheck.setChecked(masking)
         self.maskColorButton.setDisabled(not masking)
 
-        if masking:
-            self.cellTable.showColumn(4)
-            self.matTable.showColumn(4)
-        else:
-            self.cellTable.hideColumn(4)
-            self.matTable.hideColumn(4)
+        for table in self.domainTables:
+            table.setColumnHidden(4, not masking)
 
     def updateMaskingColor(self):
         color = self.model.activeView.maskBackground
@@ -752,20 +1006,10 @@ class ColorDialog(QDialog):
         self.alphaBox.setDisabled(not highlighting)
         self.seedBox.setDisabled(not highlighting)
 
-        if highlighting:
-            self.cellTable.showColumn(5)
-            self.cellTable.hideColumn(2)
-            self.cellTable.hideColumn(3)
-            self.matTable.showColumn(5)
-            self.matTable.hideColumn(2)
-            self.matTable.hideColumn(3)
-        else:
-            self.cellTable.hideColumn(5)
-            self.cellTable.showColumn(2)
-            self.cellTable.showColumn(3)
-            self.matTable.hideColumn(5)
-            self.matTable.showColumn(2)
-            self.matTable.showColumn(3)
+        for table in self.domainTables:
+            table.setColumnHidden(5, not highlighting)
+            table.setColumnHidden(2, highlighting)
+            table.setColumnHidden(3, highlighting)
 
     def updateHighlightColor(self):
         color = self.model.activeView.highlightBackground
@@ -783,13 +1027,738 @@ class ColorDialog(QDialog):
         self.bgButton.setStyleSheet("border-radius: 8px;"
                                     "background-color: rgb%s" % (str(color)))
 
+    def updateOutlines(self):
+        outlines = self.model.activeView.outlines
+
+        self.outlineCheck.setChecked(outlines)
+        self.outlineColorButton.setDisabled(not outlines)
+        self.outlineWidthBox.setDisabled(not outlines)
+
+    def updateOutlineColor(self):
+        color = self.model.activeView.outlineColor
+        self.outlineColorButton.setStyleSheet("border-radius: 8px;"
+                                    "background-color: rgb%s" % (str(color)))
+
+    def updateOutlineWidth(self):
+        self.outlineWidthBox.setValue(self.model.activeView.outlineWidth)
+
     def updateColorBy(self):
         self.colorbyBox.setCurrentText(self.model.activeView.colorby)
 
+    def updateNeighborColors(self):
+        self.neighborCheck.setChecked(self.model.activeView.neighborColors)
+
+    def updatePropertyOptions(self):
+        av = self.model.activeView
+        isProperty = av.colorby in PROPERTIES
+        limits = av.propertyLimits.get(av.colorby)
+
+        self.cmapBox.setCurrentText(av.propertyCmap)
+        self.logCheck.setChecked(av.propertyLog)
+        self.autoLimitsCheck.setChecked(limits is None)
+        if limits is not None:
+            self.minBox.setValue(limits[0])
+            self.maxBox.setValue(limits[1])
+
+        for widget in (self.cmapBox, self.logCheck, self.autoLimitsCheck):
+            widget.setDisabled(not isProperty)
+        self.minBox.setDisabled(not isProperty or limits is None)
+        self.maxBox.setDisabled(not isProperty or limits is None)
+
     def updateDomainTabs(self):
         self.cellTable.setModel(self.mw.cellsModel)
         self.matTable.setModel(self.mw.materialsModel)
+        self.univTable.setModel(self.mw.universesModel)
+        for kind in self.filterBoxes:
+            self.filterDomains(kind)
+
+
+class ExportDialog(QDialog):
+    """ Resolution and annotation options of a direct image export """
+
+    def __init__(self, model, parent=None):
+        super(ExportDialog, self).__init__(parent)
 
+        self.setWindowTitle('Export Image')
+
+        self.model = model
+        cv = self.model.currentView
+        self.aspect = cv.v_res / cv.h_res
+
+        self.widthBox = QSpinBox()
+        self.widthBox.setRange(1, 100000)
+        self.widthBox.setSuffix(' px')
+        self.widthBox.setValue(cv.h_res)
+        self.widthBox.valueChanged.connect(self.editWidth)
+
+        self.heightBox = QSpinBox()
+        self.heightBox.setRange(1, 100000)
+        self.heightBox.setSuffix(' px')
+        self.heightBox.setValue(cv.v_res)
+        self.heightBox.valueChanged.connect(self.editHeight)
+
+        self.ratioCheck = QCheckBox('')
+        self.ratioCheck.setChecked(True)
+
+        self.scaleBarCheck = QCheckBox('')
+
+        formLayout = QFormLayout()
+        formLayout.setLabelAlignment(QtCore.Qt.AlignLeft)
+        formLayout.addRow('Width:', self.widthBox)
+        formLayout.addRow('Height:', self.heightBox)
+        formLayout.addRow('Fixed Aspect Ratio:', self.ratioCheck)
+        formLayout.addRow(HorizontalLine())
+        formLayout.addRow('Scale Bar:', self.scaleBarCheck)
+        formLayout.addRow(QLabel('Resolutions other than the current plot '
+                                 'are\nre-traced without changing the view.'))
+
+        exportButton = QPushButton("Export...")
+        exportButton.setDefault(True)
+        exportButton.clicked.connect(self.accept)
+        cancelButton = QPushButton("Cancel")
+        cancelButton.clicked.connect(self.reject)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addStretch(1)
+        buttonLayout.addWidget(exportButton)
+        buttonLayout.addWidget(cancelButton)
+
+        layout = QVBoxLayout()
+        layout.addLayout(formLayout)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+
+    def editWidth(self, value):
+        if self.ratioCheck.isChecked():
+            self.heightBox.blockSignals(True)
+            self.heightBox.setValue(max(int(round(value * self.aspect)), 1))
+            self.heightBox.blockSignals(False)
+
+    def editHeight(self, value):
+        if self.ratioCheck.isChecked():
+            self.widthBox.blockSignals(True)
+            self.widthBox.setValue(max(int(round(value / self.aspect)), 1))
+            self.widthBox.blockSignals(False)
+
+    def getResolution(self):
+        return self.widthBox.value(), self.heightBox.value()
+
+
+class AnimationDialog(QDialog):
+    """ Keyframe path and frame options of an animation export """
+
+    def __init__(self, model, parent=None):
+        super(AnimationDialog, self).__init__(parent)
+
+        self.setWindowTitle('Export Animation')
+
+        self.model = model
+        self.mw = parent
+        self.keyframes = []
+
+        self.keyframeList = QListWidget()
+
+        addButton = QPushButton("Add Current View")
+        addButton.setToolTip('Add the origin, width and height of the '
+                             'current plot as the next keyframe')
+        addButton.clicked.connect(self.addKeyframe)
+        removeButton = QPushButton("Remove")
+        removeButton.clicked.connect(self.removeKeyframe)
+        clearButton = QPushButton("Clear")
+        clearButton.clicked.connect(self.clearKeyframes)
+
+        keyLayout = QHBoxLayout()
+        keyLayout.addWidget(addButton)
+        keyLayout.addWidget(removeButton)
+        keyLayout.addWidget(clearButton)
+
+        self.framesBox = QSpinBox()
+        self.framesBox.setRange(1, 100000)
+        self.framesBox.setValue(120)
+
+        self.fpsBox = QSpinBox()
+        self.fpsBox.setRange(1, 240)
+        self.fpsBox.setValue(24)
+        self.fpsBox.setSuffix(' fps')
+
+        formLayout = QFormLayout()
+        formLayout.setLabelAlignment(QtCore.Qt.AlignLeft)
+        formLayout.addRow('Frames:', self.framesBox)
+        formLayout.addRow('Frame Rate:', self.fpsBox)
+
+        renderButton = QPushButton("Render...")
+        renderButton.clicked.connect(self.render)
+        closeButton = QPushButton("Close")
+        closeButton.clicked.connect(self.hide)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addStretch(1)
+        buttonLayout.addWidget(renderButton)
+        buttonLayout.addWidget(closeButton)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel('Keyframes:'))
+        layout.addWidget(self.keyframeList)
+        layout.addLayout(keyLayout)
+        layout.addLayout(formLayout)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+
+    def addKeyframe(self):
+        cv = self.model.currentView
+        origin = tuple(float(x) for x in cv.origin)
+        self.keyframes.append((origin, float(cv.width), float(cv.height)))
+        self.keyframeList.addItem(
+            f"Origin ({origin[0]:g}, {origin[1]:g}, {origin[2]:g}), "
+            f"{cv.width:g} x {cv.height:g}")
+
+    def removeKeyframe(self):
+        row = self.keyframeList.currentRow()
+        if row >= 0:
+            self.keyframeList.takeItem(row)
+            del self.keyframes[row]
+
+    def clearKeyframes(self):
+        self.keyframeList.clear()
+        self.keyframes = []
+
+    def render(self):
+        self.mw.renderAnimation(list(self.keyframes), self.framesBox.value(),
+                                self.fpsBox.value())
+
+
+class CompareDialog(QDialog):
+    """ Summary of the pixels that differ from a compared model """
+
+    def __init__(self, model, parent=None):
+        super(CompareDialog, self).__init__(parent)
+
+        self.setWindowTitle('Model Comparison')
+
+        self.model = model
+        self.mw = parent
+
+        self.summaryLabel = QLabel()
+        self.summaryLabel.setWordWrap(True)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(['Domain', 'Pixels', 'Changed',
+                                              'Changed To (Pixels)'])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        stopButton = QPushButton("Stop Comparing")
+        stopButton.clicked.connect(self.mw.stopComparison)
+        closeButton = QPushButton("Close")
+        closeButton.clicked.connect(self.hide)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addStretch(1)
+        buttonLayout.addWidget(stopButton)
+        buttonLayout.addWidget(closeButton)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.summaryLabel)
+        layout.addWidget(self.table)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+
+    def updateDialog(self, maxRows=500):
+        comparison = self.model.comparison
+        if comparison is None or comparison.changed is None:
+            self.summaryLabel.setText('No comparison')
+            self.table.setRowCount(0)
+            return
+
+        changed = comparison.changed
+        n_changed = int(changed.sum())
+        self.summaryLabel.setText(
+            f"{comparison.directory}: {n_changed} of {changed.size} pixels "
+            f"differ ({100. * n_changed / changed.size:.3f} %) by "
+            f"{comparison.kind.lower()}")
+
+        changes = comparison.changes[:maxRows]
+        self.table.setRowCount(len(changes))
+        for row, (id, total, count, targets) in enumerate(changes):
+            name = 'Void' if id == _NOT_FOUND_ else f'{comparison.kind} {id}'
+            became = ', '.join('Void' if n == _NOT_FOUND_ else f'{n} ({c})'
+                               for n, c in targets[:5])
+            for column, text in enumerate((name, str(total), str(count),
+                                           became)):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+
+class ScanDialog(QDialog):
+    """ Slice stack scan for undefined regions and overlaps """
+
+    def __init__(self, model, parent=None):
+        super(ScanDialog, self).__init__(parent)
+
+        self.setWindowTitle('Scan For Undefined Regions And Overlaps')
+
+        self.model = model
+        self.mw = parent
+        self.report = None
+
+        self.basisBox = QComboBox(self)
+        for basis in ('xy', 'xz', 'yz'):
+            self.basisBox.addItem(basis)
+
+        self.slicesBox = QSpinBox()
+        self.slicesBox.setRange(1, 100000)
+        self.slicesBox.setValue(100)
+
+        self.resBox = QSpinBox()
+        self.resBox.setRange(10, 100000)
+        self.resBox.setValue(1000)
+        self.resBox.setSuffix(' px')
+
+        self.workersBox = QSpinBox()
+        self.workersBox.setRange(1, 1024)
+        self.workersBox.setValue(os.cpu_count() or 1)
+
+        self.exteriorCheck = QCheckBox('')
+        self.exteriorCheck.setChecked(True)
+        self.exteriorCheck.setToolTip('Leave out undefined regions touching '
+                                      'the edge of a slice')
+
+        self.boxLabel = QLabel()
+
+        formLayout = QFormLayout()
+        formLayout.setLabelAlignment(QtCore.Qt.AlignLeft)
+        formLayout.addRow('Scanned Box:', self.boxLabel)
+        formLayout.addRow('Slice Basis:', self.basisBox)
+        formLayout.addRow('Slices:', self.slicesBox)
+        formLayout.addRow('Resolution:', self.resBox)
+        formLayout.addRow('Worker Processes:', self.workersBox)
+        formLayout.addRow('Ignore Exterior:', self.exteriorCheck)
+
+        self.summaryLabel = QLabel()
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(['Kind', 'Pixels', 'Center',
+                                              'Lower Left', 'Upper Right'])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setToolTip('Click a result to center the plot on it')
+        self.table.cellClicked.connect(self.jumpToCluster)
+
+        scanButton = QPushButton("Scan")
+        scanButton.clicked.connect(self.scan)
+        self.saveButton = QPushButton("Save Report...")
+        self.saveButton.clicked.connect(self.saveReport)
+        self.saveButton.setDisabled(True)
+        closeButton = QPushButton("Close")
+        closeButton.clicked.connect(self.hide)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addStretch(1)
+        buttonLayout.addWidget(scanButton)
+        buttonLayout.addWidget(self.saveButton)
+        buttonLayout.addWidget(closeButton)
+
+        layout = QVBoxLayout()
+        layout.addLayout(formLayout)
+        layout.addWidget(self.summaryLabel)
+        layout.addWidget(self.table)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+
+    def getBox(self):
+        """ Return the bounding box of the geometry, or of the default view
+        if the geometry is unbounded """
+
+        lower_left, upper_right = self.model.geom.bounding_box
+        if np.isfinite(lower_left).all() and np.isfinite(upper_right).all():
+            return np.asarray(lower_left), np.asarray(upper_right)
+
+        dv = self.model.defaultView
+        half = np.array([dv.width, dv.height, max(dv.width, dv.height)]) / 2.
+        return np.asarray(dv.origin) - half, np.asarray(dv.origin) + half
+
+    def updateDialog(self):
+        lower_left, upper_right = self.getBox()
+        self.boxLabel.setText(
+            '({:g}, {:g}, {:g}) to ({:g}, {:g}, {:g})'.format(
+                *lower_left.tolist(), *upper_right.tolist()))
+        self.basisBox.setCurrentText(self.model.currentView.basis)
+
+    def scan(self):
+        lower_left, upper_right = self.getBox()
+        self.mw.scanModel(lower_left, upper_right, self.basisBox.currentText(),
+                          self.slicesBox.value(), self.resBox.value(),
+                          self.workersBox.value(),
+                          self.exteriorCheck.isChecked())
+
+    def setReport(self, report):
+        self.report = report
+        self.saveButton.setDisabled(report is None)
+
+        clusters = report.clusters if report is not None else []
+        counts = {kind: sum(c.size for c in clusters if c.kind == kind)
+                  for kind in KIND_NAMES}
+        self.summaryLabel.setText(', '.join(
+            f'{counts[kind]} {name.lower()} pixels' for kind, name
+            in KIND_NAMES.items()) + f' in {len(clusters)} clusters')
+
+        fmt = '({:.4g}, {:.4g}, {:.4g})'.format
+        self.table.setRowCount(len(clusters))
+        for row, cluster in enumerate(clusters):
+            for column, text in enumerate((KIND_NAMES[cluster.kind],
+                                           str(cluster.size),
+                                           fmt(*cluster.center),
+                                           fmt(*cluster.lower),
+                                           fmt(*cluster.upper))):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+    def jumpToCluster(self, row, column):
+        cluster = self.report.clusters[row]
+        origin, width, height, basis, h_res, v_res, level = self.report.keys[0]
+
+        # frame the cluster with some margin, at least 50 scan pixels wide
+        xb = 0 if basis[0] == 'x' else 1
+        yb = 1 if basis[1] == 'y' else 2
+        extent = (cluster.upper - cluster.lower)[[xb, yb]].max()
+        size = max(4. * float(extent), 50. * width / h_res)
+        self.mw.jumpToPoint(cluster.center, basis, size)
+
+    def saveReport(self):
+        filename, ext = QFileDialog.getSaveFileName(self, "Save Scan Report",
+                                            "scan_report", "NumPy (*.npz)")
+        if filename:
+            self.report.save(filename)
+
+
+class MemoryDialog(QDialog):
+    """ Memory held by each subsystem against the memory budget, refreshed
+    every second while shown """
+
+    def __init__(self, memory, parent=None):
+        super(MemoryDialog, self).__init__(parent)
+
+        self.setWindowTitle('Memory Usage')
+
+        self.memory = memory
+        self.mw = parent
+
+        self.summaryLabel = QLabel()
+
+        self.budgetBox = QSpinBox()
+        self.budgetBox.setRange(64, 2**31 - 1)
+        self.budgetBox.setSingleStep(1024)
+        self.budgetBox.setSuffix(' MB')
+        self.budgetBox.setToolTip('Caches, then the oldest undo views, are '
+                                  'freed to stay within the budget')
+        self.budgetBox.editingFinished.connect(
+            lambda: self.mw.setMemoryBudget(self.budgetBox.value()))
+
+        formLayout = QFormLayout()
+        formLayout.setLabelAlignment(QtCore.Qt.AlignLeft)
+        formLayout.addRow('Budget:', self.budgetBox)
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(['Subsystem', 'Size', 'Freed',
+                                              'Freed As'])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        freeButton = QPushButton("Free Caches")
+        freeButton.setToolTip('Free the prefetch and render caches')
+        freeButton.clicked.connect(self.mw.freeCaches)
+        closeButton = QPushButton("Close")
+        closeButton.clicked.connect(self.hide)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addStretch(1)
+        buttonLayout.addWidget(freeButton)
+        buttonLayout.addWidget(closeButton)
+
+        layout = QVBoxLayout()
+        layout.addLayout(formLayout)
+        layout.addWidget(self.summaryLabel)
+        layout.addWidget(self.table)
+        layout.addLayout(buttonLayout)
+        self.setLayout(layout)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.updateDialog)
+
+    def updateDialog(self):
+        usage = self.memory.getUsage()
+        total = sum(sub['bytes'] for sub in usage)
+        budget = self.memory.budget
+        self.summaryLabel.setText(f'{format_bytes(total)} of '
+                                  f'{format_bytes(budget)} '
+                                  f'({100. * total / budget:.1f} %)')
+        if not self.budgetBox.hasFocus():
+            self.budgetBox.setValue(budget // 2**20)
+
+        self.table.setRowCount(len(usage))
+        for row, sub in enumerate(usage):
+            for column, text in enumerate((
+                    sub['name'], format_bytes(sub['bytes']),
+                    format_bytes(sub['evicted']),
+                    RANK_NAMES.get(sub['rank'], 'Never freed'))):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+    def showEvent(self, event):
+        self.updateDialog()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        self.timer.stop()
+
+class SlicePaneCanvas(FigureCanvas):
+    """ Image of one slice pane with a crosshair linked across panes """
+
+    def __init__(self, dock, basis):
+        super(SlicePaneCanvas, self).__init__(Figure())
+
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setMinimumSize(120, 120)
+
+        self.dock = dock
+        self.basis = basis
+
+        self.ax = self.figure.add_axes([0, 0, 1, 1])
+        self.ax.set_axis_off()
+        self.artist = None
+        self.hLine = self.ax.axhline(0., color='w', linewidth=0.8)
+        self.vLine = self.ax.axvline(0., color='w', linewidth=0.8)
+        self.ax.text(0.02, 0.98, basis, color='w', va='top',
+                     transform=self.ax.transAxes)
+
+        self.mpl_connect('motion_notify_event', self.onMotion)
+        self.mpl_connect('axes_leave_event',
+                         lambda event: self.dock.hoverPoint(None))
+        self.mpl_connect('button_press_event', self.onPress)
+        self.mpl_connect('scroll_event', self.onScroll)
+
+    def setImage(self, image, extent):
+        if self.artist is None:
+            self.artist = self.ax.imshow(image, extent=extent)
+        else:
+            self.artist.set_data(image)
+            self.artist.set_extent(extent)
+        self.ax.set_xlim(extent[0], extent[1])
+        self.ax.set_ylim(extent[2], extent[3])
+        self.draw_idle()
+
+    def setCrosshair(self, x, y):
+        self.vLine.set_xdata([x, x])
+        self.hLine.set_ydata([y, y])
+        self.draw_idle()
+
+    def onMotion(self, event):
+        if event.inaxes is self.ax:
+            self.dock.hoverPoint(self.dock.panePoint(self.basis, event.xdata,
+                                                     event.ydata))
+
+    def onPress(self, event):
+        if event.inaxes is self.ax and event.button == 1:
+            self.dock.selectPoint(self.dock.panePoint(self.basis, event.xdata,
+                                                      event.ydata))
+
+    def onScroll(self, event):
+        if event.inaxes is self.ax:
+            factor = 0.8 if event.button == 'up' else 1.25
+            self.dock.zoomPane(self.basis, factor, event.xdata, event.ydata)
+
+class PanesDock(QDockWidget):
+    """ Dock of synchronized xy, xz and yz slices through the plot origin
+
+    Panes are rendered concurrently by plot_panes.SlicePanes, and images
+    are handed to the GUI thread by the rendered signal. Hovering over a
+    pane moves the crosshair of every pane to the same point, and clicking
+    a pane moves the origin of the plot there.
+    """
+
+    rendered = QtCore.Signal(str)
+    failed = QtCore.Signal(str, str)
+
+    def __init__(self, model, parent=None):
+        super(PanesDock, self).__init__(parent)
+
+        self.setWindowTitle('Slice Panes')
+
+        self.model = model
+        self.mw = parent
+        self.panes = None
+        self.overlay = None
+
+        self.setAllowedAreas(QtCore.Qt.LeftDockWidgetArea |
+                             QtCore.Qt.RightDockWidgetArea |
+                             QtCore.Qt.BottomDockWidgetArea)
+
+        self.canvases = {}
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        for basis in BASIS_AXES:
+            self.canvases[basis] = SlicePaneCanvas(self, basis)
+            layout.addWidget(self.canvases[basis])
+
+        widget = QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+
+        self.rendered.connect(self.showPane)
+        self.failed.connect(lambda name, message:
+            self.mw.statusBar().showMessage(f'{name} pane: {message}', 5000))
+
+    def updatePanes(self, force=False):
+        """ Re-render the panes whose slice changed since the last update """
+
+        if not self.isVisible():
+            return
+        if self.panes is None:
+            self.panes = SlicePanes(self.model, self.rendered.emit,
+                                    onError=lambda name, e:
+                                        self.failed.emit(name, str(e)))
+            # panes are traced in the application until the workers start
+            self.mw.startWorkers()
+
+        # overlays are not part of the view, so a new one recolors all panes
+        if self.model.tallyOverlay is not self.overlay:
+            self.overlay = self.model.tallyOverlay
+            force = True
+        self.panes.update(self.model.currentView.origin, force)
+
+    def showPane(self, name):
+        pane = self.panes.panes[name]
+        canvas = self.canvases[name]
+        with profiler.timer('draw pane'):
+            canvas.setImage(pane.image, ViewMapping(pane.view).extent)
+            canvas.setCrosshair(*pane.worldToPlane(self.panes.origin))
+
+    def panePoint(self, basis, x, y):
+        return self.panes.panes[basis].planeToWorld(x, y, self.panes.origin)
+
+    def hoverPoint(self, point):
+        """ Move the crosshair of every pane to a model point, or back to
+        the origin if point is None """
+
+        if self.panes is None:
+            return
+        if point is None:
+            point = self.panes.origin
+            self.mw.coord_label.hide()
+        else:
+            self.mw.showCoords(point)
+            self.mw.coord_label.show()
+        for basis, canvas in self.canvases.items():
+            canvas.setCrosshair(*self.panes.panes[basis].worldToPlane(point))
+
+    def selectPoint(self, point):
+        self.mw.editPlotOrigin(*point, apply=True)
+
+    def zoomPane(self, basis, factor, x, y):
+        self.panes.panes[basis].zoom(factor, x, y)
+        self.panes.update()
+
+    def showEvent(self, event):
+        self.updatePanes()
+
+    def getBufferBytes(self):
+        return 0 if self.panes is None else self.panes.getBufferBytes()
+
+    def clearBuffers(self, nbytes=None):
+        return 0 if self.panes is None else self.panes.clearBuffers()
+
+    def shutdown(self):
+        if self.panes is not None:
+            self.panes.close()
+
+class ConsoleInput(QLineEdit):
+    """ Console input line with command history """
+
+    def __init__(self, parent=None):
+        super(ConsoleInput, self).__init__(parent)
+        self.history = []
+        self.position = 0
+
+    def addHistory(self, line):
+        if line and (not self.history or self.history[-1] != line):
+            self.history.append(line)
+        self.position = len(self.history)
+
+    def keyPressEvent(self, event):
+        if event.key() == QtCore.Qt.Key_Up and self.position > 0:
+            self.position -= 1
+            self.setText(self.history[self.position])
+        elif event.key() == QtCore.Qt.Key_Down and \
+                self.position < len(self.history):
+            self.position += 1
+            self.setText(self.history[self.position]
+                         if self.position < len(self.history) else '')
+        else:
+            super(ConsoleInput, self).keyPressEvent(event)
+
+class ConsoleDock(QDockWidget):
+    """ Python console for scripting the plot
+
+    Commands run in the GUI thread with the given namespace, which holds
+    the plot_api.PlotController of the application as plot, so scripted
+    changes update the plot and the dock like changes made in the GUI.
+    """
+
+    def __init__(self, namespace, parent=None):
+        super(ConsoleDock, self).__init__(parent)
+
+        self.setWindowTitle('Console')
+        self.mw = parent
+        self.interpreter = code.InteractiveConsole(namespace)
+
+        self.setAllowedAreas(QtCore.Qt.BottomDockWidgetArea |
+                             QtCore.Qt.RightDockWidgetArea |
+                             QtCore.Qt.LeftDockWidgetArea)
+
+        self.output = QPlainTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setFont(QtGui.QFontDatabase.systemFont(
+            QtGui.QFontDatabase.FixedFont))
+        self.output.appendPlainText("plot: PlotController, model: PlotModel, "
+                                    "np: numpy; help(plot) for commands")
+
+        self.prompt = QLabel('>>>')
+        self.input = ConsoleInput()
+        self.input.setFont(self.output.font())
+        self.input.returnPressed.connect(self.runLine)
+
+        inputLayout = QHBoxLayout()
+        inputLayout.addWidget(self.prompt)
+        inputLayout.addWidget(self.input)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.output)
+        layout.addLayout(inputLayout)
+
+        widget = QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+
+    def runLine(self):
+        line = self.input.text()
+        self.input.clear()
+        self.input.addHistory(line)
+        self.output.appendPlainText(f'{self.prompt.text()} {line}')
+
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream), \
+                contextlib.redirect_stderr(stream):
+            more = self.interpreter.push(line)
+        text = stream.getvalue().rstrip('\n')
+        if text:
+            self.output.appendPlainText(text)
+        self.prompt.setText('...' if more else '>>>')
 
 class HorizontalLine(QFrame):
     def __init__(self):
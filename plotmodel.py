@@ -1,4 +1,4 @@
-import copy, struct, threading, openmc
+import copy, struct, threading, hashlib, pickle, openmc
 import openmc.capi.plot as capi_plot
 from openmc.capi.plot import _PlotBase
 import numpy as np
@@ -7,12 +7,101 @@ from ast import literal_eval
 from PySide2.QtWidgets import QTableView, QItemDelegate, QColorDialog, QLineEdit
 from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt, QSize, QEvent
 from PySide2.QtGui import QColor
-from plot_colors import random_rgb
+from plot_colors import hash_rgb, colormap_lut, apply_lut
+from plot_profiler import profiler
+from plot_palette import NeighborPalette
+from plot_codec import EncodedArray, encode_array
+from plot_scheduler import INTERACTIVE, BATCH
+from plot_memory import array_bytes, view_bytes
 
 ID, NAME, COLOR, COLORLABEL, MASK, HIGHLIGHT = (range(0,6))
 
 _NOT_FOUND_ = -2
 
+# Domain kind shown for each color by mode, and the PlotView attribute
+# holding the domains of each kind
+COLOR_DOMAINS = {'material': 'Material', 'cell': 'Cell', 'instance': 'Cell',
+                 'universe': 'Universe', 'temperature': 'Cell',
+                 'density': 'Material'}
+DOMAIN_KINDS = {'Cell': 'cells', 'Material': 'materials',
+                'Universe': 'universes'}
+DOMAIN_ATTRIBUTES = tuple(DOMAIN_KINDS.values())
+
+BASES = ('xy', 'xz', 'yz')
+
+# PlotView settings that only change how an id map is colored
+APPEARANCE = ('colorby', 'masking', 'maskBackground', 'highlighting',
+              'highlightBackground', 'highlightAlpha', 'highlightSeed',
+              'plotBackground', 'plotAlpha', 'outlines', 'outlineColor',
+              'outlineWidth', 'neighborColors', 'propertyCmap',
+              'propertyLog', 'propertyLimits')
+
+# Color by modes drawn as heatmaps of a property_map channel, with units
+PROPERTIES = {'temperature': 0, 'density': 1}
+PROPERTY_UNITS = {'temperature': 'K', 'density': 'g/cm3'}
+
+_FINGERPRINT_KEY = 'fingerprint'
+
+def model_fingerprint(files=('geometry.xml', 'materials.xml')):
+    """ Return a content fingerprint of the model .xml files
+
+    The files are streamed element by element and only the tags and
+    attributes that define the geometry (cells, surfaces, universes,
+    lattices and materials) are hashed, so the result is independent of
+    whitespace, comments and attribute order.
+
+    Parameters
+    ----------
+    files : iterable of str
+        .xml files from which to compute the fingerprint
+
+    Returns
+    -------
+    fingerprint : str
+        Hexadecimal digest identifying the model
+    """
+
+    digest = hashlib.sha1()
+    for file in files:
+        digest.update(file.encode())
+        for event, elem in ET.iterparse(file):
+            attrs = sorted(elem.attrib.items())
+            digest.update(f"{elem.tag}{attrs}".encode())
+            text = elem.text.strip() if elem.text else ''
+            if text:
+                digest.update(text.encode())
+            # release parsed elements so memory stays flat for large models
+            elem.clear()
+    return digest.hexdigest()
+
+def dump_fingerprinted(filename, fingerprint, payload):
+    """ Pickle payload to file preceded by a small fingerprint header """
+
+    with open(filename, 'wb') as file:
+        pickle.dump({_FINGERPRINT_KEY: fingerprint}, file)
+        pickle.dump(payload, file)
+
+def load_fingerprinted(filename, fingerprint):
+    """ Load a payload written by dump_fingerprinted
+
+    Only the header is unpickled before the compatibility check, so files
+    belonging to another model are rejected without deserializing the
+    payload.
+
+    Returns
+    -------
+    payload : object or None
+        The saved payload, or None if the file was written for a different
+        model (or predates fingerprint headers)
+    """
+
+    with open(filename, 'rb') as file:
+        header = pickle.load(file)
+        if not isinstance(header, dict) or \
+            header.get(_FINGERPRINT_KEY) != fingerprint:
+            return None
+        return pickle.load(file)
+
 class PlotModel():
     """ Geometry and plot settings for OpenMC Plot Explorer model
 
@@ -24,10 +113,42 @@ class PlotModel():
             Dictionary mapping cell IDs to openmc.Cell instances
         modelMaterials : collections.OrderedDict
             Dictionary mapping material IDs to openmc.Material instances
-        ids : NumPy int array (v_res, h_res, 1)
-            Mapping of plot coordinates to cell/material ID by pixel
+        cellUniverses : dict
+            Dictionary mapping cell IDs to the ID of their parent universe
+        idBuffer : NumPy int array (v_res, h_res, n_channels)
+            All channels of the last traced id map (cell, cell instance if
+            available, material), reused for recoloring without re-tracing
+        traceKey : tuple
+            Trace settings of the view that produced idBuffer
+        ids : NumPy int array (v_res, h_res)
+            Mapping of plot coordinates to the ID of the domain kind the
+            current view is colored by
+        instances : NumPy int array (v_res, h_res) or None
+            Distributed cell instance by pixel, if traced by OpenMC
+        props : NumPy float array (v_res, h_res, 2) or None
+            Temperature and density by pixel; only traced when a property
+            is displayed or queried (see getProperties), or ahead of use
+            by the GUI
+        propertyRange : 2-tuple of float
+            Limits of the colormap of the last property heatmap
+        tallyOverlay : plot_tally.MeshTallyOverlay instance or None
+            Mesh tally blended under the geometry image; not saved with
+            the session
+        comparison : plot_compare.ModelComparison instance or None
+            Other model whose differences from this one are highlighted in
+            the image; not saved with the session
         image : NumPy int array (v_res, h_res, 3)
             The current RGB image data
+        regions : NumPy int array (v_res, h_res) or None
+            Palette index of every pixel of domain colored plots; None for
+            property heatmaps
+        regionKeys, regionColors : NumPy arrays
+            Domain key and RGB color of each palette entry
+        neighborPalettes : dict of plot_palette.NeighborPalette instances
+            Neighbor-aware domain colors by (fingerprint, domain kind),
+            accumulated over the views drawn and saved with the session
+        mapping : ViewMapping instance
+            Pixel to model coordinate mapping of the current image
         previousViews : list of PlotView instances
             List of previously created plot view settings used to undo
             changes made in plot explorer
@@ -36,6 +157,26 @@ class PlotModel():
             in plot explorer
         defaultView : PlotView instance
             Default settings for given geometry
+        fingerprint : str
+            Content fingerprint of the model .xml files, used to check
+            compatibility of saved views and sessions
+        tracer : object or None
+            Source of id and property maps in place of the openmc.capi
+            session of this process, with idMap(key) and propertyMap(key)
+            methods taking trace settings, such as a
+            plot_server.RenderClient or plot_workers.WorkerPool; not saved
+            with the session
+        scheduler : plot_scheduler.RenderScheduler instance or None
+            Queue through which traceIds runs traces by priority, if set;
+            not saved with the session
+        workers : plot_workers.WorkerPool instance or None
+            Worker processes tracing the views of renderView, e.g. slice
+            panes and animation frames, in parallel with each other and
+            with the traces of the model, if set; not saved with the
+            session
+        pendingView : PlotView instance or None
+            View being traced to replace the current view, which undo
+            history treats as current
         currentView : PlotView instance
             Currently displayed plot settings in plot explorer
         activeView : PlotView instance
@@ -43,8 +184,18 @@ class PlotModel():
             have unapplied changes
     """
 
-    def __init__(self):
-        """ Initialize PlotModel class attributes """
+    def __init__(self, tracer=None):
+        """ Initialize PlotModel class attributes
+
+        Parameters
+        ----------
+        tracer : object, optional
+            Source of id and property maps; defaults to the openmc.capi
+            session of this process
+        """
+
+        # Fingerprint model files before anything else reads them
+        self.fingerprint = model_fingerprint()
 
         # Read geometry.xml
         self.geom = openmc.Geometry.from_xml('geometry.xml')
@@ -52,9 +203,33 @@ class PlotModel():
         # Retrieve OpenMC Cells/Materials
         self.modelCells = self.geom.get_all_cells()
         self.modelMaterials = self.geom.get_all_materials()
+        self.cellUniverses = {cell_id: univ_id for univ_id, univ
+                              in self.geom.get_all_universes().items()
+                              for cell_id in univ.cells}
+
+        # openmc.capi and worker tracers are not thread-safe; every trace
+        # holds this lock
+        self.traceLock = threading.Lock()
+        self.tracer = tracer
+        self.scheduler = None
+        self.workers = None
+        self.pendingView = None
 
         # Cell/Material ID by coordinates
+        self.idBuffer = None
+        self.traceKey = None
         self.ids = None
+        self.instances = None
+        self.props = None
+        self.propertyRange = None
+        self.tallyOverlay = None
+        self.comparison = None
+        self.outlineKey = None
+        self.outlinePixels = None
+        self.regions = None
+        self.regionKeys = None
+        self.regionColors = None
+        self.neighborPalettes = {}
 
         self.previousViews = []
         self.subsequentViews = []
@@ -62,6 +237,31 @@ class PlotModel():
         self.currentView = copy.deepcopy(self.defaultView)
         self.activeView = copy.deepcopy(self.defaultView)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # open statepoint files and worker processes can't be pickled
+        state['tallyOverlay'] = None
+        state['comparison'] = None
+        state['tracer'] = None
+        state['scheduler'] = None
+        state['workers'] = None
+        state['pendingView'] = None
+        del state['traceLock']
+        # buffers derived from the id map are rebuilt on the next plot, and
+        # the id map itself is stored run-length encoded
+        for name in ('ids', 'instances', 'props', 'image', 'regions',
+                     'outlinePixels', 'outlineKey'):
+            state[name] = None
+        if self.idBuffer is not None:
+            state['idBuffer'] = encode_array(self.idBuffer)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.traceLock = threading.Lock()
+        if isinstance(self.idBuffer, EncodedArray):
+            self.idBuffer = self.idBuffer.decode()
+
     def getDefaultView(self):
         """ Generates default PlotView instance for OpenMC geometry
 
@@ -102,77 +302,659 @@ class PlotModel():
         t.start()
         t.join()
 
-    def makePlot(self):
+    def makePlot(self, view=None, idBuffer=None):
         """ Generate new plot image from active view settings
 
-        Creates corresponding .xml files from user-chosen settings.
-        Runs OpenMC in plot mode to generate new plot image.
+        Runs OpenMC in plot mode to trace the id and property maps, unless
+        only coloring settings changed since the last trace, in which case
+        the cached id buffer is recolored.
+
+        Parameters
+        ----------
+        view : PlotView instance, optional
+            View to plot in place of a copy of the active view; it becomes
+            the current view and supersedes any pending view
+        idBuffer : NumPy int array (v_res, h_res, n_channels), optional
+            Id map of the view, if already traced
         """
 
-        cv = self.currentView = copy.deepcopy(self.activeView)
-        ids = capi_plot.id_map(cv)
-        self.props = capi_plot.property_map(cv)
-        # empty image data
-        image = np.ones((cv.v_res, cv.h_res, 3), dtype = int)
-
-        # set model ids based on domain
-        if cv.colorby == 'cell':
-            self.ids = ids[:,:,0]
-            domain = cv.cells
-            source = self.modelCells
-        else:
-            self.ids = ids[:,:,1]
-            domain = cv.materials
-            source = self.modelMaterials
+        profiler.newFrame()
+        self.pendingView = None
 
-        # generate colors if not present
-        for cell_id, cell in cv.cells.items():
-            if cell.color == None:
-                cell.color = random_rgb()
+        if view is None:
+            view = copy.deepcopy(self.activeView)
+        cv = self.currentView = view
+        self.mapping = ViewMapping(cv)
 
-        for mat_id, mat in cv.materials.items():
-            if mat.color == None:
-                mat.color = random_rgb()
+        key = cv.getTraceKey()
+        if idBuffer is not None:
+            self.idBuffer = idBuffer
+            self.props = None
+            self.traceKey = key
+        elif self.idBuffer is None or key != self.traceKey:
+            self.idBuffer = self.traceIds(cv)
+            self.props = None
+            self.traceKey = key
 
-        unique_ids = np.unique(self.ids)
-        for id in unique_ids:
-            if id == _NOT_FOUND_:
-                image[self.ids == id] = cv.plotBackground
+        self.updateImage()
+
+    def updateImage(self):
+        """ Recolor the current view, blend any tally overlay and highlight
+        differences from a compared model
+
+        Uses the cached id buffer, so this is cheap enough to call after
+        any change that only affects how the current plot is displayed.
+        """
+
+        cv = self.currentView
+        with profiler.timer('colorize'):
+            self.colorize(cv)
+
+        if self.tallyOverlay is not None:
+            with profiler.timer('tally overlay'):
+                self.image = self.tallyOverlay.blend(self.image, self.mapping,
+                                                     cv.plotAlpha)
+
+        if cv.outlines:
+            with profiler.timer('outlines'):
+                pixels = self.getOutlinePixels(cv)
+                self.image.reshape(-1, 3)[pixels] = cv.outlineColor
+
+        if self.comparison is not None:
+            with profiler.timer('compare'):
+                kind = COLOR_DOMAINS[cv.colorby]
+                self.comparison.compare(self.traceKey, self.idBuffer,
+                                        'Material' if kind == 'Material'
+                                        else 'Cell')
+                self.image = self.comparison.highlight(self.image)
+
+    def renderView(self, view, idBuffer=None, props=None, fitLimits=False,
+                   priority=INTERACTIVE):
+        """ Trace and color an image of any view
+
+        The image is colored, blended with the tally overlay and outlined
+        like the current plot, with the property and tally colormap limits
+        of the current plot, without changing the current view or the
+        cached buffers. Views are traced by the worker pool of the model,
+        if it has one, and otherwise like the current plot, serialized by
+        traceLock, so views can be colored on several threads at once.
+
+        Parameters
+        ----------
+        view : PlotView instance
+            View settings of the image
+        idBuffer : NumPy int array (v_res, h_res, n_channels), optional
+            Id map of the view, if already traced
+        props : NumPy float array (v_res, h_res, 2), optional
+            Property map of the view, if already traced
+        fitLimits : bool
+            Whether property heatmaps without limits of their own are
+            fitted to the values of the view instead of using the limits
+            of the current plot
+        priority : int
+            Scheduling priority of the trace, as in traceIds, also used by
+            the worker pool
+
+        Returns
+        -------
+        image : NumPy uint8 array (v_res, h_res, 3)
+            RGB data of the view
+        idBuffer : NumPy int array (v_res, h_res, n_channels)
+            Id map of the view, for reuse by callers
+        """
+
+        workers = self.workers
+        if idBuffer is None:
+            if workers is not None:
+                with profiler.timer('id_map'):
+                    idBuffer = workers.idMap(view.getTraceKey(), priority)
             else:
-                image[self.ids == id] = domain[str(id)].color
+                idBuffer = self.traceIds(view, priority)
+        cells, instances, materials = self.getIdChannels(idBuffer)
+        ids = self.getColorIds(view, cells, materials)
+
+        with profiler.timer('colorize'):
+            if view.colorby in PROPERTIES:
+                if props is None and workers is not None:
+                    with profiler.timer('property_map'):
+                        props = workers.propertyMap(view.getTraceKey(),
+                                                    priority)
+                elif props is None:
+                    props = self.traceProperties(view)
+                limits = view.propertyLimits.get(view.colorby)
+                if limits is None and not fitLimits:
+                    limits = self.propertyRange
+                image = self.colorizeProperty(view, ids, props, limits)
+            else:
+                keys, palette, inverse = self.getPalette(view, cells,
+                                                         instances, ids)
+                image = palette[inverse.reshape(ids.shape)]
+
+        if self.tallyOverlay is not None:
+            image = self.tallyOverlay.blend(image, ViewMapping(view),
+                                            view.plotAlpha,
+                                            self.tallyOverlay.valueRange)
+
+        if view.outlines:
+            image[boundary_mask(ids, view.outlineWidth)] = view.outlineColor
+
+        return image, idBuffer
+
+    def renderBands(self, h_res, v_res, rows=256):
+        """ Render the current plot at another resolution in row bands
+
+        Every band is traced and colored like the current plot, including
+        any tally overlay and outlines, without changing the current view
+        or the cached buffers, so images of any size can be streamed to
+        disk a band at a time.
+
+        Parameters
+        ----------
+        h_res, v_res : int
+            Resolution of the rendered image
+        rows : int
+            Number of image rows per band
+
+        Yields
+        ------
+        row : int
+            Image row of the first row of the band
+        image : NumPy uint8 array (n, h_res, 3)
+            RGB data of the band
+        """
+
+        cv = self.currentView
+        view = copy.copy(cv)
+        view.h_res = h_res
+        view.v_res = v_res
+        mapping = ViewMapping(view)
+
+        # trace extra rows around each band so outlines match at the seams
+        pad = cv.outlineWidth if cv.outlines else 0
+
+        for row in range(0, v_res, rows):
+            stop = min(row + rows, v_res)
+            first = max(row - pad, 0)
+            last = min(stop + pad, v_res)
+
+            band = copy.copy(view)
+            band.v_res = last - first
+            band.height = band.v_res * mapping.dy
+            band.origin = list(view.origin)
+            band.origin[mapping.yBasis] = \
+                mapping.top - (first + last) / 2. * mapping.dy
+
+            image, idBuffer = self.renderView(band, priority=BATCH)
+            yield row, image[row - first:stop - first]
+
+    def getOutlinePixels(self, cv):
+        """ Return flat image indices of domain boundary pixels
+
+        Boundaries are only recomputed when the id buffer, the domain kind
+        or the line width change.
+        """
+
+        key = (self.traceKey, COLOR_DOMAINS[cv.colorby], cv.outlineWidth)
+        if key != self.outlineKey:
+            mask = boundary_mask(self.ids, cv.outlineWidth)
+            self.outlinePixels = np.flatnonzero(mask)
+            self.outlineKey = key
+        return self.outlinePixels
+
+    def getProperties(self):
+        """ Return the property map of the current view
+
+        The property map is only traced on first use after each id map
+        trace, so plots that don't display properties skip it entirely.
+        """
+
+        if self.props is None:
+            self.props = self.traceProperties(self.currentView)
+        return self.props
+
+    def traceIds(self, view, priority=INTERACTIVE):
+        """ Trace the id map of a view through the scheduler of the model,
+        or at once if it has none
+
+        Parameters
+        ----------
+        view : PlotView instance
+            View to trace
+        priority : {INTERACTIVE, PREFETCH, BATCH}
+            Scheduling priority of the trace, from plot_scheduler
+        """
+
+        if self.scheduler is not None:
+            return self.scheduler.submit(view, priority).result()
+        return self.traceIdsNow(view)
+
+    def traceIdsNow(self, view):
+        """ Trace the id map of a view with the tracer of the model, or
+        openmc.capi if it has none """
+
+        with profiler.timer('id_map'), self.traceLock:
+            if self.tracer is not None:
+                return self.tracer.idMap(view.getTraceKey())
+            return capi_plot.id_map(view)
+
+    def traceProperties(self, view):
+        """ Trace the property map of a view with the tracer of the
+        model, or openmc.capi if it has none """
+
+        with profiler.timer('property_map'), self.traceLock:
+            if self.tracer is not None:
+                return self.tracer.propertyMap(view.getTraceKey())
+            return capi_plot.property_map(view)
+
+    def getIdChannels(self, idBuffer=None):
+        """ Return cell, instance and material ids of an id buffer
+
+        Parameters
+        ----------
+        idBuffer : NumPy int array (v_res, h_res, n_channels), optional
+            Traced id map; defaults to the cached id buffer
+
+        Returns
+        -------
+        cells, instances, materials : NumPy int arrays (v_res, h_res)
+            Per-pixel ids; instances is None if OpenMC does not report cell
+            instances
+        """
+
+        if idBuffer is None:
+            idBuffer = self.idBuffer
+        if idBuffer.shape[2] > 2:
+            return idBuffer[:, :, 0], idBuffer[:, :, 1], idBuffer[:, :, 2]
+        return idBuffer[:, :, 0], None, idBuffer[:, :, 1]
+
+    def getUniverseIds(self, cells):
+        """ Map an array of cell ids to the ids of their parent universes """
+
+        unique_ids, inverse = np.unique(cells, return_inverse=True)
+        universes = np.array([self.cellUniverses.get(int(id), _NOT_FOUND_)
+                              for id in unique_ids], dtype=cells.dtype)
+        return universes[inverse].reshape(cells.shape)
+
+    def getColorIds(self, cv, cells, materials):
+        """ Return the ids of the domain kind a view is colored by """
+
+        kind = COLOR_DOMAINS[cv.colorby]
+        if kind == 'Material':
+            return materials
+        elif kind == 'Universe':
+            return self.getUniverseIds(cells)
+        return cells
+
+    def colorize(self, cv):
+        """ Set the model ids and RGB image from the cached id buffer
+
+        Every distinct domain in the image is assigned one palette entry,
+        and the image is built with a single lookup into the palette.
+        """
+
+        cells, self.instances, materials = self.getIdChannels()
+        self.ids = self.getColorIds(cv, cells, materials)
+
+        if cv.colorby in PROPERTIES:
+            self.image = self.colorizeProperty(cv, self.ids,
+                                               self.getProperties())
+            self.regions = None
+            return
+
+        keys, palette, inverse = self.getPalette(cv, cells, self.instances,
+                                                 self.ids)
+
+        # set model image, keeping the palette for vector export
+        self.regions = inverse.reshape(self.ids.shape)
+        self.regionKeys = keys
+        self.regionColors = palette
+        self.image = palette[self.regions]
+
+    def getPalette(self, cv, cells, instances, ids):
+        """ Assign a color to every distinct domain of an id array
 
+        Returns
+        -------
+        keys : NumPy int array (n,)
+            Sorted distinct domain keys; cell ids packed with the instance
+            in the low 32 bits when coloring by instance
+        palette : NumPy uint8 array (n, 3)
+            RGB color of each key
+        inverse : NumPy int array
+            Flat index into keys of every pixel
+        """
+
+        domain = cv.getColorDomains()
+        byInstance = cv.colorby == 'instance' and instances is not None
+        if byInstance:
+            keys = (cells.astype(np.int64) << 32) | \
+                (instances.astype(np.int64) & 0xffffffff)
+        else:
+            keys = ids
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        # domains without a color of their own, distributed cell instances
+        # and, while highlighting, all domains take the hashed color of
+        # their key, so colors don't depend on the order domains are drawn
+        automatic = byInstance or cv.highlighting
+        if cv.neighborColors and not automatic:
+            neighbors = self.getNeighborPalette(COLOR_DOMAINS[cv.colorby])
+            with profiler.timer('neighbor palette'):
+                neighbors.update(ids, cv.getTraceKey())
+            palette = neighbors.getColors(unique_keys)
+            automatic = True
+        else:
+            seed = cv.highlightSeed if cv.highlighting else 0
+            palette = hash_rgb(unique_keys, seed)
+
+        unique_ids = unique_keys >> 32 if byInstance else unique_keys
+        for i, id in enumerate(unique_ids.tolist()):
+            if id == _NOT_FOUND_:
+                palette[i] = cv.plotBackground
+                continue
+
+            dom = domain[str(id)]
+            if cv.highlighting and dom.highlighted:
+                palette[i] = cv.highlightBackground
+            elif cv.masking and dom.masked:
+                palette[i] = cv.maskBackground
+            elif not (automatic or dom.color is None):
+                palette[i] = rgb_from_color(dom.color)
+
+        return unique_keys, palette, inverse.ravel()
+
+    def getNeighborPalette(self, kind):
+        """ Return the neighbor-aware palette of a domain kind """
+
+        return self.neighborPalettes.setdefault((self.fingerprint, kind),
+                                                NeighborPalette())
+
+    def colorizeProperty(self, cv, ids, props, limits=None):
+        """ Return an RGB heatmap image of a property map channel
+
+        Parameters
+        ----------
+        cv : PlotView instance
+            View settings of the plot
+        ids : NumPy int array (v_res, h_res)
+            Ids of the domains of the property
+        props : NumPy float array (v_res, h_res, 2)
+            Property map of the plot
+        limits : 2-tuple of float, optional
+            Colormap limits; defaults to the view limits, or the range of
+            the plot, which is stored as propertyRange
+        """
+
+        values = props[:, :, PROPERTIES[cv.colorby]]
+        valid = (ids != _NOT_FOUND_) & np.isfinite(values)
+        if cv.propertyLog:
+            valid &= values > 0
+
+        if limits is None:
+            limits = cv.propertyLimits.get(cv.colorby)
+            if limits is None:
+                if valid.any():
+                    limits = (values[valid].min(), values[valid].max())
+                else:
+                    limits = (0., 1.)
+            self.propertyRange = (float(limits[0]), float(limits[1]))
+        vmin, vmax = limits
+
+        lut = colormap_lut(cv.propertyCmap)
+        image = apply_lut(values, lut, vmin, vmax, cv.propertyLog)
+        image[~valid] = cv.plotBackground
+
+        domain = cv.getColorDomains()
         if cv.masking:
-            for id, dom in domain.items():
-                if dom.masked:
-                    image[self.ids == int(id)] = cv.maskBackground
+            masked = [int(id) for id, dom in domain.items() if dom.masked]
+            image[np.isin(ids, masked)] = cv.maskBackground
 
         if cv.highlighting:
-            for id, dom in domain.items():
-                if dom.highlighted:
-                    image[self.ids == int(id)] = cv.highlightBackground
+            highlighted = [int(id) for id, dom in domain.items()
+                           if dom.highlighted]
+            image[np.isin(ids, highlighted)] = cv.highlightBackground
 
-        # set model image
-        self.image = image
+        return image
 
-    def undo(self):
-        """ Revert to previous PlotView instance. Re-generate plot image """
+    def getRegions(self):
+        """ Return the uniformly colored regions of the current plot
+
+        Tally overlays and outlines are not included.
+
+        Returns
+        -------
+        regions : NumPy int array (v_res, h_res)
+            Index into colors of every pixel
+        colors : NumPy uint8 array (n, 3)
+            RGB color of each region
+        labels : list of str
+            Description of each region
+        """
+
+        cv = self.currentView
+        if self.regions is None:
+            # heatmaps are split into regions of identical color
+            image = self.colorizeProperty(cv, self.ids, self.getProperties(),
+                                          self.propertyRange)
+            packed = (image[:, :, 0].astype(np.int32) << 16) | \
+                (image[:, :, 1].astype(np.int32) << 8) | image[:, :, 2]
+            unique, inverse = np.unique(packed, return_inverse=True)
+            colors = np.column_stack((unique >> 16, unique >> 8,
+                                      unique)).astype(np.uint8)
+            labels = [f'RGB {tuple(color)}' for color in colors.tolist()]
+            return inverse.reshape(packed.shape), colors, labels
+
+        kind = COLOR_DOMAINS[cv.colorby]
+        domain = cv.getColorDomains()
+        byInstance = cv.colorby == 'instance' and self.instances is not None
+        labels = []
+        for key in self.regionKeys.tolist():
+            id = key >> 32 if byInstance else key
+            if id == _NOT_FOUND_:
+                labels.append('Void')
+                continue
+            label = f'{kind} {id}'
+            if byInstance:
+                label += f' instance {key & 0xffffffff}'
+            name = domain[str(id)].name
+            labels.append(f'{label}: {name}' if name else label)
+        return self.regions, self.regionColors, labels
+
+    def undo(self, render=True):
+        """ Revert to previous PlotView instance. Re-generate plot image
+        unless render is False """
 
         if self.previousViews:
-            self.subsequentViews.append(copy.deepcopy(self.currentView))
+            self.subsequentViews.append(copy.deepcopy(self.getLatestView()))
             self.activeView = self.previousViews.pop()
-            self.generatePlot()
+            if render:
+                self.generatePlot()
 
-    def redo(self):
-        """ Revert to subsequent PlotView instance. Re-generate plot image """
+    def redo(self, render=True):
+        """ Revert to subsequent PlotView instance. Re-generate plot image
+        unless render is False """
 
         if self.subsequentViews:
             self.storeCurrent()
             self.activeView = self.subsequentViews.pop()
-            self.generatePlot()
+            if render:
+                self.generatePlot()
+
+    def getLatestView(self):
+        """ Return the pending view, or the current view if none is
+        pending """
+        if self.pendingView is not None:
+            return self.pendingView
+        return self.currentView
 
     def storeCurrent(self):
-        """ Add current view to previousViews list """
-        self.previousViews.append(copy.deepcopy(self.currentView))
+        """ Add current view, or the pending view replacing it, to
+        previousViews list """
+        self.previousViews.append(copy.deepcopy(self.getLatestView()))
+
+    def getBufferBytes(self):
+        """ Return the size of the image and of the id, property and
+        derived buffers of the current plot """
+
+        return array_bytes(self.idBuffer, self.ids, self.instances,
+                           self.props, getattr(self, 'image', None),
+                           self.regions, self.outlinePixels)
+
+    def getHistoryBytes(self):
+        """ Return the estimated size of the views of the undo history """
+        return sum(view_bytes(view) for view in self.previousViews +
+                   self.subsequentViews)
+
+    def trimHistory(self, nbytes, keep=1):
+        """ Drop the oldest undo views, then the last redo views, until
+        nbytes are freed, keeping at least keep views of each
+
+        Returns
+        -------
+        freed : int
+            Estimated size of the dropped views
+        """
+
+        freed = 0
+        for views in (self.previousViews, self.subsequentViews):
+            while freed < nbytes and len(views) > keep:
+                freed += view_bytes(views.pop(0))
+        return freed
+
+
+def rgb_from_color(color):
+    """ Return an RGB tuple for an RGB tuple or SVG color name """
+
+    if isinstance(color, str):
+        return openmc.plots._SVG_COLORS[color]
+    return color
+
+
+def boundary_mask(ids, width=1):
+    """ Return a mask of pixels on the boundary between different ids
+
+    Parameters
+    ----------
+    ids : NumPy int array (v_res, h_res)
+        Domain id of each pixel
+    width : int
+        Line width in pixels, measured across the line
+
+    Returns
+    -------
+    mask : NumPy bool array (v_res, h_res)
+    """
+
+    # one-pixel lines on the right of vertical edges and below horizontal
+    # edges
+    vertical = np.zeros(ids.shape, dtype=bool)
+    vertical[:, 1:] = ids[:, 1:] != ids[:, :-1]
+    horizontal = np.zeros(ids.shape, dtype=bool)
+    horizontal[1:, :] = ids[1:, :] != ids[:-1, :]
+
+    # widen every line across itself toward the other side of its edge,
+    # one pixel at a time, so lines are exactly width pixels across
+    for _ in range(width - 1):
+        vertical[:, :-1] |= vertical[:, 1:].copy()
+        horizontal[:-1, :] |= horizontal[1:, :].copy()
+    return vertical | horizontal
+
+
+class ViewMapping():
+    """ Affine mapping between image pixels and model coordinates of a view
+
+    Pixel positions are continuous (column, row) coordinates with (0, 0) at
+    the upper-left corner of the image, so pixel [row, col] of the image
+    covers [col, col + 1) x [row, row + 1) and is centered on
+    (col + 0.5, row + 0.5). All methods accept scalars or NumPy arrays.
+
+    Parameters
+    ----------
+    view : PlotView instance
+        View settings of the rendered image
+
+    Attributes
+    ----------
+    xBasis, yBasis, zBasis : int
+        Model axis index of the horizontal, vertical and normal directions
+    origin : NumPy float array (3,)
+        Origin of the view in model coordinates
+    h_res, v_res : int
+        Horizontal and vertical resolution of the image
+    dx, dy : float
+        Size of a pixel in model units
+    left, top : float
+        Model coordinates of the upper-left corner of the image
+    """
+
+    def __init__(self, view):
+        self.xBasis = 0 if view.basis[0] == 'x' else 1
+        self.yBasis = 1 if view.basis[1] == 'y' else 2
+        self.zBasis = 3 - (self.xBasis + self.yBasis)
+
+        self.origin = np.array(view.origin, dtype=float)
+        self.h_res = view.h_res
+        self.v_res = view.v_res
+        self.dx = view.width / view.h_res
+        self.dy = view.height / view.v_res
+        self.left = self.origin[self.xBasis] - view.width / 2.
+        self.top = self.origin[self.yBasis] + view.height / 2.
+
+    @property
+    def extent(self):
+        """ Image extent as [left, right, bottom, top] in model units """
+        return [self.left, self.left + self.h_res * self.dx,
+                self.top - self.v_res * self.dy, self.top]
+
+    def pixelToPlane(self, col, row):
+        """ Convert pixel positions to in-plane model coordinates """
+        return (self.left + np.asarray(col) * self.dx,
+                self.top - np.asarray(row) * self.dy)
+
+    def planeToPixel(self, x, y):
+        """ Convert in-plane model coordinates to pixel positions """
+        return ((np.asarray(x) - self.left) / self.dx,
+                (self.top - np.asarray(y)) / self.dy)
+
+    def planeToWorld(self, x, y):
+        """ Convert in-plane coordinates to 3D points of shape (..., 3) """
+        x, y = np.broadcast_arrays(x, y)
+        points = np.empty(x.shape + (3,))
+        points[..., self.xBasis] = x
+        points[..., self.yBasis] = y
+        points[..., self.zBasis] = self.origin[self.zBasis]
+        return points
+
+    def pixelToWorld(self, col, row):
+        """ Convert pixel positions to 3D points of shape (..., 3) """
+        return self.planeToWorld(*self.pixelToPlane(col, row))
+
+    def worldToPixel(self, points):
+        """ Project 3D points of shape (..., 3) to pixel positions """
+        points = np.asarray(points)
+        return self.planeToPixel(points[..., self.xBasis],
+                                 points[..., self.yBasis])
+
+    def pixelIndex(self, col, row):
+        """ Return integer pixel indices and whether they lie in the image """
+        col = np.floor(col).astype(int)
+        row = np.floor(row).astype(int)
+        inside = (col >= 0) & (col < self.h_res) & \
+            (row >= 0) & (row < self.v_res)
+        return col, row, inside
+
+    def pixelCenters(self):
+        """ Return in-plane coordinates of pixel centers along each axis
+
+        Returns
+        -------
+        x : NumPy float array (h_res,)
+            Horizontal coordinate of each image column
+        y : NumPy float array (v_res,)
+            Vertical coordinate of each image row
+        """
+        return self.pixelToPlane(np.arange(self.h_res) + 0.5,
+                                 np.arange(self.v_res) + 0.5)
 
 
 class PlotView(_PlotBase):
@@ -189,6 +971,9 @@ class PlotView(_PlotBase):
 
     Attributes
     ----------
+    level : int
+        Universe level at which cells are traced; -1 traces the deepest
+        level
     origin : 3-tuple of floats
         Origin (center) of plot view
     width : float
@@ -204,8 +989,18 @@ class PlotView(_PlotBase):
         prevent image stretching/warping
     basis : {'xy', 'xz', 'yz'}
         The basis directions for the plot
-    colorby : {'cell', 'material'}
-        Indication of whether the plot should be colored by cell or material
+    colorby : {'cell', 'material', 'instance', 'universe', 'temperature',
+               'density'}
+        Indication of whether the plot should be colored by cell,
+        material, distributed cell instance or universe, or drawn as a
+        temperature or density heatmap
+    propertyCmap : str
+        Name of the matplotlib colormap used for property heatmaps
+    propertyLog : bool
+        Indication of whether property heatmaps use a logarithmic scale
+    propertyLimits : dict
+        Colormap (min, max) limits by property, or None to fit the limits
+        to the values in view
     masking : bool
         Indication of whether cell/material masking is active
     maskBackground : 3-tuple of int
@@ -217,7 +1012,7 @@ class PlotView(_PlotBase):
     highlightAlpha : float between 0 and 1
         Alpha value for highlight background color
     highlightSeed : int
-        Random number seed used to generate color scheme when highlighting
+        Seed of the hashed color scheme of the domains when highlighting
         is active
     plotBackground : 3-tuple of int
         RGB color to apply to plot background
@@ -225,8 +1020,19 @@ class PlotView(_PlotBase):
         Dictionary of cell view settings by ID
     materials : Dict of DomainView instances
         Dictionary of material view settings by ID
+    universes : Dict of DomainView instances
+        Dictionary of universe view settings by ID
     plotAlpha: float between 0 and 1
         Alpha value of the geometry plot
+    outlines : bool
+        Indication of whether domain boundaries are outlined
+    outlineColor : 3-tuple of int
+        RGB color of domain outlines
+    outlineWidth : int
+        Width of domain outlines in pixels
+    neighborColors : bool
+        Indication of whether domains are colored so that touching domains
+        never share a color, in place of their own colors
     """
 
     def __init__(self, origin, width, height):
@@ -256,12 +1062,47 @@ class PlotView(_PlotBase):
 
         self.plotAlpha = 1.0
 
+        self.outlines = False
+        self.outlineColor = (0, 0, 0)
+        self.outlineWidth = 1
+
+        self.neighborColors = False
+
+        self.propertyCmap = 'viridis'
+        self.propertyLog = False
+        self.propertyLimits = {prop: None for prop in PROPERTIES}
+
         self.cells = self.getDomains('geometry.xml', 'cell')
         self.materials = self.getDomains('materials.xml', 'material')
+        self.universes = self.getUniverses('geometry.xml')
 
     def __hash__(self):
         return hash(self.__dict__.__str__() + self.__str__())
 
+    def getTraceKey(self):
+        """ Return the settings that determine the traced id map """
+
+        return (tuple(self.origin), self.width, self.height, self.basis,
+                self.h_res, self.v_res, self.level)
+
+    def getColorDomains(self, colorby=None):
+        """ Return the domains shown when coloring by colorby
+
+        Parameters
+        ----------
+        colorby : str, optional
+            Color by mode; defaults to the view's own mode
+
+        Returns
+        -------
+        domains : Dictionary of DomainView instances
+            Cell, material or universe view settings keyed by ID
+        """
+
+        if colorby is None:
+            colorby = self.colorby
+        return getattr(self, DOMAIN_KINDS[COLOR_DOMAINS[colorby]])
+
     def getDomains(self, file, type_):
         """ Return dictionary of domain settings.
 
@@ -284,23 +1125,52 @@ class PlotView(_PlotBase):
         doc = ET.parse(file)
         root = doc.getroot()
 
+        elements = root.findall(type_)
+        # colors are hashed from the ids, so they are the same every session
+        colors = hash_rgb([int(dom.attrib['id']) for dom in elements])
+
         domains = {}
-        for dom in root.findall(type_):
+        for dom, color in zip(elements, colors.tolist()):
             id = dom.attrib['id']
             if 'name' in dom.attrib:
                 name = dom.attrib['name']
             else:
                 name = None
 
-            # set a random color
-            color = random_rgb()
             masked = False
             highlighted = False
-            domain = DomainView(id, name, color, masked, highlighted)
+            domain = DomainView(id, name, tuple(color), masked, highlighted)
             domains[id] = domain
 
         return domains
 
+    def getUniverses(self, file):
+        """ Return dictionary of universe settings.
+
+        Universes are not listed explicitly in geometry.xml, so their IDs
+        are collected from the universe attribute of each cell (cells
+        without one belong to universe 0).
+
+        Parameters
+        ----------
+        file : str
+            geometry .xml file from which to retrieve values
+
+        Returns
+        -------
+        domains : Dictionary of DomainView instances
+            Dictionary of universe DomainView instances keyed by ID
+        """
+
+        root = ET.parse(file).getroot()
+
+        ids = list(dict.fromkeys(cell.attrib.get('universe', '0')
+                                 for cell in root.findall('cell')))
+        colors = hash_rgb([int(id) for id in ids])
+
+        return {id: DomainView(id, None, tuple(color))
+                for id, color in zip(ids, colors.tolist())}
+
 class DomainView():
     """ Represents view settings for OpenMC cell or material.
 
@@ -343,7 +1213,20 @@ class DomainTableModel(QAbstractTableModel):
 
     def __init__(self, domains):
         super(DomainTableModel, self).__init__()
-        self.domains = [dom for dom in domains.values()]
+        self.allDomains = [dom for dom in domains.values()]
+        self.domains = self.allDomains
+
+    def setFilter(self, mask=None):
+        """ Show only the domains where a boolean mask over all domains is
+        True, or all domains if mask is None """
+
+        self.beginResetModel()
+        if mask is None:
+            self.domains = self.allDomains
+        else:
+            self.domains = [self.allDomains[i]
+                            for i in np.flatnonzero(mask).tolist()]
+        self.endResetModel()
 
     def rowCount(self, index=QModelIndex()):
         return len(self.domains)
@@ -0,0 +1,7 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# plotmodel imports openmc, which the benchmark stand-in replaces
+import plot_benchmark
+plot_benchmark.install_openmc_stand_in()
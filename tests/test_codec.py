@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from plot_codec import (EncodedArray, encode_array, load_array, lz4,
+    save_array, varint_decode, varint_encode)
+
+def id_map(v_res=10, h_res=7, n_channels=3):
+    """ Return an id map of horizontal bands with a few negative ids """
+
+    rng = np.random.default_rng(1)
+    bands = rng.integers(-1, 50, size=(v_res // 3 + 1, 1, n_channels))
+    ids = np.repeat(np.repeat(bands, 3, axis=0)[:v_res], h_res, axis=1)
+    ids[::4, 2] = 1234567
+    return ids.astype(np.int32)
+
+COMPRESSIONS = [None, 'zlib',
+                pytest.param('lz4', marks=pytest.mark.skipif(
+                    lz4 is None, reason='lz4 is not installed'))]
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2**40, 2**64 - 1], np.uint64)
+    data, sizes = varint_encode(values)
+    assert list(sizes) == [1, 1, 1, 2, 2, 6, 10]
+    np.testing.assert_array_equal(varint_decode(data), values)
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+@pytest.mark.parametrize('array', [id_map(), id_map()[:, :, 0],
+                                   np.linspace(0., 1., 60).reshape(6, 10),
+                                   np.zeros((5, 4), bool)])
+def test_round_trip(array, compression):
+    encoded = encode_array(array, compression, blockRows=4)
+    decoded = EncodedArray.frombytes(encoded.tobytes()).decode()
+    assert decoded.dtype == array.dtype
+    np.testing.assert_array_equal(decoded, array)
+
+@pytest.mark.parametrize('start, stop', [(0, 10), (3, 9), (4, 8), (9, 10),
+                                         (4, 4), (0, 0), (10, 10), (6, 2),
+                                         (-3, None)])
+def test_rows(start, stop):
+    ids = id_map()
+    rows = encode_array(ids, blockRows=4).rows(start, stop)
+    assert rows.shape[1:] == ids.shape[1:]
+    np.testing.assert_array_equal(rows, ids[start:stop])
+
+def test_save_load(tmp_path):
+    ids = id_map()
+    filename = tmp_path / 'ids.rle'
+    save_array(filename, ids, meta={'key': [1, 2]})
+    loaded = load_array(filename)
+    np.testing.assert_array_equal(loaded.decode(), ids)
+    assert loaded.meta == {'key': [1, 2]}
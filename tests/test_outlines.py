@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from plotmodel import boundary_mask
+
+@pytest.mark.parametrize('width', [1, 2, 3, 5])
+def test_vertical_line_width(width):
+    ids = np.zeros((8, 12), dtype=np.int32)
+    ids[:, 6:] = 1
+    mask = boundary_mask(ids, width)
+    assert (mask.sum(axis=1) == width).all()
+    assert mask[:, 6].all()
+
+@pytest.mark.parametrize('width', [1, 2, 3, 5])
+def test_horizontal_line_width(width):
+    ids = np.zeros((12, 8), dtype=np.int32)
+    ids[6:, :] = 1
+    mask = boundary_mask(ids, width)
+    assert (mask.sum(axis=0) == width).all()
+    assert mask[6, :].all()
+
+def test_uniform_ids_have_no_boundary():
+    assert not boundary_mask(np.ones((5, 5), dtype=np.int32), 3).any()
@@ -0,0 +1,49 @@
+import threading, time
+
+from plot_profiler import Profiler
+
+def test_disabled_records_nothing():
+    profiler = Profiler()
+    with profiler.timer('colorize'):
+        pass
+    assert not profiler.stages and not profiler.events
+    assert profiler.summary() == ''
+
+def test_nested_stages_are_not_added_to_total():
+    profiler = Profiler(enabled=True)
+    profiler.newFrame()
+    with profiler.timer('colorize'):
+        with profiler.timer('neighbor palette'):
+            time.sleep(0.01)
+        time.sleep(0.01)
+    with profiler.timer('draw'):
+        time.sleep(0.01)
+
+    stages = profiler.stages
+    assert list(stages) == ['neighbor palette', 'colorize', 'draw']
+    assert profiler.total == stages['colorize'] + stages['draw']
+    assert profiler.summary().endswith(f'total {profiler.total * 1e3:.1f} ms')
+
+def test_other_threads_are_kept_out_of_the_frame():
+    profiler = Profiler(enabled=True)
+    profiler.newFrame()
+
+    def trace():
+        with profiler.timer('pane xy'):
+            time.sleep(0.01)
+    thread = threading.Thread(target=trace)
+    thread.start()
+    thread.join()
+    with profiler.timer('draw'):
+        pass
+
+    assert list(profiler.stages) == ['draw']
+    assert profiler.total == profiler.stages['draw']
+    assert [event[0] for event in profiler.events] == ['pane xy', 'draw']
+
+def test_new_frame_resets_breakdown():
+    profiler = Profiler(enabled=True)
+    with profiler.timer('colorize'):
+        pass
+    profiler.newFrame()
+    assert not profiler.stages and profiler.total == 0.
@@ -0,0 +1,160 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+h5py = pytest.importorskip('h5py')
+
+from plot_colors import apply_lut, colormap_lut
+from plot_tally import MeshTallyOverlay, list_mesh_tallies
+from plotmodel import ViewMapping
+
+DIMENSION = (4, 5, 3)
+N_REALIZATIONS = 2
+
+def mesh_value(i, j, k):
+    """ Mean of mesh bin (i, j, k) in the statepoint of write_statepoint """
+    return 100. * k + 10. * j + i
+
+def write_statepoint(path):
+    """ Write a statepoint with a flux tally on a 4 x 5 x 3 mesh of unit
+    cells from the origin, summed over N_REALIZATIONS """
+
+    nx, ny, nz = DIMENSION
+    results = np.zeros((nx * ny * nz, 1, 2))
+    for k in range(nz):
+        for j in range(ny):
+            for i in range(nx):
+                bin = i + nx * j + nx * ny * k
+                results[bin, 0, 0] = N_REALIZATIONS * mesh_value(i, j, k)
+
+    with h5py.File(path, 'w') as file:
+        tallies = file.create_group('tallies')
+        filt = tallies.create_group('filters/filter 1')
+        filt.create_dataset('type', data=b'mesh')
+        filt.create_dataset('bins', data=[1])
+        mesh = tallies.create_group('meshes/mesh 1')
+        mesh.create_dataset('dimension', data=DIMENSION)
+        mesh.create_dataset('lower_left', data=[0., 0., 0.])
+        mesh.create_dataset('width', data=[1., 1., 1.])
+        tally = tallies.create_group('tally 1')
+        tally.create_dataset('filters', data=[1])
+        tally.create_dataset('score_bins', data=[b'flux'])
+        tally.create_dataset('nuclides', data=[b'total'])
+        tally.attrs['n_realizations'] = N_REALIZATIONS
+        tally.create_dataset('results', data=results)
+    return path
+
+class RecordedResults():
+    """ Results dataset recording the mesh bins read from it """
+
+    def __init__(self, results):
+        self.results = results
+        self.bins = set()
+
+    def __getitem__(self, index):
+        rows = index[0]
+        self.bins.update(range(*rows.indices(len(self.results))))
+        return self.results[index]
+
+def mapping(basis, origin, width, height, h_res, v_res):
+    return ViewMapping(SimpleNamespace(basis=basis, origin=origin,
+                                       width=width, height=height,
+                                       h_res=h_res, v_res=v_res))
+
+@pytest.fixture
+def overlay(tmp_path):
+    overlay = MeshTallyOverlay(write_statepoint(tmp_path / 'statepoint.h5'),
+                               1)
+    yield overlay
+    overlay.close()
+
+def test_list_mesh_tallies(tmp_path):
+    path = write_statepoint(tmp_path / 'statepoint.h5')
+    assert list_mesh_tallies(path) == [(1, 0, 'flux (total)')]
+
+def test_xy_slice_reads_intersecting_bins(overlay):
+    overlay.results = RecordedResults(overlay.results)
+    # x in [1.1, 1.9], y in [2.1, 2.9] through z = 1.5, plus a margin bin
+    values, start = overlay.getSlice(mapping('xy', (1.5, 2.5, 1.5),
+                                             0.8, 0.8, 4, 4))
+
+    assert start == (0, 1)
+    assert overlay.results.bins == {i + 4 * j + 20 for i in (0, 1, 2)
+                                    for j in (1, 2, 3)}
+    expected = [[mesh_value(i, j, 1) for i in (0, 1, 2)] for j in (1, 2, 3)]
+    np.testing.assert_allclose(values, expected)
+
+def test_xz_slice_reads_intersecting_bins(overlay):
+    overlay.results = RecordedResults(overlay.results)
+    # x in [2.1, 2.9], z in [1.1, 1.9] through y = 3.5, plus a margin bin
+    values, start = overlay.getSlice(mapping('xz', (2.5, 3.5, 1.5),
+                                             0.8, 0.8, 4, 4))
+
+    assert start == (1, 0)
+    assert overlay.results.bins == {i + 4 * 3 + 20 * k for i in (1, 2, 3)
+                                    for k in (0, 1, 2)}
+    expected = [[mesh_value(i, 3, k) for i in (1, 2, 3)] for k in (0, 1, 2)]
+    np.testing.assert_allclose(values, expected)
+
+def test_slice_margin_stops_at_mesh(overlay):
+    overlay.results = RecordedResults(overlay.results)
+    values, start = overlay.getSlice(mapping('xy', (0.5, 0.5, 0.5),
+                                             0.8, 0.8, 4, 4))
+
+    assert start == (0, 0)
+    assert overlay.results.bins == {0, 1, 4, 5}
+    assert values.shape == (2, 2)
+
+def test_slice_missing_mesh(overlay):
+    values, _ = overlay.getSlice(mapping('xy', (2., 2.5, 7.), 4., 5., 8, 10))
+    assert values is None
+
+def test_nearest_resample(overlay):
+    # two pixels per mesh cell, covering the mesh at z = 0.5
+    values, valid = overlay.resample(mapping('xy', (2., 2.5, 0.5),
+                                             4., 5., 8, 10))
+
+    rows, cols = np.indices((10, 8))
+    np.testing.assert_allclose(values, mesh_value(cols // 2, 4 - rows // 2, 0))
+    # the bin with no score is left transparent
+    assert valid.sum() == 80 - 4
+    assert not valid[8:, :2].any()
+
+def test_bilinear_resample(overlay):
+    overlay.interpolation = 'linear'
+    values, _ = overlay.resample(mapping('xy', (2., 2.5, 1.5),
+                                         4., 5., 8, 10))
+
+    # mesh values are linear in the mesh index, so interpolating between
+    # cell centers is exact, and clamped to the outer cell centers
+    x = (np.arange(8) + 0.5) / 2.
+    y = 5. - (np.arange(10) + 0.5) / 2.
+    i = np.clip(x - 0.5, 0, 3)[None, :]
+    j = np.clip(y - 0.5, 0, 4)[:, None]
+    np.testing.assert_allclose(values, mesh_value(i, j, 1))
+
+def test_bilinear_resample_does_not_depend_on_view(overlay):
+    overlay.interpolation = 'linear'
+    # the left half of the second view has the pixels of the first
+    small, _ = overlay.resample(mapping('xy', (1.5, 2.5, 1.5),
+                                        0.96, 0.96, 4, 4))
+    large, _ = overlay.resample(mapping('xy', (1.98, 2.5, 1.5),
+                                        1.92, 0.96, 8, 4))
+    np.testing.assert_allclose(small, large[:, :4])
+
+@pytest.mark.parametrize('alpha', [0., 0.25, 1.])
+def test_blend_alpha(overlay, alpha):
+    view = mapping('xy', (2., 2.5, 1.5), 4., 5., 8, 10)
+    image = np.full((10, 8, 3), 200, dtype=np.uint8)
+    limits = (100., 143.)
+
+    blended = overlay.blend(image, view, alpha, limits)
+
+    values, valid = overlay.resample(view)
+    assert valid.all()
+    colors = apply_lut(values, colormap_lut(overlay.cmap), *limits)
+    expected = np.round(alpha * 200. + (1. - alpha) * colors)
+    np.testing.assert_array_equal(blended, expected.astype(np.uint8))
+    # the geometry image is left as it was
+    assert (image == 200).all()